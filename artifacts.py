@@ -0,0 +1,154 @@
+"""Safe loading and writing of model artifacts under concurrency.
+
+`SingleFlight` collapses concurrent loads of the same artifact into one:
+the first caller runs the loader, callers arriving while it runs wait for
+and share its result (or its exception), like Go's singleflight. Nothing is
+cached here; loaders keep their own module-level state and re-check it, so
+a finished flight is never repeated.
+
+`atomic_write` writes a file via a temporary sibling and `os.replace`, so a
+reader (or a crash) never sees a half-written pickle or table;
+`file_sha256` fingerprints an artifact.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, TypeVar, Union
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flight: Optional[_Flight] = None
+        self.loads = 0
+        self.failures = 0
+        self.waiters = 0
+        self.max_waiters = 0
+        self.last_seconds: Optional[float] = None
+        self.total_seconds = 0.0
+
+    def do(self, fn: Callable[[], T]) -> T:
+        """Run `fn`, or wait for the call already in flight and return its result."""
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+            else:
+                flight.waiters += 1
+                self.waiters += 1
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        start = time.perf_counter()
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._flight = None
+                self.loads += 1
+                self.failures += flight.error is not None
+                self.last_seconds = seconds
+                self.total_seconds += seconds
+            flight.done.set()
+        return flight.value
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "failures": self.failures,
+                "in_flight": self._flight is not None,
+                "waiters": self.waiters,
+                "max_concurrent_waiters": self.max_waiters,
+                "last_load_seconds": self.last_seconds,
+                "total_load_seconds": self.total_seconds,
+            }
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path], mode: str = "wb"):
+    """Open a temporary file next to `path`; on success it is fsynced and
+    renamed over `path`, on error it is removed and `path` is untouched.
+
+    The result keeps the mode of the file it replaces, or gets the usual
+    umask-based mode for a new file (mkstemp's own 0600 would make models
+    unreadable to workers running as another user)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, mode) as fh:
+            yield fh
+            fh.flush()
+            os.fchmod(fh.fileno(), _target_mode(path))
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _import_umask() -> int:
+    # os.umask can only be read by setting it; done once, while importing
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+_IMPORT_UMASK = _import_umask()
+
+
+def _current_umask() -> int:
+    """The process umask, read without changing it where /proc allows
+    (toggling it would briefly affect files other threads create)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return _IMPORT_UMASK
+
+
+def _target_mode(path: Path) -> int:
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_current_umask()
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
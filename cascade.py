@@ -0,0 +1,167 @@
+"""Tiered triage for /triage_ml: rules, then the distilled model, then the transformer.
+
+Each tier answers only when it is confident; otherwise the request
+escalates to the next, more expensive tier:
+
+    rules        accepted when the rule engine's risk is in
+                 MEDTRIAGE_CASCADE_RULES_ACCEPT (default "High": a strong
+                 rule hit is trusted, everything else is a maybe)
+    distilled    hashed n-gram model from ml/distilled.py, accepted when its
+                 top probability is >= MEDTRIAGE_CASCADE_DISTILLED_MIN_CONFIDENCE
+                 (default 0.8); skipped when no artifact is shipped
+    transformer  try_ml_triage (micro-batcher, circuit breaker, timeout)
+
+If the transformer fails, the best answer already computed is returned:
+the distilled one when it cleared the transformer's own 0.4 confidence
+floor, else the rules one. Per-tier
+attempts, acceptances and latency histograms are exposed by
+`cascade_stats()` (see /metrics).
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from ml_triage import Histogram, _result_from_preds, try_ml_triage
+from ml_triage import model_version as ml_model_version
+from result_cache import env_number
+from triage import classify_symptom, get_rule_engine
+
+logger = logging.getLogger(__name__)
+
+RULES, DISTILLED, TRANSFORMER = "rules", "distilled", "transformer"
+TIERS = (RULES, DISTILLED, TRANSFORMER)
+
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 2000)
+
+
+def cascade_enabled() -> bool:
+    return os.environ.get("MEDTRIAGE_ML_CASCADE", "0") == "1"
+
+
+class _TierStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.accepted = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    def record(self, seconds: float, accepted: bool) -> None:
+        self.latency_ms.observe(seconds * 1000.0)
+        with self._lock:
+            self.attempts += 1
+            self.accepted += int(accepted)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            attempts, accepted = self.attempts, self.accepted
+        return {
+            "attempts": attempts,
+            "accepted": accepted,
+            "hit_rate": accepted / attempts if attempts else 0.0,
+            "latency_ms": self.latency_ms.snapshot(),
+        }
+
+
+class TriageCascade:
+    """`triage(text)` returns (result, tier, spans): the usual
+    (risk, suggestion, conditions, score, matches) tuple, the tier that
+    produced it and the rule match spans (None unless the rules answered)."""
+
+    def __init__(self, rules_accept=("High",), distilled_min_confidence: float = 0.8, distilled=None, timeout: float = 2.0, fallback_min_confidence: float = 0.4):
+        self.rules_accept = frozenset(rules_accept)
+        self.distilled_min_confidence = float(distilled_min_confidence)
+        self.fallback_min_confidence = float(fallback_min_confidence)
+        self._distilled = distilled
+        self.timeout = float(timeout)
+        self.stats = {tier: _TierStats() for tier in TIERS}
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls) -> "TriageCascade":
+        accept = [r.strip() for r in os.environ.get("MEDTRIAGE_CASCADE_RULES_ACCEPT", "High").split(",") if r.strip()]
+        return cls(
+            rules_accept=accept,
+            distilled_min_confidence=env_number("MEDTRIAGE_CASCADE_DISTILLED_MIN_CONFIDENCE", 0.8, float),
+        )
+
+    def distilled_model(self):
+        if self._distilled is None:
+            from ml.distilled import load_distilled
+
+            return load_distilled()
+        return self._distilled
+
+    def triage(self, text: str, timeout: Optional[float] = None) -> Tuple[tuple, str, Optional[List[tuple]]]:
+        start = time.perf_counter()
+        engine = get_rule_engine()
+        risk, suggestion, conditions, score, matches, spans = classify_symptom(text, engine=engine, spans=True)
+        rules = (risk, suggestion, conditions, score, matches)
+        accepted = risk in self.rules_accept
+        self.stats[RULES].record(time.perf_counter() - start, accepted)
+        if accepted:
+            return rules, RULES, spans
+
+        best, best_tier, best_spans = rules, RULES, spans
+        model = self.distilled_model()
+        if model is not None:
+            start = time.perf_counter()
+            try:
+                result = _result_from_preds(model.classify(text))
+            except Exception:
+                # A broken model never fails the request; escalate instead
+                logger.exception("Distilled tier failed; escalating to the transformer")
+                result = None
+            accepted = result is not None and result[3] >= self.distilled_min_confidence
+            self.stats[DISTILLED].record(time.perf_counter() - start, accepted)
+            if accepted:
+                return result, DISTILLED, None
+            if result is not None and result[3] >= self.fallback_min_confidence:
+                best, best_tier, best_spans = result, DISTILLED, None
+
+        start = time.perf_counter()
+        try:
+            result = try_ml_triage(text, timeout=self.timeout if timeout is None else timeout)
+        except Exception as e:
+            self.stats[TRANSFORMER].record(time.perf_counter() - start, False)
+            logger.debug("Transformer tier unavailable (%s); answering from %s", e, best_tier)
+            with self._lock:
+                self.fallbacks += 1
+            return best, best_tier, best_spans
+        self.stats[TRANSFORMER].record(time.perf_counter() - start, True)
+        return result, TRANSFORMER, None
+
+    def snapshot(self) -> Dict[str, object]:
+        model = self.distilled_model()
+        with self._lock:
+            fallbacks = self.fallbacks
+        return {
+            "enabled": cascade_enabled(),
+            "distilled_version": model.version if model is not None else None,
+            "fallbacks": fallbacks,
+            "tiers": {tier: s.snapshot() for tier, s in self.stats.items()},
+        }
+
+
+_CASCADE = TriageCascade.from_env()
+
+
+def triage_cascade(text: str, timeout: float = 2.0) -> Tuple[tuple, str, Optional[List[tuple]]]:
+    return _CASCADE.triage(text, timeout)
+
+
+def tier_model_version(tier: str) -> Optional[str]:
+    """Version of the model behind `tier` (None for rules), for audit rows."""
+    if tier == DISTILLED:
+        model = _CASCADE.distilled_model()
+        return model.version if model is not None else None
+    if tier == TRANSFORMER:
+        return ml_model_version()
+    return None
+
+
+def cascade_stats() -> Dict[str, object]:
+    """Per-tier attempts, acceptance (hit) rate and latency of the triage cascade."""
+    return _CASCADE.snapshot()
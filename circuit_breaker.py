@@ -0,0 +1,173 @@
+"""Latency-aware circuit breaker for the optional ML triage path.
+
+The breaker watches a rolling window of recent ML calls. It trips (opens)
+when the window's p95 latency, failure rate or low-confidence rate crosses
+its threshold; while open, callers skip ML entirely and go straight to the
+rule-based classifier. After `cooldown` seconds it goes half-open and lets
+`probe_fraction` of requests through; `probe_successes` fast, confident
+probes close it again, a single bad probe re-opens it.
+"""
+from collections import deque
+from typing import Callable, Dict, List, Optional
+import logging
+import random
+import threading
+import time
+
+from result_cache import env_number
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+OK, FAILURE, LOW_CONFIDENCE = "ok", "failure", "low_confidence"
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling ML while the breaker is open."""
+
+
+def _p95(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = 50,
+        min_samples: int = 20,
+        p95_threshold: float = 1.5,
+        failure_rate: float = 0.5,
+        low_confidence_rate: float = 0.5,
+        cooldown: float = 30.0,
+        probe_fraction: float = 0.1,
+        probe_successes: int = 5,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.min_samples = max(1, int(min_samples))
+        self.p95_threshold = float(p95_threshold)
+        self.failure_rate = float(failure_rate)
+        self.low_confidence_rate = float(low_confidence_rate)
+        self.cooldown = float(cooldown)
+        self.probe_fraction = float(probe_fraction)
+        self.probe_successes = max(1, int(probe_successes))
+        self._rng = rng
+        self._window: deque = deque(maxlen=max(self.min_samples, int(window)))  # (latency, outcome)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_ok = 0
+        self.reason: Optional[str] = None
+        self.skipped = 0
+        self.transition_count = 0
+        self.transitions: deque = deque(maxlen=20)  # (wall time, old, new, reason)
+        self._listeners: List[Callable[[str, str, Optional[str]], None]] = []
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "CircuitBreaker":
+        """Build a breaker from `<prefix>_P95_MS`, `_FAILURE_RATE`,
+        `_LOW_CONFIDENCE_RATE`, `_WINDOW`, `_MIN_SAMPLES`, `_COOLDOWN`,
+        `_PROBE_FRACTION` and `_PROBE_SUCCESSES` env vars."""
+        return cls(
+            window=env_number(f"{prefix}_WINDOW", 50, int),
+            min_samples=env_number(f"{prefix}_MIN_SAMPLES", 20, int),
+            p95_threshold=env_number(f"{prefix}_P95_MS", 1500.0, float) / 1000.0,
+            failure_rate=env_number(f"{prefix}_FAILURE_RATE", 0.5, float),
+            low_confidence_rate=env_number(f"{prefix}_LOW_CONFIDENCE_RATE", 0.5, float),
+            cooldown=env_number(f"{prefix}_COOLDOWN", 30.0, float),
+            probe_fraction=env_number(f"{prefix}_PROBE_FRACTION", 0.1, float),
+            probe_successes=env_number(f"{prefix}_PROBE_SUCCESSES", 5, int),
+        )
+
+    def add_listener(self, fn: Callable[[str, str, Optional[str]], None]) -> None:
+        """Call `fn(old_state, new_state, reason)` on every transition."""
+        self._listeners.append(fn)
+
+    def _move(self, new: str, reason: Optional[str]) -> Callable[[], None]:
+        # Caller holds the lock; listeners run after it is released
+        old = self.state
+        self.state = new
+        self.reason = reason
+        self._probe_ok = 0
+        if new == OPEN:
+            self._opened_at = time.monotonic()
+        if new == CLOSED:
+            self._window.clear()
+        self.transitions.append((time.time(), old, new, reason))
+        self.transition_count += 1
+
+        def notify():
+            logger.warning("ML circuit breaker %s -> %s (%s)", old, new, reason)
+            for fn in self._listeners:
+                try:
+                    fn(old, new, reason)
+                except Exception:
+                    logger.exception("Circuit breaker listener failed")
+        return notify
+
+    def allow(self) -> bool:
+        """Whether this request may try ML (False means go straight to rules)."""
+        notify = None
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                notify = self._move(HALF_OPEN, "cooldown elapsed")
+            if self.state == CLOSED:
+                allowed = True
+            else:
+                allowed = self.state == HALF_OPEN and self._rng() < self.probe_fraction
+            if not allowed:
+                self.skipped += 1
+        if notify:
+            notify()
+        return allowed
+
+    def record(self, latency: float, outcome: str) -> None:
+        """Report one ML call: its latency in seconds and OK/FAILURE/LOW_CONFIDENCE."""
+        notify = None
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if outcome == OK and latency <= self.p95_threshold:
+                    self._probe_ok += 1
+                    if self._probe_ok >= self.probe_successes:
+                        notify = self._move(CLOSED, "probes succeeded")
+                else:
+                    notify = self._move(OPEN, f"probe {outcome} in {latency * 1000:.0f} ms")
+            elif self.state == CLOSED:
+                self._window.append((latency, outcome))
+                reason = self._trip_reason()
+                if reason:
+                    notify = self._move(OPEN, reason)
+        if notify:
+            notify()
+
+    def _trip_reason(self) -> Optional[str]:
+        n = len(self._window)
+        if n < self.min_samples:
+            return None
+        p95 = _p95([lat for lat, _ in self._window])
+        if p95 > self.p95_threshold:
+            return f"p95 latency {p95 * 1000:.0f} ms > {self.p95_threshold * 1000:.0f} ms"
+        failures = sum(1 for _, o in self._window if o == FAILURE) / n
+        if failures > self.failure_rate:
+            return f"failure rate {failures:.0%} > {self.failure_rate:.0%}"
+        low = sum(1 for _, o in self._window if o == LOW_CONFIDENCE) / n
+        if low > self.low_confidence_rate:
+            return f"low-confidence rate {low:.0%} > {self.low_confidence_rate:.0%}"
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            n = len(self._window)
+            return {
+                "state": self.state,
+                "reason": self.reason,
+                "samples": n,
+                "p95_ms": _p95([lat for lat, _ in self._window]) * 1000 if n else None,
+                "failure_rate": sum(1 for _, o in self._window if o == FAILURE) / n if n else 0.0,
+                "low_confidence_rate": sum(1 for _, o in self._window if o == LOW_CONFIDENCE) / n if n else 0.0,
+                "skipped": self.skipped,
+                "transition_count": self.transition_count,
+                "transitions": [
+                    {"at": at, "from": old, "to": new, "reason": reason} for at, old, new, reason in self.transitions
+                ],
+            }
@@ -17,8 +17,12 @@ def _anonymize_text(text: str) -> str:
     return text
 
 
-def create_session_with_audit(db: Session, *, input_text: str, risk_level: str, predicted_conditions: Optional[List[str]], next_step: str, confidence_score: Optional[float], endpoint: str, fallback_to_rule: bool, user_id: Optional[int] = None):
-    """Create a session row and a corresponding audit_log entry in a transaction."""
+def create_session_with_audit(db: Session, *, input_text: str, risk_level: str, predicted_conditions: Optional[List[str]], next_step: str, confidence_score: Optional[float], endpoint: str, fallback_to_rule: bool, user_id: Optional[int] = None, breaker_state: Optional[str] = None, model_version: Optional[str] = None):
+    """Create a session row and a corresponding audit_log entry in a transaction.
+
+    `breaker_state` records the ML circuit breaker state for ML requests and
+    `model_version` the version of the model that answered.
+    """
     clean_text = _anonymize_text(input_text)
     # Normalize risk_level into the RiskLevelEnum used by the ORM
     try:
@@ -52,6 +56,8 @@ def create_session_with_audit(db: Session, *, input_text: str, risk_level: str,
         session_id=sess.session_id,
         endpoint=endpoint,
         fallback_to_rule=fallback_to_rule,
+        breaker_state=breaker_state,
+        model_version=model_version,
     )
     db.add(audit)
     try:
@@ -62,3 +68,61 @@ def create_session_with_audit(db: Session, *, input_text: str, risk_level: str,
         raise
     db.refresh(sess)
     return sess, audit
+
+
+def record_breaker_transition(db: Session, *, breaker: str, from_state: str, to_state: str, reason: Optional[str], fallback_to_rule: bool):
+    """Write a breaker_audit_log row for one circuit breaker state change."""
+    row = models.BreakerAuditLog(breaker=breaker, from_state=from_state, to_state=to_state, reason=(reason or "")[:255] or None, fallback_to_rule=fallback_to_rule)
+    db.add(row)
+    try:
+        db.commit()
+    except Exception:
+        logger.exception("DB commit failed in record_breaker_transition")
+        db.rollback()
+        raise
+    return row
+
+
+def create_sessions_with_audit(db: Session, items: List[dict], *, endpoint: str, fallback_to_rule: bool = False, user_id: Optional[int] = None, model_version: Optional[str] = None) -> List[int]:
+    """Bulk variant of `create_session_with_audit`.
+
+    Each item carries input_text, risk_level, predicted_conditions, next_step
+    and confidence_score, and may override `fallback_to_rule` and
+    `model_version` for its own audit row. All session and audit rows are written in a single
+    transaction; the new session ids are returned in input order.
+    """
+    sessions = []
+    for item in items:
+        risk_level = item.get("risk_level")
+        try:
+            risk_enum = risk_level if isinstance(risk_level, models.RiskLevelEnum) else models.RiskLevelEnum(str(risk_level).lower())
+        except Exception:
+            logger.exception("Invalid risk_level passed to create_sessions_with_audit, defaulting to 'low'")
+            risk_enum = models.RiskLevelEnum.low
+        preds = item.get("predicted_conditions")
+        sessions.append(models.Session(
+            user_id=user_id,
+            input_text=_anonymize_text(item.get("input_text")),
+            risk_level=risk_enum,
+            predicted_conditions=preds if preds is not None else [],
+            next_step=item.get("next_step"),
+            confidence_score=item.get("confidence_score"),
+        ))
+    db.add_all(sessions)
+    db.flush()  # assign session_ids for the whole batch
+
+    audits = [
+        models.AuditLog(session_id=s.session_id, endpoint=endpoint, fallback_to_rule=item.get("fallback_to_rule", fallback_to_rule), model_version=item.get("model_version", model_version))
+        for s, item in zip(sessions, items)
+    ]
+    db.add_all(audits)
+    # Read ids before commit; afterwards they are expired and would cost a
+    # SELECT per row to reload
+    session_ids = [s.session_id for s in sessions]
+    try:
+        db.commit()
+    except Exception:
+        logger.exception("DB commit failed in create_sessions_with_audit")
+        db.rollback()
+        raise
+    return session_ids
@@ -4,11 +4,21 @@ from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 from pydantic import BaseModel
 from typing import Optional
-from triage import classify_symptom
+from triage import classify_symptom, classify_symptoms, get_rule_engine
+from triage import cache_stats as rule_cache_stats
 from ml_triage import ml_triage, try_ml_triage, _ml
-from ml_triage import try_heart_attack_triage
+from ml_triage import cache_stats as ml_cache_stats, batch_stats as ml_batch_stats
+from ml_triage import add_breaker_listener as add_ml_breaker_listener, breaker_state as ml_breaker_state, breaker_stats as ml_breaker_stats
+from ml_triage import try_heart_attack_triage, try_heart_attack_triage_batch
+from ml_triage import model_version as ml_model_version, registry_stats as ml_registry_stats
+from circuit_breaker import CLOSED as BREAKER_CLOSED
+from cascade import RULES as CASCADE_RULES, cascade_enabled, cascade_stats, tier_model_version, triage_cascade
+from warmup import readiness, start_warmup
+from model_server import client_stats as model_server_stats
 import os
 import logging
+import queue
+import threading
 import time
 from datetime import datetime, timedelta
 from fastapi import Depends
@@ -34,6 +44,52 @@ except Exception:
 
 logger = logging.getLogger(__name__)
 
+
+# Breaker transitions waiting to be written by the audit writer thread, so a
+# slow or unreachable DB never delays the request that tripped the breaker
+_BREAKER_AUDIT_QUEUE: "queue.Queue[tuple]" = queue.Queue(maxsize=256)
+_breaker_audit_writer: Optional[threading.Thread] = None
+_breaker_audit_lock = threading.Lock()
+
+
+def _audit_breaker_transition(old: str, new: str, reason: Optional[str]) -> None:
+    """Audit every ML circuit breaker transition; /triage_ml rows only stamp
+    the state at request time, which misses changes between requests."""
+    global _breaker_audit_writer
+    if not DB_ENABLED:
+        return
+    try:
+        _BREAKER_AUDIT_QUEUE.put_nowait((old, new, reason))
+    except queue.Full:
+        logger.warning("Breaker audit queue full; dropping ML breaker %s -> %s", old, new)
+        return
+    with _breaker_audit_lock:
+        if _breaker_audit_writer is None or not _breaker_audit_writer.is_alive():
+            _breaker_audit_writer = threading.Thread(target=_write_breaker_audits, name="breaker-audit", daemon=True)
+            _breaker_audit_writer.start()
+
+
+def _write_breaker_audits() -> None:
+    while True:
+        old, new, reason = _BREAKER_AUDIT_QUEUE.get()
+        try:
+            _gen = get_db()
+            db = next(_gen)
+            try:
+                crud.record_breaker_transition(db, breaker="ml", from_state=old, to_state=new, reason=reason, fallback_to_rule=new != BREAKER_CLOSED)
+            finally:
+                try:
+                    _gen.close()
+                except Exception:
+                    pass
+        except Exception:
+            logger.exception("Failed to record ML circuit breaker transition")
+        finally:
+            _BREAKER_AUDIT_QUEUE.task_done()
+
+
+add_ml_breaker_listener(_audit_breaker_transition)
+
 def hash_password(password: str) -> str:
     salt = secrets.token_hex(16)
     return f"{salt}:{hashlib.sha256((salt + password).encode()).hexdigest()}"
@@ -136,7 +192,7 @@ app = FastAPI(title="MedTriage - Symptom Checker (MVP)")
 @app.middleware("http")
 async def simple_rate_limiter(request, call_next):
     # Apply only to triage POST endpoints to avoid over-limiting other routes
-    if request.method == "POST" and request.url.path in ("/triage", "/triage_ml"):
+    if request.method == "POST" and request.url.path in ("/triage", "/triage_ml", "/triage/batch"):
         client_ip = request.client.host if request.client else "unknown"
         now = time.time()
         max_requests, window = _get_rate_limit_config()
@@ -169,16 +225,14 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan handler: runs at startup and shutdown.
 
-    Preloads ML model when MEDTRIAGE_PRELOAD_ML=1 to avoid model downloads in
-    request handlers.
+    Starts the warmup (see warmup.py) on a background thread: the rule pack,
+    heart model and calibrator, plus the zero-shot model when
+    MEDTRIAGE_PRELOAD_ML=1, are loaded and exercised with dummy inferences.
+    /healthz answers right away; /readyz reports ready once warmup is done.
+    The heavy ML libraries are only imported here or on first use, never at
+    module import.
     """
-    preload = os.environ.get("MEDTRIAGE_PRELOAD_ML", "0")
-    if preload == "1":
-        try:
-            _ml._init()
-            logger.info("ML model preloaded at startup via lifespan handler")
-        except Exception:
-            logger.exception("Failed to preload ML model at startup; continuing with rule-based fallback")
+    start_warmup()
     yield
 
 
@@ -208,10 +262,52 @@ def serve_browser_post():
     return FileResponse(html_path)
 
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: warmup finished and required components are loaded.
+
+    Per-component state and load durations are included either way; returns
+    503 until the worker should receive traffic.
+    """
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    """In-process runtime counters (caches etc.) for this worker."""
+    from ml.heart_attack import cache_stats as heart_cache_stats, loader_stats as heart_loader_stats
+
+    return {
+        "rule_cache": rule_cache_stats(),
+        "ml_cache": ml_cache_stats(),
+        "ml_batching": ml_batch_stats(),
+        "ml_breaker": ml_breaker_stats(),
+        "model_server": model_server_stats(),
+        "cascade": cascade_stats(),
+        "heart_loading": heart_loader_stats(),
+        "heart_cache": heart_cache_stats(),
+        "ml_model": ml_registry_stats(),
+    }
+
+
 class TriageRequest(BaseModel):
     symptom: str
 
 
+class MatchSpan(BaseModel):
+    start: int
+    end: int
+    trigger: str
+    weight: float
+
+
 class TriageResponse(BaseModel):
     risk: str
     suggestion: str
@@ -219,6 +315,27 @@ class TriageResponse(BaseModel):
     score: Optional[float] = None
     matches: Optional[list[str]] = None
     session_id: Optional[int] = None
+    rules_version: Optional[str] = None
+    spans: Optional[list[MatchSpan]] = None
+    tier: Optional[str] = None
+
+
+def _match_spans(spans) -> list[MatchSpan]:
+    return [MatchSpan(start=a, end=b, trigger=t, weight=w) for a, b, t, w in spans]
+
+
+class TriageBatchRequest(BaseModel):
+    symptoms: list[str]
+
+
+class TriageBatchItem(BaseModel):
+    index: int
+    result: Optional[TriageResponse] = None
+    error: Optional[str] = None
+
+
+class TriageBatchResponse(BaseModel):
+    results: list[TriageBatchItem]
 
 
 class UserRegister(BaseModel):
@@ -260,6 +377,14 @@ class HeartTriageResponse(BaseModel):
     rule_suggestion: Optional[str] = None
 
 
+class HeartTriageBatchRequest(BaseModel):
+    patients: list[HeartTriageRequest]
+
+
+class HeartTriageBatchResponse(BaseModel):
+    results: list[HeartTriageResponse]
+
+
 def get_current_user_id(request: Request) -> Optional[int]:
     """Extract user_id from JWT token if present, otherwise return None for anonymous users."""
     auth_header = request.headers.get("authorization")
@@ -281,7 +406,9 @@ def triage(req: TriageRequest, request: Request = None):
     if req.symptom and len(req.symptom) > 2000:
         return JSONResponse({"detail": "symptom text too long"}, status_code=413)
 
-    risk, suggestion, conditions, score, matches = classify_symptom(req.symptom)
+    # Pin the rule pack for this request so the reported version matches the result
+    engine = get_rule_engine()
+    risk, suggestion, conditions, score, matches, spans = classify_symptom(req.symptom, engine=engine, spans=True)
     
     # Get user_id if authenticated, otherwise None for anonymous
     user_id = get_current_user_id(request) if request else None
@@ -310,7 +437,81 @@ def triage(req: TriageRequest, request: Request = None):
     except Exception:
         sess_id = None
 
-    return TriageResponse(risk=risk, suggestion=suggestion, conditions=conditions, score=score, matches=matches, session_id=sess_id)
+    return TriageResponse(risk=risk, suggestion=suggestion, conditions=conditions, score=score, matches=matches, session_id=sess_id, rules_version=engine.version, spans=_match_spans(spans))
+
+
+def _get_batch_max() -> int:
+    try:
+        return int(os.environ.get("MEDTRIAGE_BATCH_MAX", "100"))
+    except Exception:
+        return 100
+
+
+@app.post("/triage/batch", response_model=TriageBatchResponse)
+def triage_batch(req: TriageBatchRequest, request: Request = None):
+    """Rule-based triage for a list of symptom texts.
+
+    Results come back in input order; an item that can't be triaged (empty or
+    too long) carries an `error` instead of a `result`. All sessions for the
+    batch are recorded in one DB transaction.
+    """
+    if len(req.symptoms) > _get_batch_max():
+        return JSONResponse({"detail": "too many symptoms in batch"}, status_code=413)
+
+    # Per-item validation mirrors /triage; invalid items are skipped by the classifier
+    texts = [s if len(s) <= 2000 else None for s in req.symptoms]
+    engine = get_rule_engine()
+    outcomes = classify_symptoms([t for t in texts if t is not None], engine=engine, spans=True)
+
+    items: list[TriageBatchItem] = []
+    it = iter(outcomes)
+    for i, text in enumerate(texts):
+        if text is None:
+            items.append(TriageBatchItem(index=i, error="symptom text too long"))
+            continue
+        out = next(it)
+        if isinstance(out, Exception):
+            items.append(TriageBatchItem(index=i, error=str(out)))
+            continue
+        risk, suggestion, conditions, score, matches, spans = out
+        items.append(TriageBatchItem(index=i, result=TriageResponse(risk=risk, suggestion=suggestion, conditions=conditions, score=score, matches=matches, rules_version=engine.version, spans=_match_spans(spans))))
+
+    # Get user_id if authenticated, otherwise None for anonymous
+    user_id = get_current_user_id(request) if request else None
+
+    ok = [item for item in items if item.result is not None]
+    try:
+        if DB_ENABLED and ok:
+            _gen = get_db()
+            db = next(_gen)
+            try:
+                session_ids = crud.create_sessions_with_audit(
+                    db,
+                    [
+                        {
+                            "input_text": req.symptoms[item.index],
+                            "risk_level": item.result.risk,
+                            "predicted_conditions": item.result.conditions,
+                            "next_step": item.result.suggestion,
+                            "confidence_score": item.result.score,
+                        }
+                        for item in ok
+                    ],
+                    endpoint="/triage/batch",
+                    fallback_to_rule=False,
+                    user_id=user_id,
+                )
+                for item, sid in zip(ok, session_ids):
+                    item.result.session_id = sid
+            finally:
+                try:
+                    _gen.close()
+                except Exception:
+                    pass
+    except Exception:
+        logger.exception("Failed to record batch sessions")
+
+    return TriageBatchResponse(results=items)
 
 
 @app.post("/triage_ml", response_model=TriageResponse)
@@ -319,19 +520,40 @@ def triage_ml(req: TriageRequest, request: Request = None):
 
     This will attempt to use a transformers zero-shot model. If the model is
     unavailable or fails, it falls back to the rule-based `classify_symptom`.
+    With MEDTRIAGE_ML_CASCADE=1 the request goes through the rules ->
+    distilled -> transformer cascade instead (see cascade.py).
     """
     fallback = False
+    rules_version = None
+    model_version = None
+    spans = None
+    tier = None
     # Basic input validation: prevent extremely long inputs
     if req.symptom and len(req.symptom) > 2000:
         return JSONResponse({"detail": "symptom text too long"}, status_code=413)
 
-    try:
-        # Attempt ML with a short timeout to avoid blocking the UI while a model downloads
-        risk, suggestion, conditions, score, matches = try_ml_triage(req.symptom, timeout=2.0)
-    except Exception:
-        # Fallback to rule-based
-        fallback = True
-        risk, suggestion, conditions, score, matches = classify_symptom(req.symptom)
+    if cascade_enabled():
+        (risk, suggestion, conditions, score, matches), tier, rule_spans = triage_cascade(req.symptom, timeout=2.0)
+        model_version = tier_model_version(tier)
+        if tier == CASCADE_RULES:
+            fallback = True
+            rules_version = get_rule_engine().version
+            spans = _match_spans(rule_spans)
+    else:
+        try:
+            # Attempt ML with a short timeout to avoid blocking the UI while a model downloads
+            risk, suggestion, conditions, score, matches = try_ml_triage(req.symptom, timeout=2.0)
+            model_version = ml_model_version()
+        except Exception:
+            # Fallback to rule-based
+            fallback = True
+            engine = get_rule_engine()
+            rules_version = engine.version
+            risk, suggestion, conditions, score, matches, rule_spans = classify_symptom(req.symptom, engine=engine, spans=True)
+            spans = _match_spans(rule_spans)
+
+    # State after the call, so the request that trips the breaker records it
+    breaker_state = ml_breaker_state()
 
     # Get user_id if authenticated, otherwise None for anonymous
     user_id = get_current_user_id(request) if request else None
@@ -342,7 +564,7 @@ def triage_ml(req: TriageRequest, request: Request = None):
             _gen = get_db()
             db = next(_gen)
             try:
-                sess, _ = crud.create_session_with_audit(db, input_text=req.symptom, risk_level=risk, predicted_conditions=conditions, next_step=suggestion, confidence_score=score, endpoint="/triage_ml", fallback_to_rule=fallback, user_id=user_id)
+                sess, _ = crud.create_session_with_audit(db, input_text=req.symptom, risk_level=risk, predicted_conditions=conditions, next_step=suggestion, confidence_score=score, endpoint="/triage_ml", fallback_to_rule=fallback, user_id=user_id, breaker_state=breaker_state, model_version=model_version)
             finally:
                 try:
                     _gen.close()
@@ -357,37 +579,11 @@ def triage_ml(req: TriageRequest, request: Request = None):
     except Exception:
         sess_id = None
 
-    return TriageResponse(risk=risk, suggestion=suggestion, conditions=conditions, score=score, matches=matches, session_id=sess_id)
-
-
-@app.post("/triage_heart", response_model=HeartTriageResponse)
-def triage_heart(req: HeartTriageRequest, request: Request = None):
-    """Heart-attack-specific triage endpoint. Returns prediction, confidence and important features.
-
-    Falls back to rule-based classifier if heart model fails.
+    return TriageResponse(risk=risk, suggestion=suggestion, conditions=conditions, score=score, matches=matches, session_id=sess_id, rules_version=rules_version, spans=spans, tier=tier)
 
-        OpenAPI example input:
 
-        {
-            "age": 63,
-            "sex": 1,
-            "cp": 3,
-            "trestbps": 145,
-            "chol": 233,
-            "fbs": 1,
-            "thalach": 150,
-            "exang": 0,
-            "oldpeak": 2.3
-        }
-
-        Example response:
-
-        {
-            "prediction": "Heart Attack Risk",
-            "confidence": 0.87,
-            "important_features": ["cp", "oldpeak", "thalach"]
-        }
-    """
+def _heart_input(req: HeartTriageRequest) -> dict:
+    """Coerce and range-check a heart request into the model's feature dict."""
     # Use model_dump for Pydantic v2 compatibility
     try:
         # Coerce and validate inputs (accept strings for numeric fields)
@@ -436,9 +632,15 @@ def triage_heart(req: HeartTriageRequest, request: Request = None):
     except Exception:
         # Fallback for Pydantic v1
         data = req.dict()
-    # Try the specialized heart model
-    pred, conf, matches, failed = try_heart_attack_triage(data)
+    return data
 
+
+def _heart_outcome(data: dict, pred, conf, matches, failed, model_version=None) -> dict:
+    """Turn a heart model result (see `try_heart_attack_triage`) into the
+    response fields, falling back to rule triage when the model failed or
+    abstained."""
+    # Only a model that actually answered is attributed
+    answered_by = None if (failed or pred is None) else model_version
     fallback = False
     # Prepare placeholders
     conditions = []
@@ -524,6 +726,77 @@ def triage_heart(req: HeartTriageRequest, request: Request = None):
     except Exception:
         db_risk = 'low'
 
+
+    important = []
+    try:
+        # Convert matches to list[str]
+        important = [str(m) for m in matches] if matches else []
+    except Exception:
+        important = []
+
+    return {
+        "prediction": pred,
+        "confidence": float(conf),
+        "suggestion": suggestion,
+        "conditions": conditions,
+        "matches": matches,
+        "important": important,
+        "fallback": fallback,
+        "db_risk": db_risk,
+        "model_version": answered_by,
+    }
+
+
+def _heart_session_item(data: dict, out: dict) -> dict:
+    # Ensure predicted_conditions is JSON-serializable list and risk_level is standardized
+    conditions, matches, pred = out["conditions"], out["matches"], out["prediction"]
+    preds_for_db = conditions if isinstance(conditions, (list, tuple)) else (matches if matches else [])
+    return {
+        "input_text": str(data),
+        "risk_level": out["db_risk"],
+        "predicted_conditions": list(preds_for_db),
+        "next_step": (out["suggestion"] or ("Visit ER immediately" if pred == 'Heart Attack Risk' else "No immediate action")),
+        "confidence_score": float(out["confidence"] or 0.0),
+        "model_version": out["model_version"],
+    }
+
+
+def _heart_response(out: dict) -> HeartTriageResponse:
+    return HeartTriageResponse(prediction=out["prediction"], confidence=out["confidence"], important_features=out["important"], suggestion=(out["suggestion"] or None))
+
+
+@app.post("/triage_heart", response_model=HeartTriageResponse)
+def triage_heart(req: HeartTriageRequest, request: Request = None):
+    """Heart-attack-specific triage endpoint. Returns prediction, confidence and important features.
+
+    Falls back to rule-based classifier if heart model fails.
+
+        OpenAPI example input:
+
+        {
+            "age": 63,
+            "sex": 1,
+            "cp": 3,
+            "trestbps": 145,
+            "chol": 233,
+            "fbs": 1,
+            "thalach": 150,
+            "exang": 0,
+            "oldpeak": 2.3
+        }
+
+        Example response:
+
+        {
+            "prediction": "Heart Attack Risk",
+            "confidence": 0.87,
+            "important_features": ["cp", "oldpeak", "thalach"]
+        }
+    """
+    data = _heart_input(req)
+    # Try the specialized heart model
+    out = _heart_outcome(data, *try_heart_attack_triage(data))
+
     # Record session in DB if enabled (audit will indicate fallback when used)
     user_id = get_current_user_id(request) if request else None
     try:
@@ -531,19 +804,7 @@ def triage_heart(req: HeartTriageRequest, request: Request = None):
             _gen = get_db()
             db = next(_gen)
             try:
-                # Ensure predicted_conditions is JSON-serializable list and risk_level is standardized
-                preds_for_db = conditions if isinstance(conditions, (list, tuple)) else (matches if matches else [])
-                sess, _ = crud.create_session_with_audit(
-                    db,
-                    input_text=str(data),
-                    risk_level=db_risk,
-                    predicted_conditions=list(preds_for_db),
-                    next_step=(suggestion or ("Visit ER immediately" if pred == 'Heart Attack Risk' else "No immediate action")),
-                    confidence_score=float(conf or 0.0),
-                    endpoint="/triage_heart",
-                    fallback_to_rule=fallback,
-                    user_id=user_id,
-                )
+                sess, _ = crud.create_session_with_audit(db, **_heart_session_item(data, out), endpoint="/triage_heart", fallback_to_rule=out["fallback"], user_id=user_id)
             finally:
                 try:
                     _gen.close()
@@ -552,14 +813,44 @@ def triage_heart(req: HeartTriageRequest, request: Request = None):
     except Exception:
         logger.exception("Failed to record heart triage session")
 
-    important = []
+    return _heart_response(out)
+
+
+@app.post("/triage_heart/batch", response_model=HeartTriageBatchResponse)
+def triage_heart_batch(req: HeartTriageBatchRequest, request: Request = None):
+    """Heart triage for a list of patients.
+
+    All rows are scored by the heart model in one call; each result is the
+    same as `/triage_heart` would return for that patient, in input order.
+    All sessions for the batch are recorded in one DB transaction.
+    """
+    if len(req.patients) > _get_batch_max():
+        return JSONResponse({"detail": "too many patients in batch"}, status_code=413)
+
+    rows = [_heart_input(p) for p in req.patients]
+    outcomes = [_heart_outcome(data, *res) for data, res in zip(rows, try_heart_attack_triage_batch(rows))]
+
+    user_id = get_current_user_id(request) if request else None
     try:
-        # Convert matches to list[str]
-        important = [str(m) for m in matches] if matches else []
+        if DB_ENABLED and outcomes:
+            _gen = get_db()
+            db = next(_gen)
+            try:
+                crud.create_sessions_with_audit(
+                    db,
+                    [dict(_heart_session_item(data, out), fallback_to_rule=out["fallback"]) for data, out in zip(rows, outcomes)],
+                    endpoint="/triage_heart/batch",
+                    user_id=user_id,
+                )
+            finally:
+                try:
+                    _gen.close()
+                except Exception:
+                    pass
     except Exception:
-        important = []
+        logger.exception("Failed to record heart batch sessions")
 
-    return HeartTriageResponse(prediction=pred, confidence=float(conf), important_features=important, suggestion=(suggestion or None))
+    return HeartTriageBatchResponse(results=[_heart_response(out) for out in outcomes])
 
 
 @app.post("/auth/register")
@@ -0,0 +1,71 @@
+"""
+Probability calibration as a monotone lookup table.
+
+A `CalibrationTable` maps raw model probabilities to calibrated ones by
+linear interpolation between knots (`np.interp`), so applying it is a
+couple of array operations for one value or a million, and loading it
+needs neither sklearn nor pickle. Tables are built offline from a fitted
+calibrator (Platt-style LogisticRegression on the raw probability, or
+IsotonicRegression) by `scripts/build_heart_calibration.py` and
+`scripts/train_heart_model.py`, and stored as a small .npz file.
+"""
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+DEFAULT_KNOTS = 257
+
+
+class CalibrationTable:
+    def __init__(self, x: np.ndarray, y: np.ndarray, source: str = ""):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.ndim != 1 or x.shape != y.shape or len(x) < 2:
+            raise ValueError("knots must be two 1-d arrays of the same length (at least 2)")
+        if np.any(np.diff(x) <= 0) or np.any(np.diff(y) < 0):
+            raise ValueError("knots must be strictly increasing in x and non-decreasing in y")
+        self.x = x
+        self.y = np.clip(y, 0.0, 1.0)
+        self.source = source
+
+    @classmethod
+    def from_calibrator(cls, calibrator, knots: int = DEFAULT_KNOTS) -> "CalibrationTable":
+        """Tabulate a fitted calibrator over [0, 1].
+
+        IsotonicRegression is already piecewise linear and is copied exactly;
+        anything else is sampled on an even grid of `knots` points and forced
+        monotone (a running maximum) so the table can never reorder patients.
+        """
+        thresholds = getattr(calibrator, "X_thresholds_", None)
+        if thresholds is not None:
+            x, y = np.asarray(thresholds, dtype=np.float64), np.asarray(calibrator.y_thresholds_, dtype=np.float64)
+            # Flat ends reproduce the clipping isotonic regression does outside its range
+            if x[0] > 0.0:
+                x, y = np.r_[0.0, x], np.r_[y[0], y]
+            if x[-1] < 1.0:
+                x, y = np.r_[x, 1.0], np.r_[y, y[-1]]
+            return cls(x, y, source=type(calibrator).__name__)
+        x = np.linspace(0.0, 1.0, knots)
+        if hasattr(calibrator, "predict_proba"):
+            y = calibrator.predict_proba(x.reshape(-1, 1))[:, 1]
+        else:
+            y = calibrator.predict(x)
+        return cls(x, np.maximum.accumulate(np.asarray(y, dtype=np.float64)), source=type(calibrator).__name__)
+
+    def __call__(self, p: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Calibrated probability for a scalar (returns float) or array."""
+        out = np.interp(p, self.x, self.y)
+        return float(out) if np.ndim(out) == 0 else out
+
+    def save(self, path: Union[str, Path]) -> None:
+        from artifacts import atomic_write
+
+        # np.savez appends .npz unless given a file object
+        with atomic_write(path) as fh:
+            np.savez(fh, x=self.x, y=self.y, source=np.array(self.source))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "CalibrationTable":
+        with np.load(str(path), allow_pickle=False) as data:
+            return cls(data["x"], data["y"], str(data["source"]))
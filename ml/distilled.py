@@ -0,0 +1,106 @@
+"""
+Distilled symptom-text classifier: hashed n-grams + multinomial logistic regression.
+
+A compact student of the zero-shot model, trained offline by
+`scripts/distill_triage_model.py` on session texts labelled by the
+transformer. Prediction only needs numpy: the normalized text's word
+unigrams and bigrams are hashed (crc32, stable across processes) into
+`n_features` buckets, the matching weight rows are summed and a softmax
+gives per-label probabilities.
+
+The artifact is a single .npz file (models/triage_distilled.npz by default,
+override with MEDTRIAGE_DISTILLED_PATH) holding weights, bias, labels, the
+feature count and a version string.
+"""
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from result_cache import normalize_symptom_text
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parents[1]
+DISTILLED_PATH = Path(os.environ.get("MEDTRIAGE_DISTILLED_PATH", str(ROOT / "models" / "triage_distilled.npz")))
+
+DEFAULT_FEATURES = 2 ** 18
+
+
+def features(text: str, n_features: int) -> List[int]:
+    """Sorted distinct hashed feature indices for `text` (normalized here)."""
+    out = set()
+    # Punctuation (" . " after normalization) ends a phrase; bigrams don't cross it
+    for phrase in normalize_symptom_text(text).split(" . "):
+        words = [w for w in phrase.split(" ") if w]
+        for i, w in enumerate(words):
+            out.add(zlib.crc32(b"w:" + w.encode("utf-8")) % n_features)
+            if i:
+                out.add(zlib.crc32(("b:%s %s" % (words[i - 1], w)).encode("utf-8")) % n_features)
+    return sorted(out)
+
+
+class DistilledClassifier:
+    """Linear model over hashed n-gram features; `classify` returns
+    (label, probability) pairs sorted by probability, like MLClassifier."""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: Sequence[str], version: str = "distilled"):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = list(labels)
+        self.version = version
+        if self.weights.shape[1] != len(self.labels) or self.bias.shape != (len(self.labels),):
+            raise ValueError("weights, bias and labels disagree on the number of classes")
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    def probabilities(self, text: str) -> np.ndarray:
+        idx = features(text, self.n_features)
+        logits = self.bias + (self.weights[idx].sum(axis=0) if idx else 0.0)
+        logits = np.exp(logits - logits.max())
+        return logits / logits.sum()
+
+    def classify(self, text: str) -> List[Tuple[str, float]]:
+        probs = self.probabilities(text)
+        order = np.argsort(-probs, kind="stable")
+        return [(self.labels[i], float(probs[i])) for i in order]
+
+    def save(self, path: Union[str, Path]) -> None:
+        from artifacts import atomic_write
+
+        # np.savez appends .npz unless given a file object
+        with atomic_write(path) as fh:
+            np.savez_compressed(fh, weights=self.weights, bias=self.bias, labels=np.array(self.labels), version=np.array(self.version))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "DistilledClassifier":
+        with np.load(str(path), allow_pickle=False) as data:
+            return cls(data["weights"], data["bias"], [str(s) for s in data["labels"]], str(data["version"]))
+
+
+_model: Optional[DistilledClassifier] = None
+_loaded = False
+_model_lock = threading.Lock()
+
+
+def load_distilled() -> Optional[DistilledClassifier]:
+    """The shipped distilled model, or None if no artifact exists or it
+    can't be read (checked once per process; a corrupt artifact is logged
+    and the cascade skips the distilled tier)."""
+    global _model, _loaded
+    if not _loaded:
+        with _model_lock:
+            if not _loaded:
+                try:
+                    _model = DistilledClassifier.load(DISTILLED_PATH) if DISTILLED_PATH.exists() else None
+                except Exception:
+                    logger.exception("Failed to load distilled model %s; skipping the distilled tier", DISTILLED_PATH)
+                    _model = None
+                _loaded = True
+    return _model
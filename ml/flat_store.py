@@ -0,0 +1,74 @@
+"""
+Single-file store for named NumPy arrays that loads by memory-mapping.
+
+Layout:
+
+    8 bytes   magic b"MTFLAT01"
+    8 bytes   header length, little-endian uint64
+    header    JSON: {"meta": {...}, "arrays": {name: {"dtype", "shape", "offset"}}}
+    arrays    raw C-order data, each starting on a 64-byte boundary
+
+`load` maps the file read-only and returns zero-copy views into it, so
+every process that loads the same file shares one copy of the arrays in
+the page cache instead of holding a private unpickled one. Only plain
+numeric and bool dtypes are stored; nothing is unpickled.
+"""
+from pathlib import Path
+from typing import Dict, Tuple, Union
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b"MTFLAT01"
+ALIGN = 64
+_LENGTH = struct.Struct("<Q")
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def save(path: Union[str, Path], arrays: Dict[str, np.ndarray], meta: dict) -> None:
+    """Write `arrays` and the JSON-serializable `meta` to `path` atomically."""
+    from artifacts import atomic_write
+
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    for name, a in arrays.items():
+        if a.dtype.kind not in "biuf":
+            raise ValueError(f"array {name!r} has unsupported dtype {a.dtype}")
+    # Offsets are relative to the data section, which starts aligned
+    index, offset = {}, 0
+    for name, a in arrays.items():
+        index[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset = _aligned(offset + a.nbytes)
+    header = json.dumps({"meta": meta, "arrays": index}).encode("utf-8")
+    start = _aligned(len(MAGIC) + _LENGTH.size + len(header))
+
+    with atomic_write(path) as fh:
+        fh.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        fh.write(b"\0" * (start - fh.tell()))
+        for name, a in arrays.items():
+            fh.write(b"\0" * (start + index[name]["offset"] - fh.tell()))
+            fh.write(a.tobytes())
+
+
+def load(path: Union[str, Path], mmap: bool = True) -> Tuple[Dict[str, np.ndarray], dict]:
+    """(arrays, meta) from `path`; with `mmap` the arrays are read-only views
+    of a shared mapping, otherwise private copies."""
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a flat array file")
+        (length,) = _LENGTH.unpack(fh.read(_LENGTH.size))
+        header = json.loads(fh.read(length).decode("utf-8"))
+    start = _aligned(len(MAGIC) + _LENGTH.size + length)
+    data = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        begin = start + spec["offset"]
+        view = data[begin:begin + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+        # Plain ndarray views keep the mapping alive without memmap's subclass overhead
+        arrays[name] = np.asarray(view)
+    return arrays, header["meta"]
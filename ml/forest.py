@@ -0,0 +1,146 @@
+"""
+Flat-array inference for fitted sklearn tree ensembles.
+
+`FlatForest.compile(forest)` copies every tree of a fitted
+RandomForestClassifier (or another forest of DecisionTreeClassifiers) into
+one set of contiguous arrays indexed by global node id:
+
+    feature    int16    split feature (0 at leaves)
+    threshold  float64  split threshold (+inf at leaves)
+    children   int32    global [left, right] child ids per node; a leaf
+                        points at itself
+    nan_left   bool     where a NaN goes at this split
+    value      float64  (n_nodes, n_classes) normalized class distribution
+
+Because leaves are self-loops, evaluation needs no per-node branching: all
+(row, tree) cursors start at the tree roots and advance `max_depth` times
+with a handful of gathers, then the leaf distributions are averaged over
+trees. Rows are processed in chunks to bound the (rows x trees) cursor
+matrix.
+
+Thresholds and leaf values stay float64 and inputs are cast to float32
+first, exactly as sklearn does, so `predict_proba` agrees with
+`forest.predict_proba` to floating-point summation order.
+
+`state()` and `from_state()` expose the arrays for ml/flat_store.py, which
+stores them in a file that workers map read-only and share through the page
+cache.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+CHUNK_ROWS = 4096
+
+_ARRAYS = ("feature", "threshold", "children", "nan_left", "value", "roots")
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, children, nan_left, value, roots, max_depth, n_features, classes):
+        self.feature = feature
+        self.threshold = threshold
+        # [left, right] pairs so one gather picks the child: children[2 * node + go_right]
+        self.children = children
+        self.nan_left = nan_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = classes
+
+    @classmethod
+    def compile(cls, forest) -> Optional["FlatForest"]:
+        """Flatten a fitted forest classifier; None if it isn't one this
+        engine can evaluate (multi-output, non-tree estimators, ...)."""
+        from sklearn.tree import DecisionTreeClassifier
+
+        estimators = getattr(forest, "estimators_", None)
+        if not estimators or getattr(forest, "n_outputs_", 1) != 1:
+            return None
+        if not all(isinstance(e, DecisionTreeClassifier) for e in estimators):
+            return None
+        n_classes = len(forest.classes_)
+        n_features = forest.n_features_in_
+        if n_features > np.iinfo(np.int16).max:
+            return None
+
+        features, thresholds, lefts, rights, nan_lefts, values, roots = [], [], [], [], [], [], []
+        base, depth = 0, 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            ids = np.arange(n, dtype=np.int64)
+            leaf = tree.children_left == -1
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, ids, tree.children_left) + base)
+            rights.append(np.where(leaf, ids, tree.children_right) + base)
+            mgl = getattr(tree, "missing_go_to_left", None)
+            nan_lefts.append(np.zeros(n, dtype=bool) if mgl is None else np.asarray(mgl, dtype=bool) & ~leaf)
+            # DecisionTreeClassifier.predict_proba normalizes the stored values
+            v = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            norm = v.sum(axis=1)
+            norm[norm == 0.0] = 1.0
+            values.append(v / norm[:, None])
+            roots.append(base)
+            base += n
+            depth = max(depth, tree.max_depth)
+        if base > np.iinfo(np.int32).max:
+            return None
+        left, right = np.concatenate(lefts), np.concatenate(rights)
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int16),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.stack([left, right], axis=1).ravel(), dtype=np.int32),
+            nan_left=np.ascontiguousarray(np.concatenate(nan_lefts)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=depth,
+            n_features=n_features,
+            classes=forest.classes_,
+        )
+
+    def state(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """The node arrays and the JSON-serializable scalars that rebuild this forest."""
+        arrays = {name: getattr(self, name) for name in _ARRAYS}
+        return arrays, {"max_depth": self.max_depth, "n_features": self.n_features_in_, "classes": np.asarray(self.classes_).tolist()}
+
+    @classmethod
+    def from_state(cls, arrays: Dict[str, np.ndarray], info: dict) -> "FlatForest":
+        """Rebuild from `state()`; the arrays are used as given (e.g. read-only maps)."""
+        return cls(max_depth=info["max_depth"], n_features=info["n_features"], classes=np.asarray(info["classes"]), **{name: arrays[name] for name in _ARRAYS})
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.nan_left, self.value, self.roots))
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Global leaf id reached by each row in each tree, shape (rows, trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        x_flat = X.ravel()
+        # Offset of each row's first feature in x_flat
+        row_base = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        node = np.tile(self.roots, (n_rows, 1))
+        has_nan = bool(np.isnan(x_flat).any())
+        for _ in range(self.max_depth):
+            x = np.take(x_flat, row_base + np.take(self.feature, node))
+            go_right = ~(x <= np.take(self.threshold, node))
+            if has_nan:
+                go_right &= ~(np.isnan(x) & np.take(self.nan_left, node))
+            node = np.take(self.children, 2 * node + go_right)
+        return node
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected {self.n_features_in_} features, got shape {X.shape}")
+        out = np.empty((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            node = self.leaves(X[start:start + CHUNK_ROWS])
+            out[start:start + CHUNK_ROWS] = self.value[node].sum(axis=1) / self.n_trees
+        return out
@@ -7,91 +7,264 @@ features (matching the UCI Heart dataset columns) and returns a tuple:
 
 Example input keys: ['age','sex','cp','trestbps','chol','fbs','restecg',...]
 
-This module lazily loads the model from `models/heart_attack_model.pkl`.
+This module lazily loads the current "heart" version from the model
+registry (model_registry.py: model.pkl, calibration.npz, report.json) and
+swaps in newer versions in the background as the registry pointer moves;
+without a registry version it loads `models/heart_attack_model.pkl`.
+joblib, pandas and scikit-learn are imported on first use as well, so
+importing this module (e.g. for MODEL_PATH) stays cheap.
+
+Predictions go through the pandas-free fast path in ml/heart_fast.py
+when the model's shape allows it, with the forest evaluated from flat
+arrays (ml/forest.py). Set MEDTRIAGE_HEART_FAST_PATH=0 to always use the
+sklearn pipeline, or MEDTRIAGE_HEART_FLAT_FOREST=0 to keep sklearn's own
+forest behind the fast path.
+
+When a flat export of the model sits next to the pickle
+(heart_attack_model.flat, or model.flat in a registry version; written by
+scripts/export_heart_flat.py) it is memory-mapped instead: worker
+processes share its pages, and the pickle (and sklearn) is only loaded if
+a request needs the sklearn pipeline. Set MEDTRIAGE_HEART_MMAP=0 to always
+unpickle.
+
+Results are cached per worker on the patient's canonical feature tuple
+(sized by MEDTRIAGE_HEART_CACHE_SIZE / MEDTRIAGE_HEART_CACHE_TTL; size 0
+disables it) and tied to the loaded model and calibrator, so a repeated
+patient skips the forest and a swapped-in version starts from an empty
+cache. `cache_stats()` reports hits and approximate memory use.
 """
+from numbers import Real
 from pathlib import Path
-import joblib
-import numpy as np
-import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.isotonic import IsotonicRegression
-from sklearn.calibration import CalibratedClassifierCV
+from typing import Optional, Tuple
+import itertools
+import logging
+import math
+import os
+import threading
+
+from artifacts import SingleFlight, file_sha256
+from model_registry import RegistryWatcher
+from model_server import get_client as model_server_client
+from result_cache import ResultCache, approx_sizeof
+
+logger = logging.getLogger(__name__)
 
 ROOT = Path(__file__).resolve().parents[1]
 MODEL_PATH = ROOT / "models" / "heart_attack_model.pkl"
 
-_model = None
-_calibrator = None
+FAST_PATH = os.environ.get("MEDTRIAGE_HEART_FAST_PATH", "1") != "0"
+FLAT_FOREST = os.environ.get("MEDTRIAGE_HEART_FLAT_FOREST", "1") != "0"
+MMAP = os.environ.get("MEDTRIAGE_HEART_MMAP", "1") != "0"
+FLAT_PATH = MODEL_PATH.with_suffix(".flat")
+
+# Monotone lookup table mapping raw to calibrated probabilities (ml/calibration.py)
+CALIBRATION_PATH = MODEL_PATH.parent / "heart_attack_calibration.npz"
+LEGACY_CALIBRATOR_PATH = MODEL_PATH.parent / "heart_attack_calibrator.pkl"
+
+# Registry name and file names of a heart model version (model_registry.py).
+# With no registry version the legacy files above are used.
+REGISTRY_NAME = "heart"
+MODEL_FILE, CALIBRATION_FILE, REPORT_FILE = "model.pkl", "calibration.npz", "report.json"
+FLAT_FILE = "model.flat"
+
+# Distinguishes loads that share a registry version (or have none), so the
+# prediction cache never serves a result across a reload
+_LOAD_IDS = itertools.count(1)
+
+
+class HeartModel:
+    """One version of the heart model and everything derived from it at load
+    time. It is swapped in as a unit, so a request never mixes the forest of
+    one version with the calibration or feature list of another."""
+
+    def __init__(self, model, calibrator=None, version: Optional[str] = None):
+        self._model = model
+        self._model_path = None
+        self._model_lock = threading.Lock()
+        self.version = version
+        self.cache_version = f"{version or 'legacy'}#{next(_LOAD_IDS)}"
+        self.classes = model.classes_
+        self.top = _top_features(model)
+        # Apply the external calibrator only when the model is not already
+        # calibrated (double calibration distorts probabilities)
+        self.calibrator = None if _is_calibrated(model) else calibrator
+        self.fast = None  # FastHeartModel for model, or None
+        if FAST_PATH:
+            from ml.heart_fast import FastHeartModel
+
+            self.fast = FastHeartModel.compile(model, flat_forest=FLAT_FOREST)
+
+    @classmethod
+    def from_flat(cls, fast, model_path: Path, calibrator=None, version: Optional[str] = None) -> "HeartModel":
+        """Serve from a memory-mapped FastHeartModel (see `export_flat`); the
+        pickle at `model_path` is loaded on first access to `model`."""
+        self = cls.__new__(cls)
+        self._model = None
+        self._model_path = model_path
+        self._model_lock = threading.Lock()
+        self.version = version
+        self.cache_version = f"{version or 'legacy'}#{next(_LOAD_IDS)}"
+        self.classes = fast.classes_
+        self.top = [tuple(t) for t in fast.info.get("top_features", [])]
+        self.calibrator = None if fast.info.get("calibrated") else calibrator
+        self.fast = fast
+        return self
+
+    @property
+    def model(self):
+        """The sklearn model (unpickled on first use for flat-loaded versions)."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import joblib
+
+                    logger.info("Loading %s for the sklearn path", self._model_path)
+                    self._model = joblib.load(self._model_path)
+        return self._model
+
+    def calibrate(self, raw):
+        """Calibrated probabilities for the raw positive-class probabilities `raw`."""
+        import numpy as np
+
+        return raw if self.calibrator is None else self.calibrator(np.asarray(raw, dtype=float))
+
+
+_active: Optional[HeartModel] = None
+
+# A cold worker hit by a burst of requests loads the model once: the first
+# thread loads, the others wait for it and share the result
+_MODEL_FLIGHT = SingleFlight("heart_model")
+
+
+def _install(loaded: HeartModel, entry=None) -> None:
+    global _active
+    _active = loaded
+
+
+def _current() -> HeartModel:
+    active = _active
+    if active is None:
+        return _MODEL_FLIGHT.do(_read_active)
+    _WATCHER.poll(active.version)
+    return active
+
+
+def _read_active() -> HeartModel:
+    if _active is not None:  # loaded by a flight that finished while we queued
+        return _active
+    version = None
+    try:
+        version = _WATCHER.registry.current_version(REGISTRY_NAME)
+        if version is not None:
+            entry = _WATCHER.registry.get(REGISTRY_NAME, version)
+            _WATCHER.registry.verify(entry)
+            loaded = _read_version(entry)
+            _install(loaded)
+            return loaded
+    except Exception as e:
+        # Serve the legacy model rather than failing every request; the
+        # watcher retries the registry once its pointer moves
+        logger.exception("Failed to load the current %s registry version; falling back to %s", REGISTRY_NAME, MODEL_PATH.name)
+        if version is not None:
+            _WATCHER.mark_failed(version, e)
+    loaded = _read_legacy()
+    _install(loaded)
+    return loaded
 
 
-def _load_model():
-    global _model
-    if _model is None:
-        if not MODEL_PATH.exists():
-            raise RuntimeError(f"Model file not found at {MODEL_PATH}. Train the model first using scripts/train_heart_model.py")
-        _model = joblib.load(MODEL_PATH)
-    return _model
+def _read_version(entry) -> HeartModel:
+    return _read_model(entry.file(MODEL_FILE), entry.file(FLAT_FILE), _read_calibration(entry.file(CALIBRATION_FILE)), entry.version)
 
 
-def _load_or_fit_calibrator():
-    """Load a saved calibrator if present, otherwise fit an IsotonicRegression
-    calibrator on a small held-out portion of the bundled dataset and persist it.
+# Later registry versions are loaded in the background and rebind _active
+# in one assignment; requests keep the version they started with
+_WATCHER = RegistryWatcher(REGISTRY_NAME, _read_version, _install)
 
-    This is a pragmatic, post-hoc calibration step for demo purposes.
-    """
-    global _calibrator
-    if _calibrator is not None:
-        return _calibrator
 
-    calib_path = MODEL_PATH.parent / 'heart_attack_calibrator.pkl'
-    if calib_path.exists():
+def _read_legacy() -> HeartModel:
+    if not MODEL_PATH.exists():
+        raise RuntimeError(f"Model file not found at {MODEL_PATH}. Train the model first using scripts/train_heart_model.py")
+    return _read_model(MODEL_PATH, FLAT_PATH, _read_calibration(CALIBRATION_PATH, LEGACY_CALIBRATOR_PATH))
+
+
+def _read_model(model_path: Path, flat_path: Path, calibrator, version: Optional[str] = None) -> HeartModel:
+    # The flat export is used only if it was made from this exact pickle
+    if FAST_PATH and FLAT_FOREST and MMAP and flat_path.exists():
+        from ml.heart_fast import FastHeartModel
+
         try:
-            loaded = joblib.load(calib_path)
-            # If the on-disk calibrator is an IsotonicRegression that maps many
-            # high probs to 1.0, prefer refitting a logistic calibrator for a
-            # smoother mapping. If it's already a logistic/regressor, reuse it.
-            if isinstance(loaded, IsotonicRegression):
-                # force a refit below
-                _calibrator = None
-            else:
-                _calibrator = loaded
-                return _calibrator
+            fast = FastHeartModel.load(flat_path, mmap=True)
+            if fast.info.get("model_sha256") == file_sha256(model_path):
+                return HeartModel.from_flat(fast, model_path, calibrator, version)
+            logger.warning("%s was not exported from %s; run scripts/export_heart_flat.py", flat_path.name, model_path.name)
         except Exception:
-            # proceed to refit if load fails
-            _calibrator = None
+            logger.exception("Failed to map %s; unpickling %s", flat_path, model_path)
+    import joblib
+
+    return HeartModel(joblib.load(model_path), calibrator, version)
+
+
+def export_flat(model, model_path: Path, flat_path: Path) -> None:
+    """Save `model`, pickled at `model_path`, as the memory-mappable flat
+    file `flat_path`. Raises ValueError if its shape isn't supported."""
+    from ml.heart_fast import FastHeartModel
+
+    fast = FastHeartModel.compile(model, flat_forest=True)
+    if fast is None:
+        raise ValueError("the fast path does not support this model")
+    fast.save(flat_path, {"model_sha256": file_sha256(model_path), "calibrated": _is_calibrated(model), "top_features": _top_features(model)})
+
 
-    # Fit calibrator using the local dataset (scripts/data/heart.csv)
-    data_csv = Path(__file__).resolve().parents[1] / 'scripts' / 'data' / 'heart.csv'
-    if not data_csv.exists():
-        # No data to fit calibrator; leave _calibrator None
-        return None
+def _read_calibration(path: Path, legacy_path: Optional[Path] = None):
+    """The calibration table at `path`, or None when there isn't one. Tables
+    are built offline by scripts/build_heart_calibration.py; nothing is
+    fitted here.
+
+    A legacy pickled calibrator (heart_attack_calibrator.pkl) is tabulated
+    in memory if no table exists yet.
+    """
+    from ml.calibration import CalibrationTable
 
     try:
-        df = pd.read_csv(data_csv)
-        FEATURES = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'thalach', 'exang', 'oldpeak']
-        X = df[FEATURES]
-        y = df['target']
-
-        # Use a simple split: keep last 20% as calibration set (deterministic)
-        from sklearn.model_selection import train_test_split
-        X_train, X_calib, y_train, y_calib = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
-        model = _load_model()
-        # predict raw probabilities on calibration set
-        probs = model.predict_proba(X_calib)[:, 1]
-
-        # Fit a Platt-scaling style logistic regression on the raw probabilities
-        # This maps raw probs -> calibrated probs smoothly and avoids extreme clipping
-        lr = LogisticRegression(solver='lbfgs')
-        lr.fit(probs.reshape(-1, 1), y_calib.values)
-        _calibrator = lr
-        try:
-            joblib.dump(_calibrator, calib_path)
-        except Exception:
-            pass
-        return _calibrator
+        if path.exists():
+            return CalibrationTable.load(path)
+        if legacy_path is not None and legacy_path.exists():
+            import joblib
+
+            table = CalibrationTable.from_calibrator(joblib.load(legacy_path))
+            logger.warning("Using legacy %s; run scripts/build_heart_calibration.py to write %s", legacy_path.name, path.name)
+            return table
     except Exception:
-        return None
+        logger.exception("Failed to load heart calibration; using raw probabilities")
+    return None
+
+
+def _load_model():
+    return _current().model
+
+
+def _load_calibrator():
+    return _current().calibrator
+
+
+def model_version() -> Optional[str]:
+    """Registry version of the model this process serves (None for the
+    legacy models/heart_attack_model.pkl or before it is loaded)."""
+    active = _active
+    return active.version if active is not None else None
+
+
+def loader_stats():
+    """Load counts, load times and concurrent waiters, plus registry swaps, for /metrics."""
+    return {"version": model_version(), "load": _MODEL_FLIGHT.stats(), "registry": _WATCHER.stats()}
+
+
+_PREDICTION_CACHE = ResultCache.from_env("MEDTRIAGE_HEART", sizeof=approx_sizeof)
+
+
+def cache_stats():
+    """Hit/miss/eviction counters and approximate bytes of the heart prediction cache."""
+    return _PREDICTION_CACHE.stats()
 
 
 REQUIRED_FEATURES = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'thalach', 'exang', 'oldpeak']
@@ -109,50 +282,80 @@ def predict_heart_attack(data: dict):
             'confidence': float,
             'top_features': list of (feature, importance) tuples (optional),
         }
+
+    When a model server is configured (MEDTRIAGE_MODEL_SERVER_SOCKET) the
+    prediction is made there; the in-process model is used as a fallback.
     """
-    model = _load_model()
+    client = model_server_client()
+    if client is not None and all(c in data for c in REQUIRED_FEATURES):
+        try:
+            return client.predict_heart([data[c] for c in REQUIRED_FEATURES])
+        except (RuntimeError, TypeError, ValueError):
+            pass  # unreachable server or non-numeric input: predict in-process
+    return _predict_local(data)
 
-    # Input validation
-    missing = [c for c in REQUIRED_FEATURES if c not in data]
-    if missing:
-        raise ValueError(f"Missing required input features: {missing}")
 
-    df = pd.DataFrame([{k: data[k] for k in REQUIRED_FEATURES}])
+def predict_heart_attack_batch(rows):
+    """`predict_heart_attack` for a list of patient dicts.
+
+    The rows without a cached result go through the model in one
+    `predict_proba` call and the calibrator is applied to the whole
+    probability vector; each returned
+    dict is identical to what `predict_heart_attack` gives for that row.
+    Raises ValueError naming the first row with missing features.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    client = model_server_client()
+    if client is not None and all(c in data for data in rows for c in REQUIRED_FEATURES):
+        try:
+            return client.predict_heart_batch([[data[c] for c in REQUIRED_FEATURES] for data in rows])
+        except (RuntimeError, TypeError, ValueError):
+            pass
+    return _predict_local_batch(rows)
+
 
-    probs = model.predict_proba(df)[:, 1]
-    pred = model.predict(df)
-    raw_confidence = float(probs[0])
+def _missing_features(data: dict):
+    return [c for c in REQUIRED_FEATURES if c not in data]
 
+
+def _cache_key(data: dict) -> Optional[Tuple[float, ...]]:
+    """The features as a tuple of floats, so 1, 1.0 and np.int64(1) share an
+    entry; None (don't cache) unless every value is a finite plain number.
+    Values are not rounded: a split threshold can fall anywhere."""
+    key = []
+    for c in REQUIRED_FEATURES:
+        value = data[c]
+        if isinstance(value, bool) or not isinstance(value, Real):
+            return None
+        value = float(value)
+        if not math.isfinite(value):
+            return None
+        key.append(value + 0.0)  # -0.0 -> 0.0
+    return tuple(key)
+
+
+def _copy_result(result: dict) -> dict:
+    # Fresh containers per caller so nobody mutates a cached entry
+    details = dict(result['details'], top_features=list(result['details']['top_features']))
+    return dict(result, details=details)
+
+
+def _is_calibrated(model) -> bool:
     # If the loaded model is already a calibrated classifier, its predict_proba
     # output should be treated as calibrated. Avoid applying an external
     # calibrator in that case (prevents double-calibration which can distort
     # probabilities).
-    try:
-        is_model_calibrated = isinstance(model, CalibratedClassifierCV) or hasattr(model, 'calibrated_classifiers_')
-    except Exception:
-        is_model_calibrated = False
+    from sklearn.calibration import CalibratedClassifierCV
 
-    # Apply external calibrator only when model is not already calibrated
     try:
-        if is_model_calibrated:
-            confidence = raw_confidence
-        else:
-            calib = _load_or_fit_calibrator()
-            if calib is not None:
-                # If calibrator is an sklearn classifier (e.g., LogisticRegression), use predict_proba
-                if hasattr(calib, 'predict_proba'):
-                    confidence = float(max(0.0, min(1.0, float(calib.predict_proba([[raw_confidence]])[0, 1]))))
-                else:
-                    # isotonic or similar: use predict which returns calibrated prob
-                    confidence = float(max(0.0, min(1.0, float(calib.predict([raw_confidence])[0]))))
-            else:
-                confidence = raw_confidence
+        return isinstance(model, CalibratedClassifierCV) or hasattr(model, 'calibrated_classifiers_')
     except Exception:
-        confidence = raw_confidence
-    label = 'Heart Attack Risk' if int(pred[0]) == 1 else 'Normal'
+        return False
 
-    details = {'raw_prediction': int(pred[0]), 'probability': confidence, 'raw_probability': raw_confidence}
 
+def _top_features(model):
     # Attempt to extract top-5 important features if available
     try:
         clf = model.named_steps['clf']
@@ -165,11 +368,86 @@ def predict_heart_attack(data: dict):
 
         importances = clf.feature_importances_
         fi = sorted(zip(feature_names, importances), key=lambda x: x[1], reverse=True)[:5]
-        details['top_features'] = [(n, float(v)) for n, v in fi]
+        return [(n, float(v)) for n, v in fi]
     except Exception:
-        details['top_features'] = []
+        return []
+
 
-    return {'prediction': label, 'confidence': confidence, 'details': details}
+def _predict_local(data: dict):
+    # Input validation
+    missing = _missing_features(data)
+    if missing:
+        raise ValueError(f"Missing required input features: {missing}")
+    loaded = _current()
+    key = _cache_key(data)
+    hit = _PREDICTION_CACHE.get(key, loaded.cache_version) if key is not None else None
+    if hit is not None:
+        return _copy_result(hit)
+    proba = loaded.fast.predict_proba_row(data) if loaded.fast is not None else None
+    if proba is None:
+        result = _predict_rows(loaded, [data])[0]
+    else:
+        result = _results(loaded, proba.reshape(1, -1))[0]
+    if key is not None:
+        _PREDICTION_CACHE.put(key, _copy_result(result), loaded.cache_version)
+    return result
+
+
+def _predict_local_batch(rows):
+    loaded = _current()
+
+    for i, data in enumerate(rows):
+        missing = _missing_features(data)
+        if missing:
+            raise ValueError(f"Row {i}: Missing required input features: {missing}")
+    # Only rows without a cached result (first occurrence of each key) go
+    # through the model
+    keys = [_cache_key(data) for data in rows]
+    out = [None] * len(rows)
+    todo = {}  # key (or row index when uncacheable) -> row indexes
+    for i, key in enumerate(keys):
+        hit = _PREDICTION_CACHE.get(key, loaded.cache_version) if key is not None else None
+        if hit is not None:
+            out[i] = _copy_result(hit)
+        else:
+            todo.setdefault(i if key is None else key, []).append(i)
+    if todo:
+        groups = list(todo.values())
+        for idx, result in zip(groups, _predict_rows(loaded, [rows[g[0]] for g in groups])):
+            if keys[idx[0]] is not None:
+                _PREDICTION_CACHE.put(keys[idx[0]], _copy_result(result), loaded.cache_version)
+            out[idx[0]] = result
+            for i in idx[1:]:
+                out[i] = _copy_result(result)
+    return out
+
+
+def _predict_rows(loaded: HeartModel, rows):
+    proba = loaded.fast.predict_proba(rows) if loaded.fast is not None else None
+    if proba is None:
+        import pandas as pd
+
+        df = pd.DataFrame([{k: data[k] for k in REQUIRED_FEATURES} for data in rows])
+        proba = loaded.model.predict_proba(df)
+    return _results(loaded, proba)
+
+
+def _results(loaded: HeartModel, proba):
+    import numpy as np
+
+    # One forest pass; labels are the argmax of the probabilities, exactly
+    # what model.predict would compute with a second pass
+    raw = proba[:, 1]
+    preds = loaded.classes[np.argmax(proba, axis=1)]
+    confidences = loaded.calibrate(raw)
+    top = loaded.top
+
+    out = []
+    for pred, raw_confidence, confidence in zip(preds, raw, confidences):
+        label = 'Heart Attack Risk' if int(pred) == 1 else 'Normal'
+        details = {'raw_prediction': int(pred), 'probability': float(confidence), 'raw_probability': float(raw_confidence), 'top_features': list(top), 'model_version': loaded.version}
+        out.append({'prediction': label, 'confidence': float(confidence), 'details': details})
+    return out
 
 
 if __name__ == '__main__':
@@ -0,0 +1,364 @@
+"""
+Pandas-free single-row inference for the heart model.
+
+`FastHeartModel.compile(model)` reads the fitted parameters out of the
+sklearn objects once: imputer fill values, scaler mean/scale and one-hot
+categories for every ColumnTransformer column, plus the forest and, for a
+CalibratedClassifierCV, each member's calibrator. `predict_proba_row(data)`
+then writes one patient straight into a preallocated row buffer per member
+and calls the forest's `predict_proba` on it, skipping DataFrame
+construction and ColumnTransformer/Pipeline dispatch. The result equals
+`model.predict_proba(pd.DataFrame([data]))[0]`. `predict_proba(rows)` does
+the same for a batch.
+
+Forests are compiled to flat arrays (ml/forest.py) by default, which
+removes sklearn's per-call overhead as well; batches above
+`flat_max_rows` go to sklearn's forest, which is faster at that size.
+
+Only the shapes `scripts/train_heart_model.py` produces are compiled: a
+binary `Pipeline([ColumnTransformer, classifier])`, optionally wrapped in
+CalibratedClassifierCV, whose column pipelines are SimpleImputer,
+StandardScaler and OneHotEncoder(handle_unknown='ignore') steps. For
+anything else `compile` returns None and callers keep using sklearn.
+
+A compiled model with flat forests can be saved to one file
+(ml/flat_store.py) and loaded without sklearn: the forests are memory-mapped
+and shared by all workers on a node, and sigmoid or isotonic calibrators
+are rebuilt from their parameters. Loaded models evaluate every batch size
+with the flat forests.
+"""
+from numbers import Real
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import math
+import threading
+
+import numpy as np
+
+# Largest batch evaluated with the flat-array forest; measured crossover
+# with sklearn's forest on the shipped model is ~700 rows
+FLAT_MAX_ROWS = 512
+
+# (column, fill for missing values or None, mean, scale, one-hot {category: offset} or None)
+_ColumnPlan = Tuple[str, Optional[float], float, float, Optional[Dict[float, int]]]
+
+
+def _column_plans(transformer, columns) -> Optional[List[_ColumnPlan]]:
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    if isinstance(transformer, str):
+        steps = [] if transformer == "passthrough" else [transformer]
+    else:
+        steps = [s for _, s in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+    fills = means = scales = categories = None
+    for i, step in enumerate(steps):
+        if step in (None, "passthrough"):
+            continue
+        if isinstance(step, SimpleImputer) and fills is None and means is None and categories is None:
+            mv = step.missing_values
+            if step.add_indicator or not (isinstance(mv, float) and math.isnan(mv)):
+                return None
+            fills = [float(v) for v in step.statistics_]
+            if any(math.isnan(v) for v in fills):
+                return None  # all-missing columns are dropped by the imputer
+        elif isinstance(step, StandardScaler) and means is None and categories is None:
+            means = list(step.mean_) if step.mean_ is not None and step.with_mean else [0.0] * len(columns)
+            scales = list(step.scale_) if step.scale_ is not None and step.with_std else [1.0] * len(columns)
+        elif isinstance(step, OneHotEncoder) and means is None and i == len(steps) - 1:
+            if step.handle_unknown != "ignore" or step.drop_idx_ is not None or getattr(step, "_infrequent_enabled", False):
+                return None
+            categories = step.categories_
+        else:
+            return None
+
+    plans = []
+    for j, column in enumerate(columns):
+        onehot = None
+        if categories is not None:
+            cats = categories[j]
+            if cats.dtype.kind not in "biuf":
+                return None
+            onehot = {float(c): k for k, c in enumerate(cats) if not math.isnan(float(c))}
+        plans.append((
+            column,
+            fills[j] if fills is not None else None,
+            float(means[j]) if means is not None else 0.0,
+            float(scales[j]) if scales is not None else 1.0,
+            onehot,
+        ))
+    return plans
+
+
+class _RowEncoder:
+    """ColumnTransformer equivalent for one dict row."""
+
+    def __init__(self, plans: List[_ColumnPlan]):
+        self.plans = []
+        width = 0
+        for column, fill, mean, scale, onehot in plans:
+            self.plans.append((column, fill, mean, scale, onehot, width))
+            width += len(onehot) if onehot is not None else 1
+        self.width = width
+        self._local = threading.local()
+
+    @classmethod
+    def compile(cls, ct) -> Optional["_RowEncoder"]:
+        from sklearn.compose import ColumnTransformer
+
+        if not isinstance(ct, ColumnTransformer):
+            return None
+        plans: List[_ColumnPlan] = []
+        for name, transformer, columns in ct.transformers_:
+            if (isinstance(transformer, str) and transformer == "drop") or (isinstance(columns, (list, tuple)) and not columns):
+                continue
+            if not isinstance(columns, (list, tuple)) or not all(isinstance(c, str) for c in columns):
+                return None
+            part = _column_plans(transformer, list(columns))
+            if part is None:
+                return None
+            plans.extend(part)
+        return cls(plans)
+
+    def buffer(self) -> np.ndarray:
+        # One preallocated row per thread; API requests run on a thread pool
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = np.zeros((1, self.width), dtype=np.float64)
+        return buf
+
+    def encode(self, data: dict) -> Optional[np.ndarray]:
+        """The encoded row in this thread's buffer, or None if a value isn't
+        a plain number."""
+        buf = self.buffer()
+        return buf if self._fill(buf[0], data) else None
+
+    def encode_columns(self, columns: Dict[str, np.ndarray], n_rows: int) -> Optional[np.ndarray]:
+        """`encode` for a batch given as float columns (NaN = missing), see
+        `numeric_columns`; returns a new (n_rows, width) array."""
+        out = np.zeros((n_rows, self.width), dtype=np.float64)
+        for column, fill, mean, scale, onehot, offset in self.plans:
+            col = columns[column]
+            missing = np.isnan(col)
+            if missing.any():
+                if fill is None:
+                    return None
+                col = np.where(missing, fill, col)
+            if onehot is None:
+                out[:, offset] = (col - mean) / scale
+            else:
+                for category, k in onehot.items():
+                    out[:, offset + k] = col == category
+        return out
+
+    def _fill(self, row: np.ndarray, data: dict) -> bool:
+        for column, fill, mean, scale, onehot, offset in self.plans:
+            value = data.get(column)
+            if value is None:
+                value = math.nan
+            elif isinstance(value, bool) or not isinstance(value, Real):
+                return False
+            value = float(value)
+            if math.isnan(value):
+                if fill is None:
+                    return False
+                value = fill
+            if onehot is None:
+                row[offset] = (value - mean) / scale
+            else:
+                row[offset:offset + len(onehot)] = 0.0
+                k = onehot.get(value)
+                if k is not None:
+                    row[offset + k] = 1.0
+        return True
+
+
+def numeric_columns(rows: Sequence[dict], names: Sequence[str]) -> Optional[Dict[str, np.ndarray]]:
+    """Column name -> float64 array (None -> NaN), or None if any value
+    isn't a plain number."""
+    out = {}
+    for name in names:
+        values = [data.get(name) for data in rows]
+        for t in set(map(type, values)):
+            if t is not type(None) and (not issubclass(t, Real) or issubclass(t, (bool, np.bool_))):
+                return None
+        out[name] = np.array(values, dtype=np.float64)
+    return out
+
+
+class _Sigmoid:
+    """sklearn's _SigmoidCalibration.predict from its two parameters."""
+
+    def __init__(self, a: float, b: float):
+        self.a, self.b = float(a), float(b)
+
+    def predict(self, p: np.ndarray) -> np.ndarray:
+        # expit(-(a * p + b)); agrees with scipy's expit to within 1 ulp
+        return 1.0 / (1.0 + np.exp(self.a * p + self.b))
+
+    def params(self) -> dict:
+        return {"kind": "sigmoid", "a": self.a, "b": self.b}
+
+
+class _Isotonic:
+    """IsotonicRegression(out_of_bounds="clip").predict from its thresholds."""
+
+    def __init__(self, x, y):
+        self.x, self.y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    def predict(self, p: np.ndarray) -> np.ndarray:
+        return np.interp(np.clip(p, self.x[0], self.x[-1]), self.x, self.y)
+
+    def params(self) -> dict:
+        return {"kind": "isotonic", "x": self.x.tolist(), "y": self.y.tolist()}
+
+
+def _portable_calibrator(calibrator):
+    """An sklearn-free equivalent of a fitted calibrator, or None if there isn't one."""
+    if calibrator is None or isinstance(calibrator, (_Sigmoid, _Isotonic)):
+        return calibrator
+    if hasattr(calibrator, "a_") and hasattr(calibrator, "b_"):
+        return _Sigmoid(calibrator.a_, calibrator.b_)
+    if hasattr(calibrator, "X_thresholds_") and getattr(calibrator, "out_of_bounds", None) == "clip" and len(calibrator.X_thresholds_) > 1:
+        return _Isotonic(calibrator.X_thresholds_, calibrator.y_thresholds_)
+    return None
+
+
+def _calibrator_from_params(params: Optional[dict]):
+    if params is None:
+        return None
+    if params["kind"] == "sigmoid":
+        return _Sigmoid(params["a"], params["b"])
+    return _Isotonic(params["x"], params["y"])
+
+
+class FastHeartModel:
+    """`predict_proba` for the heart model straight from patient dicts."""
+
+    def __init__(self, members: Sequence[tuple], classes: np.ndarray, flat_max_rows: int = FLAT_MAX_ROWS, info: Optional[dict] = None):
+        # members: (encoder, classifier or None, FlatForest or None, calibrator or None)
+        self.members = list(members)
+        self.classes_ = classes
+        self.flat_max_rows = int(flat_max_rows)
+        # Caller-defined JSON metadata stored alongside a saved model
+        self.info = dict(info or {})
+
+    @classmethod
+    def compile(cls, model, flat_forest: bool = True, flat_max_rows: int = FLAT_MAX_ROWS) -> Optional["FastHeartModel"]:
+        """Compile `model`, or None if its shape isn't supported. With
+        `flat_forest`, tree ensembles are evaluated by ml/forest.py instead
+        of sklearn for batches of up to `flat_max_rows` rows."""
+        from sklearn.calibration import CalibratedClassifierCV
+
+        try:
+            if isinstance(model, CalibratedClassifierCV):
+                members = []
+                for cc in model.calibrated_classifiers_:
+                    if len(cc.calibrators) != 1:
+                        return None
+                    member = cls._pipeline_member(cc.estimator, cc.calibrators[0], flat_forest)
+                    if member is None or list(cc.classes) != list(model.classes_):
+                        return None
+                    members.append(member)
+            else:
+                member = cls._pipeline_member(model, None, flat_forest)
+                members = [member] if member is not None else None
+            if not members or len(model.classes_) != 2:
+                return None
+            return cls(members, model.classes_, flat_max_rows)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _pipeline_member(pipe, calibrator, flat_forest: bool) -> Optional[tuple]:
+        from sklearn.pipeline import Pipeline
+
+        if not isinstance(pipe, Pipeline) or len(pipe.steps) != 2:
+            return None
+        encoder = _RowEncoder.compile(pipe.steps[0][1])
+        clf = pipe.steps[1][1]
+        if encoder is None or not hasattr(clf, "predict_proba") or len(getattr(clf, "classes_", ())) != 2:
+            return None
+        if getattr(clf, "n_features_in_", encoder.width) != encoder.width:
+            return None
+        if calibrator is not None and hasattr(clf, "decision_function"):
+            return None  # calibrated on decision_function, not probabilities
+        flat = None
+        if flat_forest:
+            from ml.forest import FlatForest
+
+            flat = FlatForest.compile(clf)
+        return encoder, clf, flat, calibrator
+
+    def save(self, path: Union[str, Path], info: Optional[dict] = None) -> None:
+        """Write this model, with `info`, to one flat file for `load`. Raises
+        ValueError unless every member has a flat forest and a calibrator
+        `load` can rebuild without sklearn."""
+        from ml import flat_store
+
+        arrays, members = {}, []
+        for i, (encoder, _, flat, calibrator) in enumerate(self.members):
+            portable = _portable_calibrator(calibrator)
+            if flat is None or (calibrator is not None and portable is None):
+                raise ValueError("only models compiled with flat forests and sigmoid/isotonic calibrators can be saved")
+            forest_arrays, forest_info = flat.state()
+            arrays.update({f"{i}.{name}": a for name, a in forest_arrays.items()})
+            plans = [[column, fill, mean, scale, None if onehot is None else sorted(onehot.items(), key=lambda kv: kv[1])] for column, fill, mean, scale, onehot, _ in encoder.plans]
+            members.append({"plans": plans, "forest": forest_info, "calibrator": None if portable is None else portable.params()})
+        meta = {"format": 1, "classes": np.asarray(self.classes_).tolist(), "members": members, "info": dict(self.info, **(info or {}))}
+        flat_store.save(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "FastHeartModel":
+        """A model written by `save`. With `mmap` the forest arrays stay in the
+        shared read-only mapping of the file."""
+        from ml import flat_store
+        from ml.forest import FlatForest
+
+        arrays, meta = flat_store.load(path, mmap=mmap)
+        if meta.get("format") != 1:
+            raise ValueError(f"unsupported flat heart model format {meta.get('format')!r}")
+        members = []
+        for i, m in enumerate(meta["members"]):
+            plans = [(column, fill, mean, scale, None if onehot is None else {float(c): int(k) for c, k in onehot}) for column, fill, mean, scale, onehot in m["plans"]]
+            forest = FlatForest.from_state({name.split(".", 1)[1]: a for name, a in arrays.items() if name.startswith(f"{i}.")}, m["forest"])
+            members.append((_RowEncoder(plans), None, forest, _calibrator_from_params(m["calibrator"])))
+        return cls(members, np.asarray(meta["classes"]), info=meta.get("info"))
+
+    def predict_proba_row(self, data: dict) -> Optional[np.ndarray]:
+        """Class probabilities for one patient (shape (2,)), or None when the
+        row needs the sklearn path (non-numeric values)."""
+        encoded = [member[0].encode(data) for member in self.members]
+        if any(X is None for X in encoded):
+            return None
+        return self._combine(encoded)[0]
+
+    def predict_proba(self, rows: Sequence[dict]) -> Optional[np.ndarray]:
+        """`predict_proba_row` for many patients, shape (len(rows), 2)."""
+        names = {plan[0] for member in self.members for plan in member[0].plans}
+        columns = numeric_columns(rows, sorted(names))
+        if columns is None:
+            return None
+        encoded = [member[0].encode_columns(columns, len(rows)) for member in self.members]
+        if any(X is None for X in encoded):
+            return None
+        return self._combine(encoded)
+
+    def _combine(self, encoded: List[np.ndarray]) -> np.ndarray:
+        total = np.zeros((encoded[0].shape[0], 2))
+        for (_, clf, flat, calibrator), X in zip(self.members, encoded):
+            # The flat arrays win while sklearn's per-call overhead dominates;
+            # past a few hundred rows its compiled traversal is faster
+            use_flat = flat is not None and (clf is None or X.shape[0] <= self.flat_max_rows)
+            proba = (flat if use_flat else clf).predict_proba(X)
+            if calibrator is not None:
+                # Same steps as sklearn's _CalibratedClassifier for a binary problem
+                calibrated = np.zeros_like(proba)
+                calibrated[:, 1] = calibrator.predict(proba[:, 1])
+                calibrated[:, 0] = 1.0 - calibrated[:, 1]
+                calibrated[(1.0 < calibrated) & (calibrated <= 1.0 + 1e-5)] = 1.0
+                proba = calibrated
+            total += proba
+        total /= len(self.members)
+        return total
@@ -0,0 +1,44 @@
+"""
+ONNX Runtime backend for the zero-shot symptom classifier.
+
+Runs the same NLI model as the transformers pipeline, exported to ONNX with
+int8 dynamic quantization by `scripts/export_nli_onnx.py`. `OnnxZeroShot`
+is called like the transformers zero-shot pipeline and returns the same
+{"sequence", "labels", "scores"} dicts, so `MLClassifier` can use either;
+inputs are built by the cached-hypothesis encoder in ml/zero_shot.py.
+
+Needs `onnxruntime` plus `transformers` for the tokenizer and model config;
+torch is not required at inference time.
+"""
+from pathlib import Path
+from typing import Union
+
+from ml.zero_shot import ZeroShotScorer, entailment_id
+
+ROOT = Path(__file__).resolve().parents[1]
+ONNX_MODEL_PATH = ROOT / "models" / "nli_int8.onnx"
+
+
+class OnnxZeroShot(ZeroShotScorer):
+    """Zero-shot classifier on an ONNX Runtime session."""
+
+    def __init__(self, model_name: str, onnx_path: Union[str, Path] = ONNX_MODEL_PATH, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        onnx_path = Path(onnx_path)
+        if not onnx_path.exists():
+            raise RuntimeError(f"ONNX model not found at {onnx_path}. Export it first using scripts/export_nli_onnx.py")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        inputs = {i.name for i in self.session.get_inputs()}
+
+        def run(arrays):
+            return self.session.run(None, {k: v for k, v in arrays.items() if k in inputs})[0]
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        super().__init__(tokenizer, run, entailment_id(AutoConfig.from_pretrained(model_name)))
@@ -0,0 +1,134 @@
+"""
+Fixed-label zero-shot scoring shared by the torch and ONNX NLI backends.
+
+The transformers zero-shot pipeline re-tokenizes every "This example is
+{label}." hypothesis and re-pairs it with the premise on each call. The
+label set used for triage never changes, so `PairEncoder` tokenizes the
+hypotheses once and builds each premise/hypothesis batch straight from the
+cached token ids; only the premise is tokenized per request.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Same default as the transformers zero-shot pipeline
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+_PREMISE, _HYPOTHESIS = -1, -2  # sentinel ids used to read the pair layout
+
+
+def entailment_id(config) -> int:
+    """Index of the entailment class in an NLI model config."""
+    ids = [i for name, i in config.label2id.items() if name.lower().startswith("entail")]
+    if not ids:
+        raise RuntimeError("model config has no entailment label")
+    return int(ids[0])
+
+
+def zero_shot_output(texts: Sequence[str], labels: Sequence[str], logits: np.ndarray, entailment: int) -> List[dict]:
+    """Turn NLI logits for every (text, label) pair into pipeline-style results.
+
+    Mirrors the pipeline's single-label mode: a softmax over the entailment
+    logits of all candidate labels, labels sorted by descending score.
+    """
+    entail = np.asarray(logits, dtype=np.float64).reshape(len(texts), len(labels), -1)[..., entailment]
+    entail = np.exp(entail - entail.max(axis=1, keepdims=True))
+    scores = entail / entail.sum(axis=1, keepdims=True)
+    out = []
+    for text, row in zip(texts, scores):
+        order = np.argsort(-row, kind="stable")
+        out.append({"sequence": text, "labels": [labels[i] for i in order], "scores": [float(row[i]) for i in order]})
+    return out
+
+
+class PairEncoder:
+    """Builds NLI input arrays for texts x a fixed label set.
+
+    The special-token layout of a pair ([CLS] premise [SEP] hypothesis [SEP]
+    for BERT-style models) is read once from the tokenizer, and the
+    "separator + hypothesis + closing tokens" tail of every label is kept as
+    ready-made id and token-type lists.
+    """
+
+    def __init__(self, tokenizer, labels: Sequence[str], template: str = HYPOTHESIS_TEMPLATE, max_length: int = 512):
+        self.labels = tuple(labels)
+        self._tokenizer = tokenizer
+        self.max_length = min(int(getattr(tokenizer, "model_max_length", max_length) or max_length), max_length)
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self._with_types = "token_type_ids" in getattr(tokenizer, "model_input_names", ())
+
+        layout = tokenizer.build_inputs_with_special_tokens([_PREMISE], [_HYPOTHESIS])
+        types = tokenizer.create_token_type_ids_from_sequences([_PREMISE], [_HYPOTHESIS]) if self._with_types else [0] * len(layout)
+        p, h = layout.index(_PREMISE), layout.index(_HYPOTHESIS)
+        self._prefix = layout[:p]
+        self._prefix_types = types[:p]
+        self._premise_type = types[p]
+        self._tails: List[Tuple[List[int], List[int]]] = []
+        for label in self.labels:
+            hyp = tokenizer.encode(template.format(label), add_special_tokens=False)
+            ids = layout[p + 1:h] + hyp + layout[h + 1:]
+            tail_types = types[p + 1:h] + [types[h]] * len(hyp) + types[h + 1:]
+            self._tails.append((ids, tail_types))
+
+    def encode(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Arrays for len(texts) * len(labels) pairs, text-major."""
+        premises = self._tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        rows, row_types = [], []
+        for premise in premises:
+            for tail, tail_types in self._tails:
+                # Truncate the premise only, like the pipeline does
+                room = max(0, self.max_length - len(self._prefix) - len(tail))
+                body = premise[:room]
+                rows.append(self._prefix + body + tail)
+                row_types.append(self._prefix_types + [self._premise_type] * len(body) + tail_types)
+        width = max(len(r) for r in rows)
+        ids = np.full((len(rows), width), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(rows), width), dtype=np.int64)
+        type_ids = np.zeros((len(rows), width), dtype=np.int64)
+        for i, (row, types) in enumerate(zip(rows, row_types)):
+            ids[i, :len(row)] = row
+            mask[i, :len(row)] = 1
+            type_ids[i, :len(types)] = types
+        out = {"input_ids": ids, "attention_mask": mask}
+        if self._with_types:
+            out["token_type_ids"] = type_ids
+        return out
+
+
+class ZeroShotScorer:
+    """Pipeline-compatible zero-shot classifier over a `run(arrays) -> logits`
+    function, with one cached PairEncoder per label set."""
+
+    def __init__(self, tokenizer, run, entailment: int):
+        self.tokenizer = tokenizer
+        self._run = run
+        self.entailment_id = entailment
+        self._encoders: Dict[Tuple[str, ...], PairEncoder] = {}
+
+    def encoder(self, labels: Sequence[str]) -> PairEncoder:
+        key = tuple(labels)
+        enc = self._encoders.get(key)
+        if enc is None:
+            enc = self._encoders[key] = PairEncoder(self.tokenizer, key)
+        return enc
+
+    def __call__(self, texts, labels: Sequence[str], batch_size: int = 0):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        labels = list(labels)
+        logits = self._run(self.encoder(labels).encode(texts))
+        out = zero_shot_output(texts, labels, logits, self.entailment_id)
+        return out[0] if single else out
+
+
+def torch_scorer(pipe) -> ZeroShotScorer:
+    """Wrap the model and tokenizer of a transformers zero-shot pipeline."""
+    import torch
+
+    model = pipe.model.eval()
+
+    def run(arrays):
+        with torch.no_grad():
+            return model(**{k: torch.from_numpy(v) for k, v in arrays.items()}).logits.numpy()
+
+    return ZeroShotScorer(pipe.tokenizer, run, entailment_id(model.config))
@@ -1,23 +1,84 @@
-from typing import List
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 import logging
 import concurrent.futures
+import os
 import threading
 import time
 
-try:
-    from transformers import pipeline
-except Exception:  # transformers may not be available or model download may fail
-    pipeline = None
+from circuit_breaker import FAILURE, LOW_CONFIDENCE, OK, CircuitBreaker, CircuitOpen
+from model_registry import ModelRegistry, RegistryWatcher
+from model_server import ModelServerUnavailable, get_client as model_server_client
+from result_cache import ResultCache, env_number, normalize_symptom_text
 
 logger = logging.getLogger(__name__)
 
+ML_MODEL_NAME = "typeform/distilbert-base-uncased-mnli"
+ML_LABELS = ["high risk", "medium risk", "low risk"]
+# "torch" runs the transformers pipeline; "onnx" runs the int8 ONNX export
+# (see ml/nli_onnx.py) on ONNX Runtime
+ML_BACKENDS = ("torch", "onnx")
+ML_BACKEND = os.environ.get("MEDTRIAGE_ML_BACKEND", "torch").strip().lower()
+if ML_BACKEND not in ML_BACKENDS:
+    logger.warning("Unknown MEDTRIAGE_ML_BACKEND %r; using torch", ML_BACKEND)
+    ML_BACKEND = "torch"
+ML_ONNX_PATH = os.environ.get("MEDTRIAGE_ML_ONNX_PATH")
+# A registry version of the zero-shot model (model_registry.py) holds a
+# transformers model directory and, for the onnx backend, its int8 export;
+# it replaces ML_MODEL_NAME when the registry has one
+ML_REGISTRY_NAME = "triage_nli"
+ML_MODEL_DIR, ML_ONNX_FILE = "model", "nli_int8.onnx"
+
+# Micro-batching of concurrent try_ml_triage calls: wait up to the window for
+# more requests, up to MAX texts per pipeline call, grouped by word count
+BATCH_WINDOW_MS = env_number("MEDTRIAGE_ML_BATCH_WINDOW_MS", 10.0, float)
+BATCH_MAX = env_number("MEDTRIAGE_ML_BATCH_MAX", 16, int)
+BATCH_BUCKETS = [int(b) for b in os.environ.get("MEDTRIAGE_ML_BATCH_BUCKETS", "16,64").split(",") if b.strip()]
+# Inference threads and how many texts may wait for them before callers are
+# turned away to the rule-based fallback
+INFERENCE_WORKERS = env_number("MEDTRIAGE_ML_WORKERS", 1, int)
+INFERENCE_QUEUE_MAX = env_number("MEDTRIAGE_ML_QUEUE_MAX", 64, int)
+
+
+def _transformers_pipeline():
+    # Imported on first use: transformers pulls in torch, which costs seconds
+    # at startup even when ML triage is never used by this worker
+    try:
+        from transformers import pipeline
+    except Exception:  # transformers may not be available or model download may fail
+        return None
+    return pipeline
+
 
 class MLClassifier:
-    def __init__(self):
+    def __init__(self, model_name: str = ML_MODEL_NAME, backend: str = ML_BACKEND, version: Optional[str] = None, onnx_path: Optional[str] = None):
+        if backend not in ML_BACKENDS:
+            raise ValueError(f"unknown ML backend {backend!r}")
+        self.model_name = model_name
+        self.backend = backend
+        # Registry version the model came from, None for ML_MODEL_NAME
+        self.version = version
+        self.onnx_path = onnx_path
         self._classifier = None
         self._initialized = False
 
+    @property
+    def model_version(self) -> str:
+        """Identifier used to tie cached ML results to the loaded model."""
+        name = self.version or self.model_name
+        if self.backend == "onnx":
+            return f"{name}+onnx-int8"
+        return name
+
     def _init(self):
+        if self.backend == "onnx":
+            if self._classifier is None:
+                from ml.nli_onnx import ONNX_MODEL_PATH, OnnxZeroShot
+                self._classifier = OnnxZeroShot(self.model_name, self.onnx_path or ML_ONNX_PATH or ONNX_MODEL_PATH)
+                self._initialized = True
+            return
+        pipeline = _transformers_pipeline()
         if pipeline is None:
             raise RuntimeError("transformers pipeline is not available")
         # Intentionally separate initialization from on-demand classify calls.
@@ -26,8 +87,11 @@ class MLClassifier:
         # block (downloads) which we avoid in try_ml_triage.
         if self._classifier is None:
             # Use a zero-shot-classification pipeline with a small DistilBERT model fine-tuned for NLI
-            # This will download a model on first run (internet required)
-            self._classifier = pipeline("zero-shot-classification", model="typeform/distilbert-base-uncased-mnli")
+            # This will download a model on first run (internet required).
+            # Calls skip the pipeline's per-call label setup and go through
+            # the fixed-label scorer with pre-tokenized hypotheses.
+            from ml.zero_shot import torch_scorer
+            self._classifier = torch_scorer(pipeline("zero-shot-classification", model=self.model_name))
             self._initialized = True
 
     def classify(self, text: str) -> List[tuple]:
@@ -38,46 +102,421 @@ class MLClassifier:
         if not self._initialized:
             raise RuntimeError("ML pipeline not initialized")
 
-        labels = ["high risk", "medium risk", "low risk"]
-        out = self._classifier(text, labels)
+        out = self._classifier(text, ML_LABELS)
         # Return labels with scores in order
         return list(zip(out["labels"], out["scores"]))
 
+    def classify_batch(self, texts: List[str]) -> List[List[tuple]]:
+        """`classify` for several texts in one pipeline call."""
+        if not self._initialized:
+            raise RuntimeError("ML pipeline not initialized")
+
+        # Zero-shot runs one NLI pass per (text, label) pair; batch them all
+        outs = self._classifier(list(texts), ML_LABELS, batch_size=len(texts) * len(ML_LABELS))
+        if isinstance(outs, dict):
+            outs = [outs]
+        return [list(zip(out["labels"], out["scores"])) for out in outs]
+
+
+class Histogram:
+    """Fixed-bucket histogram; `bounds` are inclusive upper bounds."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(sorted(bounds))
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.bounds, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            labels = [str(b) for b in self.bounds] + ["+Inf"]
+            count = sum(self._counts)
+            return {
+                "buckets": dict(zip(labels, self._counts)),
+                "count": count,
+                "mean": (self._sum / count) if count else 0.0,
+            }
+
+
+class QueueFull(RuntimeError):
+    """Raised by `MicroBatcher.submit` when the admission queue is full."""
+
+
+class MicroBatcher:
+    """Bounded inference executor that batches concurrent texts into calls of `fn`.
+
+    `submit` queues a text and returns a Future, or raises QueueFull at once
+    when `max_queue` texts are already waiting so the caller can fall back
+    instead of piling up behind a slow model. A fixed pool of `workers`
+    threads waits until the oldest queued text is `window` seconds old or a
+    length bucket holds `max_batch` texts, then calls `fn` with up to
+    `max_batch` texts from one bucket, so short and long texts are not padded
+    to each other's length. Texts whose deadline passed while queued are
+    cancelled before they reach the model. Identical texts queued at the same
+    time share one slot, one Future and the later of their deadlines.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[str]], list],
+        max_batch: int = 16,
+        window: float = 0.01,
+        bucket_edges: Sequence[int] = (16, 64),
+        max_queue: int = 64,
+        workers: int = 1,
+    ):
+        self._fn = fn
+        self.max_batch = max(1, int(max_batch))
+        self.window = max(0.0, float(window))
+        self.max_queue = max(1, int(max_queue))
+        self.workers = max(1, int(workers))
+        self._edges = tuple(sorted(bucket_edges))
+        self._buckets = [deque() for _ in range(len(self._edges) + 1)]  # (queued_at, text, future)
+        self._queued: Dict[str, concurrent.futures.Future] = {}
+        self._deadlines: Dict[str, Optional[float]] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self.rejected = 0
+        self.expired = 0
+        self.abandoned = 0
+        self.queue_depth = Histogram((1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.batch_size = Histogram((1, 2, 4, 8, 16, 32, 64))
+
+    def _bucket(self, text: str) -> int:
+        # Word count is a cheap stand-in for the tokenized length
+        return bisect_left(self._edges, text.count(" ") + 1)
+
+    def submit(self, text: str, deadline: Optional[float] = None) -> concurrent.futures.Future:
+        """Queue `text`; `deadline` is a time.monotonic() value after which
+        the work is no longer wanted."""
+        with self._cond:
+            future = self._queued.get(text)
+            if future is not None:
+                old = self._deadlines[text]
+                self._deadlines[text] = None if old is None or deadline is None else max(old, deadline)
+                return future
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull("ML inference queue is full")
+            future = concurrent.futures.Future()
+            self._buckets[self._bucket(text)].append((time.monotonic(), text, future))
+            self._queued[text] = future
+            self._deadlines[text] = deadline
+            self._pending += 1
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._run, name=f"ml-batcher-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+        return future
+
+    def abandon(self, future: concurrent.futures.Future) -> None:
+        """Record that the caller waiting on `future` gave up.
+
+        Work that hasn't started is left to expire at its deadline; work that
+        is already running can't be interrupted and is counted as abandoned.
+        """
+        if future.running():
+            with self._cond:
+                self.abandoned += 1
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                full = [b for b in self._buckets if len(b) >= self.max_batch]
+                oldest = min((b for b in self._buckets if b), key=lambda b: b[0][0])
+                wait = oldest[0][0] + self.window - time.monotonic()
+                if full or wait <= 0:
+                    bucket = full[0] if full else oldest
+                    break
+                self._cond.wait(wait)
+            depth = self._pending
+            now = time.monotonic()
+            items = []
+            for _ in range(min(self.max_batch, len(bucket))):
+                item = bucket.popleft()
+                text, future = item[1], item[2]
+                deadline = self._deadlines.pop(text)
+                del self._queued[text]
+                self._pending -= 1
+                if deadline is not None and deadline <= now:
+                    # Nobody is waiting for this any more; don't spend the model on it
+                    future.cancel()
+                    self.expired += 1
+                elif future.set_running_or_notify_cancel():
+                    items.append(item)
+            self._in_flight += len(items)
+        self.queue_depth.observe(depth)
+        if items:
+            self.batch_size.observe(len(items))
+        return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._next_batch()
+            if not items:
+                continue
+            texts = [text for _, text, _ in items]
+            try:
+                results = self._fn(texts)
+                if len(results) != len(texts):
+                    raise RuntimeError("batch returned %d results for %d texts" % (len(results), len(texts)))
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), result in zip(items, results):
+                    future.set_result(result)
+            with self._cond:
+                self._in_flight -= len(items)
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            counters = {
+                "queued": self._pending,
+                "in_flight": self._in_flight,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "abandoned": self.abandoned,
+            }
+        return dict(
+            counters,
+            workers=self.workers,
+            max_queue=self.max_queue,
+            window_ms=self.window * 1000.0,
+            max_batch=self.max_batch,
+            queue_depth=self.queue_depth.snapshot(),
+            batch_size=self.batch_size.snapshot(),
+        )
+
+
+def _registry_classifier(entry) -> MLClassifier:
+    onnx_path = entry.file(ML_ONNX_FILE) if entry.has(ML_ONNX_FILE) else None
+    return MLClassifier(str(entry.file(ML_MODEL_DIR)), version=entry.version, onnx_path=onnx_path)
+
+
+def _initial_classifier() -> MLClassifier:
+    try:
+        entry = ModelRegistry().current(ML_REGISTRY_NAME)
+    except Exception:
+        logger.exception("Failed to read the %s registry pointer; using %s", ML_REGISTRY_NAME, ML_MODEL_NAME)
+        entry = None
+    return _registry_classifier(entry) if entry is not None else MLClassifier()
+
+
+def _load_classifier(entry) -> MLClassifier:
+    # Runs on the watcher's thread: the new model is fully loaded before
+    # requests can see it
+    ml = _registry_classifier(entry)
+    ml._init()
+    return ml
+
+
+def _install_classifier(ml: MLClassifier, entry=None) -> None:
+    global _ml
+    _ml = ml
+
+
+_ml = _initial_classifier()
+# Once this process holds a model, newer registry versions are loaded in the
+# background and rebind _ml in one assignment; calls in flight keep theirs
+_ML_WATCHER = RegistryWatcher(ML_REGISTRY_NAME, _load_classifier, _install_classifier)
+
+
+def current_classifier() -> MLClassifier:
+    """The zero-shot classifier to use for the next call."""
+    ml = _ml
+    if getattr(ml, "_initialized", False):
+        _ML_WATCHER.poll(getattr(ml, "version", None))
+    return ml
+
 
-_ml = MLClassifier()
+# Version the model server reported with its latest answer, or None when
+# this process answered in-process last. A worker without a local model
+# never polls the registry, so this is how it learns of server swaps.
+_remote_version: Optional[str] = None
+
+
+def model_version() -> str:
+    """Version identifier of the zero-shot model answering this process's
+    requests: the model server's when it answered last, else the local one."""
+    return _remote_version or _ml.model_version
+
+
+def registry_stats() -> dict:
+    return dict(_ML_WATCHER.stats(), version=_ml.model_version)
+
+# ML results keyed on normalized text, bound to the model version
+_RESULT_CACHE = ResultCache.from_env("MEDTRIAGE_ML")
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for the ML result cache."""
+    return _RESULT_CACHE.stats()
+
+
+def _ml_triage_batch(keys: List[str]) -> list:
+    # Runs on the batcher thread; results are cached here so a caller that
+    # already gave up still leaves the answer behind for the next request
+    ml = _ml
+    remote = _remote_predictions(keys)
+    if remote is None:
+        preds, versions = ml.classify_batch(keys), [ml.model_version] * len(keys)
+    else:
+        preds, versions = remote
+    results = [_result_from_preds(p) for p in preds]
+    # Cached under the version that actually answered
+    for key, result, version in zip(keys, results, versions):
+        _RESULT_CACHE.put(key, result, version)
+    return results
+
+
+_BATCHER = MicroBatcher(
+    _ml_triage_batch,
+    max_batch=BATCH_MAX,
+    window=BATCH_WINDOW_MS / 1000.0,
+    bucket_edges=BATCH_BUCKETS,
+    max_queue=INFERENCE_QUEUE_MAX,
+    workers=INFERENCE_WORKERS,
+)
+
+
+# Trips ML into rule-only mode when it gets slow, fails or is unsure; see
+# circuit_breaker.py for the MEDTRIAGE_ML_BREAKER_* settings
+_BREAKER = CircuitBreaker.from_env("MEDTRIAGE_ML_BREAKER")
+
+
+def breaker_state() -> str:
+    return _BREAKER.state
+
+
+def add_breaker_listener(fn: Callable[[str, str, Optional[str]], None]) -> None:
+    """Call `fn(old_state, new_state, reason)` on every ML circuit breaker transition."""
+    _BREAKER.add_listener(fn)
+
+
+def breaker_stats() -> dict:
+    """State, rolling latency/failure figures and recent transitions of the ML circuit breaker."""
+    return _BREAKER.stats()
+
+
+def batch_stats() -> dict:
+    """Queue, in-flight and abandoned-work counters plus queue depth and
+    batch size histograms for the ML inference executor."""
+    return _BATCHER.stats()
 
 
 def try_heart_attack_triage(data: dict):
     """Wrapper to call the heart-attack-specific predictor.
 
-    Returns (prediction_label, confidence_float, matches_list, fallback_flag)
-    On failure returns (None, 0.0, [], True)
+    Returns (prediction_label, confidence_float, matches_list, fallback_flag, model_version)
+    On failure returns (None, 0.0, [], True, None)
     """
     try:
         # Lazy import of the heart attack predictor
         from ml.heart_attack import predict_heart_attack
-        res = predict_heart_attack(data)
-        # res is {'prediction':..., 'confidence':..., 'details':{...}}
-        pred = res.get('prediction')
-        conf = float(res.get('confidence', 0.0))
-        details = res.get('details', {})
-        matches = []
-        if isinstance(details, dict):
-            top = details.get('top_features') or []
-            # top is list of (feature, importance)
-            matches = [t[0] if isinstance(t, (list, tuple)) else t for t in top]
-        return pred, conf, matches, False
+        return _heart_triage_result(predict_heart_attack(data))
     except Exception:
         # Fail gracefully; caller should fallback to rule-based logic
-        return None, 0.0, [], True
+        return None, 0.0, [], True, None
+
+
+def try_heart_attack_triage_batch(rows: List[dict]) -> List[tuple]:
+    """`try_heart_attack_triage` for many rows with one model call; if the
+    batch fails every row gets the failure tuple."""
+    try:
+        from ml.heart_attack import predict_heart_attack_batch
+        return [_heart_triage_result(res) for res in predict_heart_attack_batch(rows)]
+    except Exception:
+        return [(None, 0.0, [], True, None) for _ in rows]
+
+
+def _heart_triage_result(res: dict) -> tuple:
+    # res is {'prediction':..., 'confidence':..., 'details':{...}}
+    pred = res.get('prediction')
+    conf = float(res.get('confidence', 0.0))
+    details = res.get('details', {})
+    matches = []
+    version = None
+    if isinstance(details, dict):
+        top = details.get('top_features') or []
+        # top is list of (feature, importance)
+        matches = [t[0] if isinstance(t, (list, tuple)) else t for t in top]
+        version = details.get('model_version')
+    return pred, conf, matches, False, version
 
 
 def ml_triage(text: str):
     """Attempt ML-based triage; returns (risk, suggestion, conditions) or raises.
 
     This function is optional — it may raise if the ML model is unavailable.
+    Results are cached on the normalized text; the model only ever sees the
+    normalized form so cached and fresh answers agree.
     """
-    preds = _ml.classify(text)
+    key = normalize_symptom_text(text)
+    hit = _RESULT_CACHE.get(key, model_version())
+    if hit is None:
+        hit, version = _ml_triage_uncached(key)
+        _RESULT_CACHE.put(key, hit, version)
+    return _copy_result(hit)
+
+
+def _copy_result(res):
+    # Fresh lists per caller so nobody mutates a cached entry
+    risk, suggestion, conditions, score, matches = res
+    return risk, suggestion, list(conditions), score, list(matches)
+
+
+def _ml_triage_uncached(text: str):
+    # (result, version of the model that produced it)
+    remote = _remote_predictions([text])
+    if remote is not None:
+        return _result_from_preds(remote[0][0]), remote[1][0]
+    ml = _ml
+    return _result_from_preds(ml.classify(text)), ml.model_version
+
+
+def _ml_ready() -> bool:
+    # Either this process holds the model or a model server can be tried
+    if getattr(_ml, "_initialized", False):
+        return True
+    client = model_server_client()
+    return client is not None and client.available()
+
+
+def _remote_predictions(texts: List[str]) -> Optional[Tuple[List[List[tuple]], List[str]]]:
+    """Zero-shot predictions from the model server with the server's model
+    version for each, or None to classify in-process (no server configured,
+    or unreachable with a local model)."""
+    global _remote_version
+    client = model_server_client()
+    if client is None:
+        _remote_version = None
+        return None
+    try:
+        preds, versions = client.classify_batch_with_versions(texts)
+    except ModelServerUnavailable:
+        if not getattr(_ml, "_initialized", False):
+            raise
+        logger.debug("Model server unavailable; classifying in-process")
+        _remote_version = None
+        return None
+    if versions:
+        _remote_version = versions[-1]
+    return preds, versions
+
+
+def _result_from_preds(preds):
     # Pick highest scoring label
     if not preds:
         raise RuntimeError("no predictions from ML model")
@@ -116,30 +555,41 @@ def try_ml_triage(text: str, timeout: float = 2.0, min_confidence: float = 0.4):
     # pre-loaded), don't attempt to initialize here because that would trigger
     # a potentially long model download during a request. Instead, fail fast so
     # the caller can fallback to rule-based logic.
-    if not getattr(_ml, "_initialized", False):
+    if not _ml_ready():
         raise RuntimeError("ML model not initialized")
 
-    # If the model is initialized, run it with a timeout guard to handle any
-    # unexpected stalls in the classifier itself.
-    result = None
-    exc = None
+    # While the breaker is open ML is skipped outright (rule-only mode)
+    if not _BREAKER.allow():
+        raise CircuitOpen(f"ML circuit breaker is {_BREAKER.state}")
 
-    def target():
-        nonlocal result, exc
-        try:
-            result = ml_triage(text)
-        except Exception as e:
-            exc = e
-
-    thread = threading.Thread(target=target, daemon=True)
-    thread.start()
-    thread.join(timeout)
-    if thread.is_alive():
-        raise RuntimeError("ML triage timed out")
-    if exc:
-        raise exc
+    # Cache hits skip the worker thread entirely and aren't reported to the breaker
+    key = normalize_symptom_text(text)
+    current_classifier()  # lets a local model pick up registry swaps
+    version = model_version()
+    result = _RESULT_CACHE.get(key, version)
+
+    # Misses are queued for the micro-batcher, which groups concurrent
+    # requests into one pipeline call. A full queue fails fast, and work still
+    # queued when the timeout passes is dropped before it reaches the model.
+    timed = result is None
+    start = time.monotonic()
     if result is None:
-        raise RuntimeError("ML triage failed")
+        try:
+            future = _BATCHER.submit(key, deadline=start + timeout)
+        except QueueFull:
+            _BREAKER.record(time.monotonic() - start, FAILURE)
+            raise RuntimeError("ML inference queue is full")
+        try:
+            result = future.result(timeout)
+        except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            _BATCHER.abandon(future)
+            _BREAKER.record(time.monotonic() - start, FAILURE)
+            raise RuntimeError("ML triage timed out")
+        except Exception:
+            _BREAKER.record(time.monotonic() - start, FAILURE)
+            raise
+    latency = time.monotonic() - start
+    result = _copy_result(result)
 
     # result is a tuple (risk, suggestion, conditions, score)
     try:
@@ -149,6 +599,10 @@ def try_ml_triage(text: str, timeout: float = 2.0, min_confidence: float = 0.4):
 
     # If the top prediction is below the confidence threshold, treat as failure
     if score < float(0.4):
+        if timed:
+            _BREAKER.record(latency, LOW_CONFIDENCE)
         raise RuntimeError(f"ML confidence {score:.2f} below threshold 0.4")
 
+    if timed:
+        _BREAKER.record(latency, OK)
     return risk, suggestion, conditions, score, matches
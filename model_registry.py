@@ -0,0 +1,287 @@
+"""On-disk registry of versioned model artifacts with a `current` pointer.
+
+Layout, under MEDTRIAGE_MODEL_REGISTRY (default models/registry):
+
+    <name>/<version>/             the artifacts of one version (any files or
+                                  directories, e.g. model.pkl, calibration.npz,
+                                  report.json, or a transformers model dir)
+    <name>/<version>/MANIFEST.json  name, version, creation time and the
+                                  sha256 of every file
+    <name>/current                the active version, one line
+
+Versions are published into a temporary directory that is renamed into
+place, and the pointer is rewritten atomically, so a reader sees either
+the old version or the new one. A `RegistryWatcher` lets a worker notice
+a moved pointer (checked at most every
+MEDTRIAGE_MODEL_REGISTRY_CHECK_INTERVAL seconds, default 10), load the new
+version on a background thread after verifying its checksums, and swap it
+in; requests keep using the old version until then.
+
+Usage:
+    python model_registry.py list heart
+    python model_registry.py publish heart model.pkl=models/heart_attack_model.pkl \\
+        model.flat=models/heart_attack_model.flat calibration.npz=models/heart_attack_calibration.npz \\
+        report.json=models/heart_attack_report.json
+    python model_registry.py activate heart v2
+    python model_registry.py verify heart v2
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+from artifacts import atomic_write, file_sha256
+from result_cache import env_number
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+REGISTRY_ROOT = Path(os.environ.get("MEDTRIAGE_MODEL_REGISTRY", str(ROOT / "models" / "registry")))
+CHECK_INTERVAL = env_number("MEDTRIAGE_MODEL_REGISTRY_CHECK_INTERVAL", 10.0, float)
+
+MANIFEST = "MANIFEST.json"
+POINTER = "current"
+
+
+class ModelVersion(NamedTuple):
+    name: str
+    version: str
+    path: Path
+    manifest: dict
+
+    def file(self, name: str) -> Path:
+        return self.path / name
+
+    def has(self, name: str) -> bool:
+        return self.file(name).exists()
+
+
+def _checksums(directory: Path) -> Dict[str, str]:
+    return {
+        p.relative_to(directory).as_posix(): file_sha256(p)
+        for p in sorted(directory.rglob("*"))
+        if p.is_file() and p.name != MANIFEST
+    }
+
+
+class ModelRegistry:
+    def __init__(self, root: Union[str, Path] = REGISTRY_ROOT):
+        self.root = Path(root)
+
+    def versions(self, name: str) -> List[str]:
+        """Published versions of `name`, oldest first."""
+        base = self.root / name
+        if not base.is_dir():
+            return []
+        found = [p for p in base.iterdir() if (p / MANIFEST).is_file()]
+        return [p.name for p in sorted(found, key=lambda p: (p / MANIFEST).stat().st_mtime_ns)]
+
+    def get(self, name: str, version: str) -> ModelVersion:
+        path = self.root / name / version
+        try:
+            manifest = json.loads((path / MANIFEST).read_text())
+        except FileNotFoundError:
+            raise KeyError(f"no version {version!r} of model {name!r} in {self.root}") from None
+        return ModelVersion(name, version, path, manifest)
+
+    def current_version(self, name: str) -> Optional[str]:
+        """The version the pointer names, or None when `name` has no pointer."""
+        try:
+            version = (self.root / name / POINTER).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def current(self, name: str) -> Optional[ModelVersion]:
+        version = self.current_version(name)
+        return None if version is None else self.get(name, version)
+
+    def verify(self, entry: ModelVersion) -> None:
+        """Raise ValueError unless every file matches its manifest checksum."""
+        expected = entry.manifest.get("files", {})
+        actual = _checksums(entry.path)
+        if actual != expected:
+            bad = sorted(k for k in set(expected) | set(actual) if expected.get(k) != actual.get(k))
+            raise ValueError(f"{entry.name} {entry.version}: checksum mismatch for {bad}")
+
+    def publish(self, name: str, files: Dict[str, Union[str, Path]], version: Optional[str] = None, activate: bool = True, metadata: Optional[dict] = None) -> ModelVersion:
+        """Copy `files` (registry file name -> source file or directory) into a
+        new version of `name` and, if `activate`, point `current` at it."""
+        base = self.root / name
+        base.mkdir(parents=True, exist_ok=True)
+        if version is None:
+            numbers = [int(v[1:]) for v in self.versions(name) if v[:1] == "v" and v[1:].isdigit()]
+            version = f"v{max(numbers, default=0) + 1}"
+        final = base / version
+        if final.exists():
+            raise ValueError(f"version {version!r} of model {name!r} already exists")
+
+        staging = base / f".{version}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        try:
+            for target, source in files.items():
+                source = Path(source)
+                if source.is_dir():
+                    shutil.copytree(source, staging / target)
+                else:
+                    (staging / target).parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(source, staging / target)
+            manifest = {
+                "name": name,
+                "version": version,
+                "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "metadata": metadata or {},
+                "files": _checksums(staging),
+            }
+            with atomic_write(staging / MANIFEST, "w") as fh:
+                json.dump(manifest, fh, indent=2)
+            os.rename(staging, final)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        entry = ModelVersion(name, version, final, manifest)
+        if activate:
+            self.activate(name, version)
+        return entry
+
+    def activate(self, name: str, version: str) -> ModelVersion:
+        """Verify `version` and make it current."""
+        entry = self.get(name, version)
+        self.verify(entry)
+        with atomic_write(self.root / name / POINTER, "w") as fh:
+            fh.write(version + "\n")
+        return entry
+
+
+class RegistryWatcher:
+    """Follows the `current` pointer of one registry model for a worker.
+
+    `poll(active_version)` is cheap enough for the request path: at most
+    once per `check_interval` it reads the pointer, and when it names a
+    version other than `active_version` it starts a background thread that
+    verifies and loads that version with `load(entry)` and hands the result
+    to `install(value, entry)`. One load runs at a time; a version that
+    fails to load is not retried until the pointer moves again.
+    """
+
+    def __init__(self, name: str, load: Callable[[ModelVersion], object], install: Callable[[object, ModelVersion], None], registry: Optional[ModelRegistry] = None, check_interval: float = CHECK_INTERVAL):
+        self.name = name
+        self.registry = registry or ModelRegistry()
+        self.check_interval = float(check_interval)
+        self._load = load
+        self._install = install
+        self._busy = threading.Lock()
+        self._last_check = 0.0
+        self._failed: Optional[str] = None
+        self.swaps = 0
+        self.failures = 0
+        self.last_swap_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def poll(self, active_version: Optional[str], force: bool = False, wait: bool = False) -> None:
+        if not force and time.monotonic() - self._last_check < self.check_interval:
+            return
+        if not self._busy.acquire(blocking=wait):
+            return  # a check or load is already running
+        handed_off = False
+        try:
+            self._last_check = time.monotonic()
+            try:
+                version = self.registry.current_version(self.name)
+            except OSError:
+                logger.exception("Failed to read the %s registry pointer", self.name)
+                return
+            if version is None or version == active_version or version == self._failed:
+                return
+            if wait:
+                self._swap(version)
+            else:
+                threading.Thread(target=self._swap_and_release, args=(version,), name=f"registry-{self.name}", daemon=True).start()
+                handed_off = True
+        finally:
+            if not handed_off:
+                self._busy.release()
+
+    def _swap_and_release(self, version: str) -> None:
+        try:
+            self._swap(version)
+        finally:
+            self._busy.release()
+
+    def _swap(self, version: str) -> None:
+        start = time.perf_counter()
+        try:
+            entry = self.registry.get(self.name, version)
+            self.registry.verify(entry)
+            value = self._load(entry)
+        except Exception as e:
+            self.mark_failed(version, e)
+            logger.exception("Failed to load %s %s; keeping the active version", self.name, version)
+            return
+        self._install(value, entry)
+        self.swaps += 1
+        self.last_swap_seconds = time.perf_counter() - start
+        logger.info("Swapped in %s %s (%.2fs)", self.name, version, self.last_swap_seconds)
+
+    def mark_failed(self, version: str, error: BaseException) -> None:
+        """Record that `version` failed to load (e.g. by the caller's own cold
+        start), so it is not tried again until the pointer moves."""
+        self.failures += 1
+        self._failed = version
+        self.last_error = f"{version}: {error}"
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "swaps": self.swaps,
+            "swap_failures": self.failures,
+            "swapping": self._busy.locked(),
+            "last_swap_seconds": self.last_swap_seconds,
+            "last_error": self.last_error,
+        }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Manage the versioned model registry.")
+    ap.add_argument("--root", default=str(REGISTRY_ROOT))
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("list", help="versions of a model, marking the current one")
+    p.add_argument("name")
+    p = sub.add_parser("publish", help="publish files as a new version")
+    p.add_argument("name")
+    p.add_argument("files", nargs="+", help="registry_name=source_path")
+    p.add_argument("--version")
+    p.add_argument("--no-activate", action="store_true")
+    for command in ("activate", "verify"):
+        p = sub.add_parser(command)
+        p.add_argument("name")
+        p.add_argument("version")
+    args = ap.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    if args.command == "list":
+        current = registry.current_version(args.name)
+        for version in registry.versions(args.name):
+            print(("* " if version == current else "  ") + version)
+    elif args.command == "publish":
+        files = dict(f.split("=", 1) for f in args.files)
+        entry = registry.publish(args.name, files, version=args.version, activate=not args.no_activate)
+        print(f"published {args.name} {entry.version}" + ("" if args.no_activate else " (current)"))
+    elif args.command == "activate":
+        registry.activate(args.name, args.version)
+        print(f"{args.name} current -> {args.version}")
+    else:
+        registry.verify(registry.get(args.name, args.version))
+        print(f"{args.name} {args.version}: ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""Local model server shared by all API workers on a node.
+
+One process owns the zero-shot model and the heart model and serves them
+over a Unix domain socket, so N uvicorn workers don't each hold a copy.
+Zero-shot requests from every worker go through one MicroBatcher, which
+batches them across workers.
+
+Protocol: every frame is a 5-byte header (payload length as uint32, then
+one op/status byte) followed by the payload, all big-endian.
+
+    OP_PING      empty                                 -> empty
+    OP_CLASSIFY  uint16 count, (uint32 len, utf-8)*    -> per text: uint8 len, model version,
+                                                          uint8 n, (uint8 len, label, float32 score)*n
+    OP_HEART     float64 per REQUIRED_FEATURES value   -> JSON result of predict_heart_attack
+    OP_HEART_BATCH  OP_HEART's payload once per row    -> JSON list of results
+
+Responses carry STATUS_OK or STATUS_ERROR (payload: utf-8 message) as
+their op byte.
+
+Workers use the server when MEDTRIAGE_MODEL_SERVER_SOCKET is set and fall
+back to in-process inference whenever it can't be reached. Run it with:
+
+    python model_server.py --socket /run/medtriage/models.sock
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+
+from result_cache import env_number
+
+logger = logging.getLogger(__name__)
+
+OP_PING, OP_CLASSIFY, OP_HEART, OP_HEART_BATCH = 0, 1, 2, 3
+STATUS_OK, STATUS_ERROR = 0, 1
+
+MAX_FRAME = 16 * 1024 * 1024
+_HEADER = struct.Struct("!IB")
+_U8 = struct.Struct("!B")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_F32 = struct.Struct("!f")
+
+
+class ModelServerUnavailable(RuntimeError):
+    """The model server could not be reached; callers should fall back."""
+
+
+class ModelServerError(RuntimeError):
+    """The model server answered with an error for this request."""
+
+
+# -- framing ---------------------------------------------------------------
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    length, code = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if length > MAX_FRAME:
+        raise ConnectionError(f"frame of {length} bytes exceeds limit")
+    return code, _recv_exact(sock, length)
+
+
+def write_frame(sock: socket.socket, code: int, payload: bytes = b"") -> None:
+    sock.sendall(_HEADER.pack(len(payload), code) + payload)
+
+
+def encode_texts(texts: Sequence[str]) -> bytes:
+    parts = [_U16.pack(len(texts))]
+    for text in texts:
+        raw = text.encode("utf-8")
+        parts.append(_U32.pack(len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def decode_texts(payload: bytes) -> List[str]:
+    (count,), pos = _U16.unpack_from(payload), _U16.size
+    texts = []
+    for _ in range(count):
+        (n,) = _U32.unpack_from(payload, pos)
+        pos += _U32.size
+        texts.append(payload[pos:pos + n].decode("utf-8"))
+        pos += n
+    return texts
+
+
+def encode_predictions(preds: Sequence[Sequence[Tuple[str, float]]], versions: Sequence[str]) -> bytes:
+    parts = []
+    for pred, version in zip(preds, versions):
+        raw = version.encode("utf-8")
+        parts.append(_U8.pack(len(raw)) + raw)
+        parts.append(_U8.pack(len(pred)))
+        for label, score in pred:
+            raw = label.encode("utf-8")
+            parts.append(_U8.pack(len(raw)) + raw + _F32.pack(float(score)))
+    return b"".join(parts)
+
+
+def decode_predictions(payload: bytes, count: int) -> Tuple[List[List[Tuple[str, float]]], List[str]]:
+    """(predictions, model version that made each one) for `count` texts."""
+    out, versions, pos = [], [], 0
+    for _ in range(count):
+        (size,) = _U8.unpack_from(payload, pos)
+        pos += 1
+        versions.append(payload[pos:pos + size].decode("utf-8"))
+        pos += size
+        (n,) = _U8.unpack_from(payload, pos)
+        pos += 1
+        pred = []
+        for _ in range(n):
+            (size,) = _U8.unpack_from(payload, pos)
+            pos += 1
+            label = payload[pos:pos + size].decode("utf-8")
+            pos += size
+            (score,) = _F32.unpack_from(payload, pos)
+            pos += _F32.size
+            pred.append((label, score))
+        out.append(pred)
+    return out, versions
+
+
+def encode_features(values: Sequence[float]) -> bytes:
+    return struct.pack(f"!{len(values)}d", *[float(v) for v in values])
+
+
+def decode_features(payload: bytes) -> List[float]:
+    values = struct.unpack(f"!{len(payload) // 8}d", payload)
+    # Integral values go back to int so categorical columns see the same type
+    return [int(v) if v.is_integer() else v for v in values]
+
+
+# -- client ----------------------------------------------------------------
+
+class ModelServerClient:
+    """Pooled client for the model server.
+
+    Up to `pool_size` idle connections are kept for reuse. A connection
+    failure marks the server down for `retry_after` seconds, during which
+    calls raise ModelServerUnavailable immediately so callers fall back to
+    in-process inference without waiting on connect timeouts.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 2.0, retry_after: float = 5.0):
+        self.path = path
+        self.timeout = float(timeout)
+        self.retry_after = float(retry_after)
+        self._pool: "queue.LifoQueue[socket.socket]" = queue.LifoQueue(maxsize=max(1, int(pool_size)))
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.errors = 0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _checkout(self) -> socket.socket:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            with self._lock:
+                self._down_until = time.monotonic() + self.retry_after
+            raise ModelServerUnavailable(f"cannot connect to model server at {self.path}: {e}") from e
+        return sock
+
+    def _checkin(self, sock: socket.socket) -> None:
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def call(self, op: int, payload: bytes = b"", timeout: Optional[float] = None) -> bytes:
+        if not self.available():
+            raise ModelServerUnavailable("model server marked down")
+        with self._lock:
+            self.calls += 1
+        try:
+            sock = self._checkout()
+            try:
+                sock.settimeout(self.timeout if timeout is None else timeout)
+                write_frame(sock, op, payload)
+                status, body = read_frame(sock)
+            except (OSError, struct.error) as e:
+                # The connection's state is unknown after a timeout or reset
+                sock.close()
+                raise ModelServerUnavailable(f"model server call failed: {e}") from e
+        except ModelServerUnavailable:
+            with self._lock:
+                self.failures += 1
+            raise
+        self._checkin(sock)
+        if status != STATUS_OK:
+            with self._lock:
+                self.errors += 1
+            raise ModelServerError(body.decode("utf-8", "replace"))
+        return body
+
+    def ping(self) -> bool:
+        try:
+            self.call(OP_PING)
+        except RuntimeError:
+            return False
+        return True
+
+    def classify_batch(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+        return self.classify_batch_with_versions(texts, timeout)[0]
+
+    def classify_batch_with_versions(self, texts: Sequence[str], timeout: Optional[float] = None) -> Tuple[List[List[Tuple[str, float]]], List[str]]:
+        """Predictions plus the server's model version behind each one, so
+        callers can cache and audit them under the version that answered."""
+        return decode_predictions(self.call(OP_CLASSIFY, encode_texts(texts), timeout), len(texts))
+
+    def predict_heart(self, values: Sequence[float], timeout: Optional[float] = None) -> dict:
+        """Heart prediction for feature values in REQUIRED_FEATURES order."""
+        return json.loads(self.call(OP_HEART, encode_features(values), timeout).decode("utf-8"))
+
+    def predict_heart_batch(self, rows: Sequence[Sequence[float]], timeout: Optional[float] = None) -> List[dict]:
+        """Heart predictions for several rows of REQUIRED_FEATURES values."""
+        payload = encode_features([v for values in rows for v in values])
+        return json.loads(self.call(OP_HEART_BATCH, payload, timeout).decode("utf-8"))
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "socket": self.path,
+                "available": self.available(),
+                "calls": self.calls,
+                "failures": self.failures,
+                "errors": self.errors,
+                "idle_connections": self._pool.qsize(),
+            }
+
+
+_client: Optional[ModelServerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Optional[ModelServerClient]:
+    """Shared client when MEDTRIAGE_MODEL_SERVER_SOCKET is set, else None."""
+    global _client
+    path = os.environ.get("MEDTRIAGE_MODEL_SERVER_SOCKET")
+    if not path:
+        return None
+    with _client_lock:
+        if _client is None or _client.path != path:
+            _client = ModelServerClient(
+                path,
+                pool_size=env_number("MEDTRIAGE_MODEL_SERVER_POOL", 4, int),
+                timeout=env_number("MEDTRIAGE_MODEL_SERVER_TIMEOUT", 2.0, float),
+            )
+        return _client
+
+
+def client_stats() -> Optional[Dict[str, object]]:
+    client = get_client()
+    return client.stats() if client is not None else None
+
+
+# -- server ----------------------------------------------------------------
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                op, payload = read_frame(sock)
+            except (OSError, struct.error):
+                return
+            try:
+                status, body = STATUS_OK, self.server.dispatch(op, payload)
+            except Exception as e:
+                status, body = STATUS_ERROR, (str(e) or type(e).__name__).encode("utf-8")
+            try:
+                write_frame(sock, status, body)
+            except OSError:
+                return
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves `classify_batch` (through a cross-worker MicroBatcher),
+    `predict_heart` and `predict_heart_batch` on a Unix socket; one thread
+    per worker connection. `classify_batch(texts)` returns
+    (predictions, model version), the version being sent with each answer."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, classify_batch=None, predict_heart=None, window: float = 0.01, max_batch: int = 32, timeout: float = 30.0, predict_heart_batch=None):
+        from ml_triage import MicroBatcher
+
+        self.classify_batch = classify_batch
+        self.batcher = MicroBatcher(self._classify, max_batch=max_batch, window=window, max_queue=4096) if classify_batch else None
+        self.predict_heart = predict_heart
+        self.predict_heart_batch = predict_heart_batch
+        self.timeout = timeout
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        super().__init__(path, _Handler)
+
+    def server_bind(self):
+        # Bind inside a private 0700 directory, make the socket owner-only,
+        # then rename it into place: it is never reachable with the umask's
+        # mode, and the process umask is left alone
+        path = self.server_address
+        private = tempfile.mkdtemp(prefix=".medtriage-sock-", dir=os.path.dirname(os.path.abspath(path)))
+        staged = os.path.join(private, "sock")
+        try:
+            self.socket.bind(staged)
+            os.chmod(staged, 0o600)
+            os.rename(staged, path)
+        finally:
+            shutil.rmtree(private, ignore_errors=True)
+        self.server_address = path
+
+    def _classify(self, texts: List[str]) -> List[tuple]:
+        preds, version = self.classify_batch(texts)
+        return [(pred, version) for pred in preds]
+
+    def dispatch(self, op: int, payload: bytes) -> bytes:
+        if op == OP_PING:
+            return b""
+        if op == OP_CLASSIFY:
+            if self.batcher is None:
+                raise RuntimeError("zero-shot model not served")
+            futures = [self.batcher.submit(t) for t in decode_texts(payload)]
+            results = [f.result(self.timeout) for f in futures]
+            return encode_predictions([pred for pred, _ in results], [version for _, version in results])
+        if op == OP_HEART:
+            if self.predict_heart is None:
+                raise RuntimeError("heart model not served")
+            from ml.heart_attack import REQUIRED_FEATURES
+
+            data = dict(zip(REQUIRED_FEATURES, decode_features(payload)))
+            return json.dumps(self.predict_heart(data)).encode("utf-8")
+        if op == OP_HEART_BATCH:
+            if self.predict_heart_batch is None:
+                raise RuntimeError("heart model not served")
+            from ml.heart_attack import REQUIRED_FEATURES
+
+            values, n = decode_features(payload), len(REQUIRED_FEATURES)
+            rows = [dict(zip(REQUIRED_FEATURES, values[i:i + n])) for i in range(0, len(values), n)]
+            return json.dumps(self.predict_heart_batch(rows)).encode("utf-8")
+        raise RuntimeError(f"unknown op {op}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve the triage models to API workers over a Unix socket.")
+    ap.add_argument("--socket", default=os.environ.get("MEDTRIAGE_MODEL_SERVER_SOCKET", "/tmp/medtriage-models.sock"))
+    ap.add_argument("--no-ml", action="store_true", help="don't load the zero-shot model")
+    ap.add_argument("--no-heart", action="store_true", help="don't load the heart model")
+    ap.add_argument("--window-ms", type=float, default=env_number("MEDTRIAGE_ML_BATCH_WINDOW_MS", 10.0, float))
+    ap.add_argument("--max-batch", type=int, default=32)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # The server must never call itself
+    os.environ.pop("MEDTRIAGE_MODEL_SERVER_SOCKET", None)
+    classify_batch = predict_heart = predict_heart_batch = None
+    if not args.no_ml:
+        from ml_triage import _ml, current_classifier
+
+        _ml._init()
+        def classify_batch(texts):
+            # Resolved per call so registry hot-swaps reach the server too
+            ml = current_classifier()
+            return ml.classify_batch(texts), ml.model_version
+    if not args.no_heart:
+        from ml.heart_attack import _current, _predict_local, _predict_local_batch
+
+        _current()
+        predict_heart = _predict_local
+        predict_heart_batch = _predict_local_batch
+
+    server = ModelServer(args.socket, classify_batch, predict_heart, window=args.window_ms / 1000.0, max_batch=args.max_batch, predict_heart_batch=predict_heart_batch)
+    logger.info("Model server listening on %s (ml=%s, heart=%s)", args.socket, classify_batch is not None, predict_heart is not None)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -51,4 +51,24 @@ class AuditLog(Base):
     session_id = Column(Integer, ForeignKey("sessions.session_id"), nullable=False)
     endpoint = Column(String(50), nullable=False)
     fallback_to_rule = Column(Boolean, nullable=False, default=False)
+    # ML circuit breaker state when the request was served (closed/open/half_open)
+    breaker_state = Column(String(16), nullable=True)
+    # Version of the model that produced the answer (registry version, model
+    # name or distilled model version); NULL for rule-based answers
+    model_version = Column(String(64), nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+
+class BreakerAuditLog(Base):
+    """One row per circuit breaker state change, including trips and
+    recoveries that happen between recorded requests."""
+    __tablename__ = "breaker_audit_log"
+
+    log_id = Column(Integer, primary_key=True, index=True)
+    breaker = Column(String(32), nullable=False)
+    from_state = Column(String(16), nullable=False)
+    to_state = Column(String(16), nullable=False)
+    reason = Column(String(255), nullable=True)
+    # Whether requests fall back to the rules in the new state (open / half-open)
+    fallback_to_rule = Column(Boolean, nullable=False, default=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
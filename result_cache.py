@@ -0,0 +1,228 @@
+"""Small in-process LRU + TTL cache for triage results.
+
+Entries are keyed on normalized symptom text and bound to the version of the
+rule pack / model that produced them: storing or reading with a different
+version clears the cache, so a result computed by an old rule pack or model is
+never served after a swap.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import os
+import re
+import sys
+import threading
+import time
+
+_SEPARATORS = re.compile(r"[\W_]+")
+# Apostrophes inside words are dropped ("don't" -> "dont") rather than split
+_APOSTROPHES = re.compile(r"(?<=\w)['\u2019](?=\w)")
+
+
+def _collapse_separator(m) -> str:
+    # Keep punctuation as a boundary so "severe. Chest" can't turn into the
+    # trigger "severe chest"; plain whitespace collapses to a single space
+    return " . " if m.group().replace("_", " ").strip() else " "
+
+
+def normalize_symptom_text(text: str) -> str:
+    """Lowercase, collapse whitespace runs to one space and punctuation runs to " . "."""
+    if not text:
+        return ""
+    text = _APOSTROPHES.sub("", text.lower())
+    return _SEPARATORS.sub(_collapse_separator, text).strip(" .")
+
+
+class OffsetMap:
+    """Maps character offsets in normalized text back to the original text.
+
+    Each normalization step is recorded as a list of (dst_start, src_start)
+    segments inside which characters map one to one; lookups walk the steps
+    from last to first.
+    """
+
+    def __init__(self, steps: List[List[Tuple[int, int]]], shift: int = 0):
+        self._steps = [([d for d, _ in seg], [s for _, s in seg]) for seg in steps]
+        self._shift = shift
+
+    def to_source(self, index: int) -> int:
+        pos = index + self._shift
+        for dst, src in reversed(self._steps):
+            k = bisect_right(dst, pos) - 1
+            pos = src[k] + (pos - dst[k]) if k >= 0 else 0
+        return pos
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Map a half-open [start, end) span of normalized text."""
+        return self.to_source(start), self.to_source(end - 1) + 1
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, Optional[OffsetMap]]:
+    """`normalize_symptom_text` plus an OffsetMap back into `text`.
+
+    The map is None in the rare case lowercasing changes the text length
+    (some non-ASCII characters), where offsets can't be kept.
+    """
+    if not text:
+        return "", None
+    low = text.lower()
+    if len(low) != len(text):
+        return normalize_symptom_text(text), None
+
+    # Step 1: apostrophe removal
+    seg1, parts, out_len, prev = [], [], 0, 0
+    for m in _APOSTROPHES.finditer(low):
+        seg1.append((out_len, prev))
+        parts.append(low[prev:m.start()])
+        out_len += m.start() - prev
+        prev = m.end()
+    seg1.append((out_len, prev))
+    parts.append(low[prev:])
+    s1 = "".join(parts)
+
+    # Step 2: separator collapsing; a replacement maps back to its run start
+    seg2, parts, out_len, prev = [], [], 0, 0
+    for m in _SEPARATORS.finditer(s1):
+        seg2.append((out_len, prev))
+        parts.append(s1[prev:m.start()])
+        out_len += m.start() - prev
+        rep = _collapse_separator(m)
+        seg2.append((out_len, m.start()))
+        parts.append(rep)
+        out_len += len(rep)
+        prev = m.end()
+    seg2.append((out_len, prev))
+    parts.append(s1[prev:])
+    s2 = "".join(parts)
+
+    # Step 3: strip, which only shifts offsets
+    shift = len(s2) - len(s2.lstrip(" ."))
+    return s2.strip(" ."), OffsetMap([seg1, seg2], shift)
+
+
+def env_number(name: str, default, cast):
+    """Read a numeric setting from the environment, falling back to `default`."""
+    try:
+        return cast(os.environ.get(name, str(default)))
+    except Exception:
+        return default
+
+
+def approx_sizeof(obj) -> int:
+    """Rough deep size in bytes of `obj` and the dicts, lists, tuples and
+    sets inside it (shared objects are counted each time they appear)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(k) + approx_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(v) for v in obj)
+    return size
+
+
+class ResultCache:
+    """Thread-safe bounded LRU cache with per-entry TTL and counters.
+
+    With `sizeof` (e.g. `approx_sizeof`) the cache also tracks the
+    approximate bytes held by its keys and values, reported as "bytes".
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl)
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.bytes = 0
+
+    @classmethod
+    def from_env(cls, prefix: str, **kwargs) -> "ResultCache":
+        """Build a cache sized by `<prefix>_CACHE_SIZE` / `<prefix>_CACHE_TTL` env vars."""
+        return cls(
+            max_size=env_number(f"{prefix}_CACHE_SIZE", 1024, int),
+            ttl=env_number(f"{prefix}_CACHE_TTL", 300.0, float),
+            **kwargs,
+        )
+
+    def _bind_version(self, version: Optional[str]) -> None:
+        # Caller holds the lock
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+                self._clear()
+            self._version = version
+
+    def _clear(self) -> None:
+        # Caller holds the lock
+        self._data.clear()
+        self.bytes = 0
+
+    def _pop(self, key: Hashable = None, oldest: bool = False) -> None:
+        # Caller holds the lock
+        if oldest:
+            _, entry = self._data.popitem(last=False)
+        else:
+            entry = self._data.pop(key)
+        self.bytes -= entry[2]
+
+    def get(self, key: Hashable, version: Optional[str] = None) -> Any:
+        """Return the cached value for `key` or None on a miss."""
+        if self.max_size == 0:
+            return None
+        with self._lock:
+            self._bind_version(version)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value, _ = entry
+            if expires < time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Optional[str] = None) -> None:
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._bind_version(version)
+            if key in self._data:
+                self._pop(key)
+            size = self._sizeof(key) + self._sizeof(value) if self._sizeof is not None else 0
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.max_size:
+                self._pop(oldest=True)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "version": self._version,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+            if self._sizeof is not None:
+                stats["bytes"] = self.bytes
+            return stats
@@ -27,6 +27,18 @@ CREATE TABLE IF NOT EXISTS audit_log (
   session_id INT NOT NULL,
   endpoint VARCHAR(50) NOT NULL,
   fallback_to_rule BOOLEAN NOT NULL DEFAULT FALSE,
+  breaker_state VARCHAR(16) NULL,
+  model_version VARCHAR(64) NULL,
   timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (session_id) REFERENCES sessions(session_id)
 );
+
+CREATE TABLE IF NOT EXISTS breaker_audit_log (
+  log_id INT AUTO_INCREMENT PRIMARY KEY,
+  breaker VARCHAR(32) NOT NULL,
+  from_state VARCHAR(16) NOT NULL,
+  to_state VARCHAR(16) NOT NULL,
+  reason VARCHAR(255) NULL,
+  fallback_to_rule BOOLEAN NOT NULL DEFAULT FALSE,
+  timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
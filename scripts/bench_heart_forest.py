@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for heart model inference: sklearn vs the flat-array forest.
+
+Loads the shipped heart model, encodes patients synthesized from
+scripts/data/heart.csv (rows resampled with small numeric jitter) and times,
+for 1, 100 and 100k rows:
+
+    sklearn pipeline   model.predict_proba on a DataFrame
+    fast path          FastHeartModel with sklearn's forest
+    fast + flat        FastHeartModel with ml/forest.py at every size
+    default            FastHeartModel as the API uses it (flat forest up to
+                       FLAT_MAX_ROWS rows, sklearn's forest above)
+
+Each configuration is also checked against the sklearn pipeline output.
+
+Usage:
+    python scripts/bench_heart_forest.py [--sizes 1,100,100000] [--budget 2.0]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from ml.heart_attack import REQUIRED_FEATURES, _load_model  # noqa: E402
+from ml.heart_fast import FastHeartModel  # noqa: E402
+
+DATA = Path(__file__).resolve().parent / "data" / "heart.csv"
+NUMERIC = {"age", "trestbps", "chol", "thalach", "oldpeak"}
+
+
+def patients(n, seed=0):
+    df = pd.read_csv(DATA)[REQUIRED_FEATURES]
+    rng = np.random.default_rng(seed)
+    sample = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    for col in NUMERIC:
+        sample[col] = sample[col] + rng.normal(0, 0.05 * sample[col].std(), n).round(1)
+    return sample
+
+
+def _time(fn, budget):
+    """Seconds per call: repeat until `budget` seconds are spent (at least once)."""
+    fn()
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", default="1,100,100000")
+    ap.add_argument("--budget", type=float, default=2.0, help="seconds spent timing each configuration")
+    args = ap.parse_args()
+
+    model = _load_model()
+    engines = [
+        ("fast path", FastHeartModel.compile(model, flat_forest=False)),
+        ("fast + flat", FastHeartModel.compile(model, flat_forest=True, flat_max_rows=sys.maxsize)),
+        ("default", FastHeartModel.compile(model)),
+    ]
+    if any(fast is None for _, fast in engines):
+        print("model shape not supported by the fast path", file=sys.stderr)
+        return 1
+    flat_bytes = sum(m[2].nbytes for m in engines[1][1].members)
+    print(f"model: {type(model).__name__}, {len(engines[1][1].members)} forest(s), flat arrays {flat_bytes / 1024:.0f} KB")
+
+    print(f"{'rows':>8}  {'engine':<16} {'per call':>12} {'per row':>12} {'max |diff|':>11}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        df = patients(n)
+        rows = df.to_dict("records")
+        expected = model.predict_proba(df)
+        t = _time(lambda: model.predict_proba(df), args.budget)
+        print(f"{n:>8}  {'sklearn pipeline':<16} {t * 1e3:>9.3f} ms {t / n * 1e6:>9.2f} us {0.0:>11.1e}")
+        for name, fast in engines:
+            if n == 1:
+                fn = lambda: fast.predict_proba_row(rows[0])  # noqa: E731
+                got = fast.predict_proba_row(rows[0])[None, :]
+            else:
+                fn = lambda: fast.predict_proba(rows)  # noqa: E731
+                got = fast.predict_proba(rows)
+            t = _time(fn, args.budget)
+            diff = float(np.abs(got - expected).max())
+            print(f"{n:>8}  {name:<16} {t * 1e3:>9.3f} ms {t / n * 1e6:>9.2f} us {diff:>11.1e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
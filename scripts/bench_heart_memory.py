@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory and cold-load time of the heart model: pickle vs mmap.
+
+Starts --workers fresh Python processes per loading mode, all alive at the
+same time like uvicorn workers on one node. Each one imports
+ml.heart_attack, loads the model and scores one patient:
+
+    pickle   MEDTRIAGE_HEART_MMAP=0: joblib.load of heart_attack_model.pkl
+             plus compiling the fast path (imports sklearn)
+    mmap     MEDTRIAGE_HEART_MMAP=1: heart_attack_model.flat mapped
+             read-only (numpy only; needs scripts/export_heart_flat.py)
+
+and reports the seconds from process start to the first prediction. While
+all workers of a mode are up, their /proc/<pid>/smaps_rollup is read:
+RSS counts shared pages in full for every worker, PSS divides them among
+the processes sharing them, so PSS is the per-worker cost on the node.
+Linux only. The model files are read once first so the page cache is warm
+for both modes.
+
+Usage:
+    python scripts/bench_heart_memory.py [--workers 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLE = {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'thalach': 150, 'exang': 0, 'oldpeak': 2.3}
+MODES = {"pickle": "0", "mmap": "1"}
+
+
+def child():
+    start = time.perf_counter()
+    sys.path.insert(0, str(ROOT))
+    from ml.heart_attack import _current, predict_heart_attack
+
+    loaded = _current()
+    predict_heart_attack(SAMPLE)
+    report = {
+        "seconds": time.perf_counter() - start,
+        "flat": loaded._model is None,
+        "sklearn": "sklearn" in sys.modules,
+    }
+    print(json.dumps(report), flush=True)
+    sys.stdin.read()  # stay up until the parent has measured every worker
+
+
+def smaps_rollup(pid: int) -> dict:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    return out
+
+
+def run_mode(mode: str, workers: int) -> dict:
+    env = dict(os.environ, MEDTRIAGE_HEART_MMAP=MODES[mode])
+    env.pop("MEDTRIAGE_MODEL_SERVER_SOCKET", None)  # load in-process, not via the model server
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--child"], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        reports = [json.loads(p.stdout.readline()) for p in procs]
+        mem = [smaps_rollup(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    return {
+        "seconds": statistics.median(r["seconds"] for r in reports),
+        "flat": all(r["flat"] for r in reports),
+        "sklearn": any(r["sklearn"] for r in reports),
+        "rss": statistics.mean(m["Rss"] for m in mem),
+        "pss": statistics.mean(m["Pss"] for m in mem),
+        "private": statistics.mean(m["Private_Clean"] + m["Private_Dirty"] for m in mem),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child()
+
+    sys.path.insert(0, str(ROOT))
+    from ml.heart_attack import FLAT_PATH, MODEL_PATH
+
+    if not FLAT_PATH.exists():
+        print(f"{FLAT_PATH} not found; run scripts/export_heart_flat.py first", file=sys.stderr)
+        return 1
+    for path in (MODEL_PATH, FLAT_PATH):
+        path.read_bytes()
+    print(f"pickle {MODEL_PATH.stat().st_size / 1024:.0f} KB, flat {FLAT_PATH.stat().st_size / 1024:.0f} KB, {args.workers} workers per mode")
+    print(f"{'mode':<8} {'cold load':>10} {'RSS':>9} {'PSS':>9} {'private':>9}  sklearn imported")
+    for mode in MODES:
+        r = run_mode(mode, args.workers)
+        if mode == "mmap" and not r["flat"]:
+            print("mmap workers fell back to the pickle (stale export?)", file=sys.stderr)
+        print(f"{mode:<8} {r['seconds'] * 1e3:>7.0f} ms {r['rss']:>6.1f} MB {r['pss']:>6.1f} MB {r['private']:>6.1f} MB  {r['sklearn']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the zero-shot ML backends (torch pipeline vs int8 ONNX Runtime).
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. Reports load time, single-text latency (p50/p95), batched
+throughput and peak RSS.
+
+Usage:
+    python scripts/bench_ml_backends.py [--backends torch,onnx] [--repeat 50] [--batch 16]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TEXTS = [
+    "Severe chest pain, shortness of breath",
+    "mild headache for two days",
+    "fever and cough since yesterday",
+    "no chest pain, just a runny nose",
+    "sudden weakness on one side and slurred speech",
+    "itchy rash on my arm after gardening",
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def child(backend: str, repeat: int, batch: int) -> dict:
+    from ml_triage import MLClassifier
+
+    start = time.perf_counter()
+    clf = MLClassifier(backend=backend)
+    clf._init()
+    load = time.perf_counter() - start
+    clf.classify(TEXTS[0])  # warm up
+
+    lat = []
+    for i in range(repeat):
+        t = time.perf_counter()
+        clf.classify(TEXTS[i % len(TEXTS)])
+        lat.append(time.perf_counter() - t)
+    lat.sort()
+
+    texts = [TEXTS[i % len(TEXTS)] for i in range(batch)]
+    rounds = max(1, repeat // batch)
+    t = time.perf_counter()
+    for _ in range(rounds):
+        clf.classify_batch(texts)
+    throughput = rounds * batch / (time.perf_counter() - t)
+
+    return {
+        "backend": backend,
+        "load_s": load,
+        "p50_ms": lat[len(lat) // 2] * 1000,
+        "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000,
+        "throughput": throughput,
+        "rss_mb": _peak_rss_mb(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--backends", default="torch,onnx")
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.repeat, args.batch)))
+        return 0
+
+    print(f"{'backend':<8} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'peak RSS MB':>12}")
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        cmd = [sys.executable, __file__, "--child", backend, "--repeat", str(args.repeat), "--batch", str(args.batch)]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(ROOT), env=dict(os.environ))
+        if proc.returncode != 0:
+            err = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"{backend:<8} unavailable: {err}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{backend:<8} {r['load_s']:8.2f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['throughput']:9.1f} {r['rss_mb']:12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
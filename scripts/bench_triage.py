@@ -0,0 +1,73 @@
+"""
+Micro-benchmark for the rule-based symptom classifier.
+
+Times RuleEngine.classify over a small corpus of symptom phrasings (bypassing
+the result cache) for the configured rule pack with negation/hedge scope
+detection and fuzzy matching switched on one after the other, and prints
+per-call latency and the overhead relative to plain trigger matching.
+
+Usage:
+    python scripts/bench_triage.py [--repeat 2000]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import triage  # noqa: E402
+from result_cache import normalize_symptom_text  # noqa: E402
+
+CORPUS = [
+    "headache",
+    "fever and cough",
+    "Severe chest pain, shortness of breath",
+    "No chest pain, just a mild cough",
+    "I don't have a fever but my runny nose and sore throat are getting worse",
+    "denies vomiting or diarrhea, mild abdominal pain since yesterday",
+    "not sure if this is chest pain or just heartburn after dinner",
+    "Mild headache for two days",
+    "diarhea and vomitting since the morning, some chestpain",
+    "sudden weakness on one side and slurred speech, wife says face droop",
+    "patient reports persistent cough, high temperature and dehydration over the weekend " * 3,
+]
+
+
+def _variants(pack):
+    """Engines for the pack with progressively more matching features enabled."""
+    base = {k: v for k, v in pack.items() if k not in ("negation", "fuzzy")}
+    negation = dict(base, negation=pack.get("negation"))
+    return [
+        ("triggers only", triage.RuleEngine.from_pack(base)),
+        ("+ negation/hedging", triage.RuleEngine.from_pack(negation)),
+        ("+ fuzzy matching", triage.RuleEngine.from_pack(pack)),
+    ]
+
+
+def _time(engine, texts, repeat):
+    keys = [normalize_symptom_text(t) for t in texts]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for k in keys:
+            engine.classify_normalized(k)
+    return (time.perf_counter() - start) / (repeat * len(keys))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    pack = json.loads(triage.RULES_PATH.read_text(encoding="utf-8"))
+    print(f"rule pack {pack['version']}, {len(CORPUS)} texts x {args.repeat}")
+    base = None
+    for name, engine in _variants(pack):
+        t = _time(engine, CORPUS, args.repeat)
+        base = base or t
+        print(f"  {name:<20} {t * 1e6:8.2f} us/call  ({(t / base - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Build the heart model's calibration lookup table.
+
+Fits a Platt-style LogisticRegression on the model's raw probabilities for
+a stratified 20% holdout of scripts/data/heart.csv (or tabulates an existing
+pickled calibrator with --from-pickle) and saves it as a monotone knot
+table, models/heart_attack_calibration.npz, which ml/heart_attack.py loads
+at startup. Run it whenever the model is retrained; train_heart_model.py
+calls it automatically.
+
+Usage:
+    python scripts/build_heart_calibration.py
+    python scripts/build_heart_calibration.py --from-pickle models/heart_attack_calibrator.pkl
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from ml.calibration import DEFAULT_KNOTS, CalibrationTable  # noqa: E402
+from ml.heart_attack import CALIBRATION_PATH, MODEL_PATH, REQUIRED_FEATURES  # noqa: E402
+
+DATA_CSV = ROOT / "scripts" / "data" / "heart.csv"
+
+
+def fit_calibrator(model, X_calib, y_calib):
+    """Platt scaling on the raw positive-class probability."""
+    from sklearn.linear_model import LogisticRegression
+
+    probs = model.predict_proba(X_calib)[:, 1]
+    # Maps raw probs -> calibrated probs smoothly and avoids extreme clipping
+    return LogisticRegression(solver="lbfgs").fit(probs.reshape(-1, 1), y_calib)
+
+
+def holdout(data_csv=DATA_CSV):
+    """The deterministic calibration split of the bundled dataset."""
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(data_csv)
+    _, X_calib, _, y_calib = train_test_split(df[REQUIRED_FEATURES], df["target"], test_size=0.2, random_state=42, stratify=df["target"])
+    return X_calib, y_calib.values
+
+
+def build_table(model, knots=DEFAULT_KNOTS, data_csv=DATA_CSV) -> CalibrationTable:
+    X_calib, y_calib = holdout(data_csv)
+    return CalibrationTable.from_calibrator(fit_calibrator(model, X_calib, y_calib), knots)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--model", default=str(MODEL_PATH))
+    ap.add_argument("--from-pickle", help="tabulate this pickled sklearn calibrator instead of fitting one")
+    ap.add_argument("--knots", type=int, default=DEFAULT_KNOTS)
+    ap.add_argument("--out", default=str(CALIBRATION_PATH))
+    args = ap.parse_args()
+
+    import joblib
+
+    if args.from_pickle:
+        table = CalibrationTable.from_calibrator(joblib.load(args.from_pickle), args.knots)
+    else:
+        model = joblib.load(args.model)
+        if hasattr(model, "calibrated_classifiers_"):
+            print("note: this model is already calibrated; the table is only used for uncalibrated models")
+        table = build_table(model, args.knots)
+    table.save(args.out)
+    print(f"wrote {args.out}: {len(table.x)} knots from {table.source}, p(0.5) -> {table(0.5):.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Import-time report and budget check for the API entry point.
+
+Imports the module (default: main) in a fresh interpreter with
+`python -X importtime`, prints the slowest imports and fails when the total
+exceeds --budget-ms or when a heavy ML dependency (transformers, torch,
+pandas, sklearn, ...) was imported at startup instead of on first use or
+during warmup.
+
+Usage:
+    python scripts/check_import_time.py [--module main] [--budget-ms 2000] [--top 15]
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Must only be imported lazily (first ML request or explicit warmup)
+HEAVY_MODULES = ("transformers", "torch", "onnxruntime", "pandas", "sklearn", "joblib", "scipy")
+
+
+def measure(module: str):
+    """Return ({import name: (self_us, cumulative_us)}, sorted loaded module names)."""
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=str(ROOT))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        times[parts[2].strip()] = (self_us, cum_us)
+    return times, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def heavy_loaded(modules):
+    return sorted({m.split(".")[0] for m in modules} & set(HEAVY_MODULES))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--module", default="main")
+    ap.add_argument("--budget-ms", type=float, default=2000.0)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args(argv)
+
+    times, modules = measure(args.module)
+    total_ms = times.get(args.module, (0, 0))[1] / 1000.0
+    print(f"import {args.module}: {total_ms:.0f} ms, {len(modules)} modules loaded (budget {args.budget_ms:.0f} ms)")
+    # Top-level packages only, so nested submodules don't crowd the list
+    packages = {}
+    for name, (_, cum) in times.items():
+        root = name.split(".")[0]
+        packages[root] = max(packages.get(root, 0), cum)
+    for name, cum in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {cum / 1000.0:8.1f} ms  {name}")
+
+    ok = True
+    heavy = heavy_loaded(modules)
+    if heavy:
+        print(f"FAIL: heavy dependencies imported at startup: {', '.join(heavy)}", file=sys.stderr)
+        ok = False
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time {total_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms", file=sys.stderr)
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
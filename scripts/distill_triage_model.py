@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Distill the zero-shot triage model into a hashed n-gram logistic regression.
+
+1. Collect symptom texts from the `sessions` table (MEDTRIAGE_DATABASE_URL)
+   and/or JSONL files.
+2. Label them with the zero-shot teacher (or take an existing `label`
+   field with --use-existing-labels), dropping texts the teacher itself is
+   unsure about.
+3. Train a multinomial logistic regression on hashed unigram+bigram
+   features (ml/distilled.py) and save it as a small .npz artifact.
+
+Holdout accuracy against the teacher labels is printed at the end.
+
+Usage:
+    python scripts/distill_triage_model.py --db --out models/triage_distilled.npz
+    python scripts/distill_triage_model.py --jsonl sessions.jsonl --field input_text
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from ml.distilled import DEFAULT_FEATURES, DISTILLED_PATH, DistilledClassifier, features  # noqa: E402
+
+
+def texts_from_db(limit=None):
+    from sqlalchemy import create_engine, text
+
+    url = os.environ.get("MEDTRIAGE_DATABASE_URL") or "sqlite:///./medtriage_dev.db"
+    engine = create_engine(url)
+    sql = "SELECT input_text FROM sessions WHERE input_text IS NOT NULL ORDER BY session_id DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(sql))]
+
+
+def rows_from_jsonl(path, field):
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if isinstance(row.get(field), str):
+                yield row
+
+
+def label_with_teacher(texts, min_confidence, batch=32):
+    """(text, label) pairs from the zero-shot model, skipping unsure ones."""
+    from ml_triage import _ml
+
+    _ml._init()
+    out = []
+    for i in range(0, len(texts), batch):
+        chunk = texts[i:i + batch]
+        for text, preds in zip(chunk, _ml.classify_batch(chunk)):
+            label, score = preds[0]
+            if score >= min_confidence:
+                out.append((text, label))
+    return out
+
+
+def feature_matrix(texts, n_features):
+    from scipy.sparse import csr_matrix
+
+    indptr, indices = [0], []
+    for text in texts:
+        indices.extend(features(text, n_features))
+        indptr.append(len(indices))
+    data = [1.0] * len(indices)
+    return csr_matrix((data, indices, indptr), shape=(len(texts), n_features))
+
+
+def train(pairs, n_features=DEFAULT_FEATURES, c=4.0, version=None, holdout=0.2, seed=42):
+    """Fit the student on (text, label) pairs; returns (model, holdout accuracy or None)."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    texts = [t for t, _ in pairs]
+    labels = [label for _, label in pairs]
+    X = feature_matrix(texts, n_features)
+    accuracy = None
+    if holdout and len(set(labels)) > 1 and len(pairs) >= 10:
+        X_tr, X_te, y_tr, y_te = train_test_split(X, labels, test_size=holdout, random_state=seed)
+        probe = LogisticRegression(C=c, max_iter=1000).fit(X_tr, y_tr)
+        accuracy = float(probe.score(X_te, y_te))
+    clf = LogisticRegression(C=c, max_iter=1000).fit(X, labels)
+    classes = [str(label) for label in clf.classes_]
+    coef, intercept = clf.coef_, clf.intercept_
+    if len(classes) == 2:
+        # Binary problems get one coefficient row; expand to one column per class
+        coef = [-coef[0] / 2, coef[0] / 2]
+        intercept = [-intercept[0] / 2, intercept[0] / 2]
+    import numpy as np
+
+    weights = np.asarray(coef, dtype=np.float32).T
+    version = version or time.strftime("distilled-%Y%m%d%H%M%S")
+    return DistilledClassifier(weights, np.asarray(intercept, dtype=np.float32), classes, version), accuracy
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--db", action="store_true", help="read texts from the sessions table")
+    ap.add_argument("--limit", type=int, help="max sessions to read from the DB")
+    ap.add_argument("--jsonl", action="append", default=[], help="JSONL file(s) with symptom texts")
+    ap.add_argument("--field", default="symptom", help="JSONL text field")
+    ap.add_argument("--use-existing-labels", action="store_true", help="take the JSONL `label` field instead of running the teacher")
+    ap.add_argument("--min-teacher-confidence", type=float, default=0.5)
+    ap.add_argument("--features", type=int, default=DEFAULT_FEATURES)
+    ap.add_argument("-C", type=float, default=4.0, help="inverse regularization strength")
+    ap.add_argument("--out", default=str(DISTILLED_PATH))
+    args = ap.parse_args()
+
+    pairs, texts = [], []
+    for path in args.jsonl:
+        for row in rows_from_jsonl(path, args.field):
+            if args.use_existing_labels and row.get("label"):
+                pairs.append((row[args.field], str(row["label"])))
+            else:
+                texts.append(row[args.field])
+    if args.db:
+        texts.extend(texts_from_db(args.limit))
+    # Each distinct text only needs one teacher call
+    texts = list(dict.fromkeys(texts))
+    if texts:
+        print(f"labelling {len(texts)} texts with the zero-shot teacher...")
+        pairs.extend(label_with_teacher(texts, args.min_teacher_confidence))
+    if not pairs:
+        print("no labelled texts to train on", file=sys.stderr)
+        return 1
+
+    model, accuracy = train(pairs, args.features, args.C)
+    model.save(args.out)
+    size_kb = Path(args.out).stat().st_size / 1024
+    acc = f"{accuracy:.3f}" if accuracy is not None else "n/a"
+    print(f"trained on {len(pairs)} texts, labels {model.labels}; holdout agreement with teacher {acc}")
+    print(f"wrote {args.out} ({size_kb:.0f} KB, version {model.version})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
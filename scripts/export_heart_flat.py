@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Export the heart model as a memory-mappable flat file.
+
+Writes models/heart_attack_model.flat: the fast path's encoders,
+calibrator parameters and flat forest arrays (ml/heart_fast.py,
+ml/flat_store.py), tagged with the sha256 of the pickle it came from.
+ml/heart_attack.py maps it read-only instead of unpickling the model, so
+all workers on a node share its pages. The export is checked against the
+pickled model's predict_proba on scripts/data/heart.csv.
+
+Usage:
+    python scripts/export_heart_flat.py [--model models/heart_attack_model.pkl] [--out models/heart_attack_model.flat]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from ml.heart_attack import FLAT_PATH, MODEL_PATH, REQUIRED_FEATURES, export_flat  # noqa: E402
+
+DATA_CSV = ROOT / "scripts" / "data" / "heart.csv"
+
+
+def check(model, flat_path, data_csv=DATA_CSV) -> float:
+    """Largest probability difference between the export and `model`."""
+    import numpy as np
+    import pandas as pd
+
+    from ml.heart_fast import FastHeartModel
+
+    df = pd.read_csv(data_csv)[REQUIRED_FEATURES]
+    got = FastHeartModel.load(flat_path).predict_proba(df.to_dict("records"))
+    return float(np.abs(got - model.predict_proba(df)).max())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--model", default=str(MODEL_PATH))
+    ap.add_argument("--out", default=str(FLAT_PATH))
+    ap.add_argument("--atol", type=float, default=1e-9)
+    args = ap.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model)
+    export_flat(model, Path(args.model), Path(args.out))
+    diff = check(model, args.out)
+    print(f"wrote {args.out} ({Path(args.out).stat().st_size / 1024:.0f} KB), max |diff| vs pickle {diff:.1e}")
+    return 0 if diff <= args.atol else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Export the zero-shot NLI model to ONNX with int8 dynamic quantization.
+
+Writes models/nli_int8.onnx (used when MEDTRIAGE_ML_BACKEND=onnx) and then
+checks that the quantized model's (label, score) output matches the torch
+pipeline within --atol on a few sample symptom texts.
+
+Requires transformers, torch and onnxruntime (plus onnx for quantization).
+
+Usage:
+    python scripts/export_nli_onnx.py [--model typeform/distilbert-base-uncased-mnli] [--atol 0.05]
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from ml.nli_onnx import ONNX_MODEL_PATH, OnnxZeroShot  # noqa: E402
+from ml_triage import ML_LABELS, ML_MODEL_NAME  # noqa: E402
+
+SAMPLES = [
+    "Severe chest pain, shortness of breath",
+    "mild headache for two days",
+    "fever and cough since yesterday",
+    "no chest pain, just a runny nose",
+]
+
+
+def export(model_name: str, out: Path) -> None:
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    dummy = tokenizer(["a premise"], ["This example is a hypothesis."], return_tensors="pt")
+    names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+    axes = {k: {0: "batch", 1: "sequence"} for k in names}
+    axes["logits"] = {0: "batch"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32 = Path(tmp) / "nli.onnx"
+        torch.onnx.export(
+            model,
+            tuple(dummy[k] for k in names),
+            str(fp32),
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=axes,
+            opset_version=14,
+        )
+        out.parent.mkdir(parents=True, exist_ok=True)
+        quantize_dynamic(str(fp32), str(out), weight_type=QuantType.QInt8)
+    print(f"wrote {out} ({out.stat().st_size / 1e6:.1f} MB)")
+
+
+def check(model_name: str, out: Path, atol: float) -> bool:
+    from transformers import pipeline
+
+    torch_clf = pipeline("zero-shot-classification", model=model_name)
+    onnx_clf = OnnxZeroShot(model_name, out)
+    ok = True
+    for text in SAMPLES:
+        ref = torch_clf(text, ML_LABELS)
+        got = onnx_clf(text, ML_LABELS)
+        ref_scores = dict(zip(ref["labels"], ref["scores"]))
+        diff = max(abs(ref_scores[label] - score) for label, score in zip(got["labels"], got["scores"]))
+        same_top = ref["labels"][0] == got["labels"][0]
+        ok = ok and same_top and diff <= atol
+        print(f"  {'ok ' if same_top and diff <= atol else 'BAD'} max|dscore|={diff:.4f} top={got['labels'][0]!r}  {text}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--model", default=ML_MODEL_NAME)
+    ap.add_argument("--out", default=str(ONNX_MODEL_PATH))
+    ap.add_argument("--atol", type=float, default=0.05, help="max allowed score difference vs torch")
+    args = ap.parse_args()
+
+    out = Path(args.out)
+    export(args.model, out)
+    if not check(args.model, out, args.atol):
+        print("quantized model output differs from torch beyond tolerance", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+medtriage-score: bulk triage of symptom texts from a JSONL or CSV file.
+
+Rows are read lazily, grouped into chunks and scored by a pool of worker
+processes; at most a few chunks per worker are in flight at any time, so
+memory stays bounded however large the input is. Results are written as
+JSONL in input order, followed by a throughput / per-engine timing summary
+on stderr.
+
+Usage:
+    python scripts/medtriage_score.py symptoms.jsonl -o scored.jsonl
+    python scripts/medtriage_score.py export.csv --field input_text --engine both --workers 8
+    cat symptoms.jsonl | python scripts/medtriage_score.py - --format jsonl
+
+Each output line carries the row `index` (0-based), the row's `--id-field`
+value if one is given, and a `rules` / `ml` object per engine holding either
+the triage result or an `error`. If an engine's model can't be loaded the
+run stops with an error instead of writing a file of error rows.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+ENGINES = ("rules", "ml")
+
+
+def _open_input(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_rows(fh, fmt: str, field: str, id_field=None):
+    """Yield (id, text) pairs; text is None for rows without a usable field."""
+    if fmt == "csv":
+        for row in csv.DictReader(fh):
+            yield (row.get(id_field) if id_field else None), row.get(field)
+        return
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        if not isinstance(row, dict):
+            yield None, None
+            continue
+        text = row.get(field)
+        yield (row.get(id_field) if id_field else None), (text if isinstance(text, str) else None)
+
+
+def _chunks(rows, size: int):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _rules_result(out):
+    risk, suggestion, conditions, score, matches = out
+    return {"risk": risk, "suggestion": suggestion, "conditions": conditions, "score": score, "matches": matches}
+
+
+class EngineInitError(RuntimeError):
+    """An engine's model could not be loaded, so every row would fail."""
+
+
+def init_engines(engines):
+    """Load the models `engines` need; runs once per worker process (or once
+    in this process for --workers 0) before any chunk is scored."""
+    if "ml" in engines:
+        import ml_triage
+
+        if ml_triage._ml_ready():  # already loaded, or a model server answers
+            return
+        try:
+            ml_triage._ml._init()
+        except Exception as e:
+            raise EngineInitError(f"ML engine failed to initialize: {e or type(e).__name__}") from e
+
+
+def score_chunk(texts, engines):
+    """Score one chunk of texts; returns (results, seconds spent per engine).
+
+    Runs inside a worker process. `results[i]` maps each engine name to its
+    result dict (or {"error": ...}) for `texts[i]`.
+    """
+    results = [{} for _ in texts]
+    timings = {}
+    if "rules" in engines:
+        from triage import classify_symptoms
+
+        start = time.perf_counter()
+        for res, out in zip(results, classify_symptoms(list(texts))):
+            res["rules"] = {"error": str(out)} if isinstance(out, Exception) else _rules_result(out)
+        timings["rules"] = time.perf_counter() - start
+    if "ml" in engines:
+        from ml_triage import ml_triage
+
+        start = time.perf_counter()
+        for res, text in zip(results, texts):
+            if not isinstance(text, str) or not text.strip():
+                res["ml"] = {"error": "symptom text is empty"}
+                continue
+            try:
+                res["ml"] = _rules_result(ml_triage(text))
+            except Exception as e:
+                res["ml"] = {"error": str(e) or type(e).__name__}
+        timings["ml"] = time.perf_counter() - start
+    return results, timings
+
+
+class _Inline:
+    """Executor stand-in for --workers 0 (debugging, tiny files)."""
+
+    class _Done:
+        def __init__(self, value):
+            self._value = value
+
+        def result(self):
+            return self._value
+
+    def submit(self, fn, *args):
+        return self._Done(fn(*args))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def run(rows, out, engines, workers: int, chunk_size: int, id_field=None, max_inflight=None):
+    """Score `rows` ((id, text) pairs) and write JSONL results to `out` in order.
+
+    Returns (row count, per-engine seconds). Raises EngineInitError if an
+    engine can't be loaded.
+    """
+    if workers > 0:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_engines, initargs=(engines,))
+    else:
+        init_engines(engines)
+        executor = _Inline()
+    max_inflight = max_inflight or max(1, workers) * 2
+    totals = {name: 0.0 for name in engines}
+    pending = deque()  # (first index, ids, future), oldest first
+    count = 0
+
+    def drain_one():
+        first, ids, future = pending.popleft()
+        try:
+            results, timings = future.result()
+        except BrokenProcessPool as e:
+            # A failing initializer breaks the pool; its traceback is on stderr
+            raise EngineInitError("a worker process failed to load its engines (see the traceback above)") from e
+        for name, seconds in timings.items():
+            totals[name] += seconds
+        for offset, (row_id, res) in enumerate(zip(ids, results)):
+            record = {"index": first + offset}
+            if id_field:
+                record["id"] = row_id
+            record.update(res)
+            out.write(json.dumps(record) + "\n")
+
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            ids = [row_id for row_id, _ in chunk]
+            texts = [text for _, text in chunk]
+            pending.append((count, ids, executor.submit(score_chunk, texts, engines)))
+            count += len(chunk)
+            # Block on the oldest chunk so output order holds and memory stays bounded
+            while len(pending) >= max_inflight:
+                drain_one()
+        while pending:
+            drain_one()
+    finally:
+        executor.shutdown(wait=True)
+    return count, totals
+
+
+def _format_for(path: str, fmt) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="medtriage-score", description="Bulk triage of symptom texts from a JSONL or CSV file.")
+    ap.add_argument("input", help="JSONL/CSV file, or - for stdin")
+    ap.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    ap.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the file extension)")
+    ap.add_argument("--field", default="symptom", help="field/column holding the symptom text")
+    ap.add_argument("--id-field", help="field/column copied to the output as `id`")
+    ap.add_argument("--engine", choices=["rules", "ml", "both"], default="rules")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (0 = score in this process)")
+    ap.add_argument("--chunk-size", type=int, default=500)
+    args = ap.parse_args(argv)
+
+    engines = ENGINES if args.engine == "both" else (args.engine,)
+    fmt = _format_for(args.input, args.format)
+
+    start = time.perf_counter()
+    with _open_input(args.input) as fh:
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            rows = read_rows(fh, fmt, args.field, args.id_field)
+            count, totals = run(rows, out, engines, args.workers, max(1, args.chunk_size), args.id_field)
+        except EngineInitError as e:
+            print(f"medtriage-score: error: {e}", file=sys.stderr)
+            return 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"scored {count} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec, {max(1, args.workers)} workers)", file=sys.stderr)
+    for name in engines:
+        # Engine time is summed across workers, i.e. CPU-side cost per row
+        per_row = totals[name] / count * 1e6 if count else 0.0
+        print(f"  {name:<6} {totals[name]:8.2f}s total  {per_row:8.1f} us/row", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
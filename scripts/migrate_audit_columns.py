@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Add nullable audit_log columns introduced after the initial schema.
+
+Safe to re-run: columns that already exist are skipped. Works for SQLite and
+MySQL (plain ALTER TABLE ... ADD COLUMN, no defaults needed).
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect, text
+
+# Use the same DATABASE_URL logic as main.py
+DATABASE_URL = os.environ.get("MEDTRIAGE_DATABASE_URL")
+if not DATABASE_URL:
+    DATABASE_URL = "sqlite:///./medtriage_dev.db"
+
+# column name -> SQL type
+AUDIT_COLUMNS = {
+    "breaker_state": "VARCHAR(16)",
+    "model_version": "VARCHAR(64)",
+}
+
+print(f"Using database: {DATABASE_URL}")
+
+engine = create_engine(DATABASE_URL)
+existing = {c["name"] for c in inspect(engine).get_columns("audit_log")}
+
+with engine.connect() as conn:
+    for name, sql_type in AUDIT_COLUMNS.items():
+        if name in existing:
+            print(f"audit_log.{name} already exists; skipping")
+            continue
+        print(f"Adding audit_log.{name}...")
+        conn.execute(text(f"ALTER TABLE audit_log ADD COLUMN {name} {sql_type} NULL"))
+    conn.commit()
+
+print("Migration complete!")
@@ -11,10 +11,13 @@ Usage:
 Outputs:
     models/heart_attack_model.pkl
     models/heart_attack_report.json
+    models/heart_attack_calibration.npz
+    models/heart_attack_model.flat
 
 This keeps the implementation simple and explainable for later API integration.
 """
 import os
+import sys
 import json
 import tempfile
 from pathlib import Path
@@ -40,6 +43,11 @@ FALLBACK_URLS = [
     "https://raw.githubusercontent.com/ageron/handson-ml2/master/datasets/heart/heart.csv",
 ]
 ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from artifacts import atomic_write  # noqa: E402
+
 MODEL_DIR = ROOT / "models"
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 MODEL_PATH = MODEL_DIR / "heart_attack_model.pkl"
@@ -159,11 +167,13 @@ def train_and_evaluate(X_train, X_test, y_train, y_test, preprocessor):
 
 
 def save_model(model, model_path=MODEL_PATH):
-    joblib.dump(model, model_path)
+    # A running API may be loading the model; it must never see a partial pickle
+    with atomic_write(model_path) as f:
+        joblib.dump(model, f)
 
 
 def save_report(report: dict, path=REPORT_PATH):
-    with open(path, 'w') as f:
+    with atomic_write(path, 'w') as f:
         json.dump(report, f, indent=2)
 
 
@@ -184,6 +194,21 @@ def main():
     print("Saving model...")
     save_model(best_model)
 
+    # Calibration is fixed here, at training time, as a lookup table the API
+    # loads at startup; the held-out split is the one the metrics use
+    print("Building calibration table...")
+    from build_heart_calibration import fit_calibrator
+    from ml.calibration import CalibrationTable
+    from ml.heart_attack import CALIBRATION_PATH
+
+    CalibrationTable.from_calibrator(fit_calibrator(best_model, X_test, y_test.values)).save(CALIBRATION_PATH)
+
+    # Memory-mappable copy the API workers share (see export_heart_flat.py)
+    print("Exporting flat model...")
+    from ml.heart_attack import FLAT_PATH, export_flat
+
+    export_flat(best_model, MODEL_PATH, FLAT_PATH)
+
     report = {
         'metrics': metrics,
         'best_params': search.best_params_,
@@ -195,6 +220,10 @@ def main():
 
     print("Done. Model saved to:", MODEL_PATH)
     print("Report saved to:", REPORT_PATH)
+    print("Calibration saved to:", CALIBRATION_PATH)
+    print("Flat model saved to:", FLAT_PATH)
+    print("To roll it out to running workers, publish it to the model registry:")
+    print(f"    python model_registry.py publish heart model.pkl={MODEL_PATH} model.flat={FLAT_PATH} calibration.npz={CALIBRATION_PATH} report.json={REPORT_PATH}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,22 @@
+import pathlib
+import sys
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture
+def missing_heart_model(monkeypatch, tmp_path):
+    """Point the heart loader at a model file that doesn't exist (and an
+    empty registry) without touching the shipped model; yields that path,
+    which a test may write its own model to."""
+    import ml.heart_attack as heart
+    from model_registry import ModelRegistry
+
+    monkeypatch.setattr(heart, "MODEL_PATH", tmp_path / "missing.pkl")
+    monkeypatch.setattr(heart, "FLAT_PATH", tmp_path / "missing.flat")
+    monkeypatch.setattr(heart, "_WATCHER", heart.RegistryWatcher(heart.REGISTRY_NAME, heart._read_version, heart._install, ModelRegistry(tmp_path / "registry")))
+    monkeypatch.setattr(heart, "_active", None)
+    return heart.MODEL_PATH
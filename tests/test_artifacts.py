@@ -0,0 +1,129 @@
+import os
+import stat
+import threading
+
+import pytest
+
+import ml.heart_attack as heart
+from artifacts import SingleFlight, atomic_write
+
+
+def run_threads(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def test_concurrent_callers_share_one_load():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls, results = [], []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    threads = run_threads(8, lambda: results.append(flight.do(load)))
+    # Let every thread reach do() before the load finishes
+    while flight.stats()["waiters"] < 7:
+        threading.Event().wait(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    stats = flight.stats()
+    assert stats["loads"] == 1 and stats["max_concurrent_waiters"] == 7 and not stats["in_flight"]
+    assert stats["last_load_seconds"] > 0
+
+
+def test_failure_reaches_waiters_and_is_not_cached():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    errors = []
+
+    def broken():
+        release.wait(5)
+        raise RuntimeError("disk")
+
+    def call():
+        try:
+            flight.do(broken)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = run_threads(3, call)
+    while flight.stats()["waiters"] < 2:
+        threading.Event().wait(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 3 and flight.stats()["failures"] == 1
+    assert flight.do(lambda: 42) == 42
+
+
+def test_heart_model_is_loaded_once_under_a_burst(monkeypatch):
+    import joblib
+
+    loads = []
+    real_load = joblib.load
+
+    def slow_load(path):
+        loads.append(path)
+        threading.Event().wait(0.05)
+        return real_load(path)
+
+    monkeypatch.setattr(joblib, "load", slow_load)
+    monkeypatch.setattr(heart, "_active", None)
+    models = []
+    for t in run_threads(6, lambda: models.append(heart._load_model())):
+        t.join()
+    assert loads == [heart.MODEL_PATH]
+    assert len(models) == 6 and all(m is models[0] for m in models)
+    assert heart.loader_stats()["load"]["loads"] >= 1
+
+
+def test_atomic_write_replaces_or_leaves_the_original(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(b"old")
+    with pytest.raises(ValueError):
+        with atomic_write(path) as fh:
+            fh.write(b"half")
+            raise ValueError("crashed mid-write")
+    assert path.read_bytes() == b"old"
+
+    with atomic_write(path) as fh:
+        fh.write(b"new")
+    assert path.read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["model.pkl"]
+
+    with atomic_write(tmp_path / "sub" / "report.json", "w") as fh:
+        fh.write("{}")
+    assert (tmp_path / "sub" / "report.json").read_text() == "{}"
+
+
+def test_atomic_write_uses_umask_mode_or_keeps_the_existing_one(tmp_path):
+    old = os.umask(0o022)
+    try:
+        with atomic_write(tmp_path / "model.flat") as fh:
+            fh.write(b"new")
+        assert stat.S_IMODE((tmp_path / "model.flat").stat().st_mode) == 0o644
+
+        (tmp_path / "model.flat").chmod(0o640)
+        with atomic_write(tmp_path / "model.flat") as fh:
+            fh.write(b"newer")
+        assert stat.S_IMODE((tmp_path / "model.flat").stat().st_mode) == 0o640
+    finally:
+        os.umask(old)
+
+
+def test_atomic_write_does_not_touch_the_process_umask(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(os, "umask", lambda mask: calls.append(mask) or 0o022)
+    with atomic_write(tmp_path / "report.json", "w") as fh:
+        fh.write("{}")
+    assert calls == []
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.isotonic import IsotonicRegression
+from sklearn.linear_model import LogisticRegression
+
+import ml.heart_attack as heart
+from ml.calibration import CalibrationTable
+
+
+def platt():
+    rng = np.random.default_rng(0)
+    p = rng.random(300)
+    y = (rng.random(300) < p ** 1.5).astype(int)
+    return p, LogisticRegression().fit(p.reshape(-1, 1), y), y
+
+
+def test_table_tracks_the_fitted_calibrator_for_scalars_and_arrays():
+    _, lr, _ = platt()
+    table = CalibrationTable.from_calibrator(lr)
+    x = np.linspace(0, 1, 10001)
+    np.testing.assert_allclose(table(x), lr.predict_proba(x.reshape(-1, 1))[:, 1], atol=1e-5)
+    assert isinstance(table(0.3), float)
+    assert table(0.3) == table(np.array([0.3]))[0]
+    assert np.all(np.diff(table(x)) >= 0)
+
+
+def test_isotonic_is_copied_exactly():
+    p, _, y = platt()
+    iso = IsotonicRegression(out_of_bounds="clip").fit(p, y)
+    table = CalibrationTable.from_calibrator(iso)
+    x = np.linspace(0, 1, 997)
+    np.testing.assert_allclose(table(x), iso.predict(x), atol=1e-12)
+
+
+def test_round_trip_and_validation(tmp_path):
+    _, lr, _ = platt()
+    table = CalibrationTable.from_calibrator(lr, knots=33)
+    path = tmp_path / "calibration.npz"
+    table.save(path)
+    loaded = CalibrationTable.load(path)
+    assert loaded.source == "LogisticRegression" and len(loaded.x) == 33
+    np.testing.assert_array_equal(loaded.x, table.x)
+    np.testing.assert_array_equal(loaded.y, table.y)
+    with pytest.raises(ValueError):
+        CalibrationTable([0.0, 1.0], [0.9, 0.1])
+
+
+def test_loading_never_fits(monkeypatch, tmp_path):
+    monkeypatch.setattr(LogisticRegression, "fit", lambda *a, **k: pytest.fail("fitted at request time"))
+    path, legacy = tmp_path / "calibration.npz", tmp_path / "calibrator.pkl"
+    assert heart._read_calibration(path, legacy) is None
+    raw = np.array([0.2, 0.7])
+    model = SimpleNamespace(classes_=np.array([0, 1]))  # an uncalibrated model
+    np.testing.assert_array_equal(heart.HeartModel(model, None).calibrate(raw), raw)
+
+    CalibrationTable([0.0, 1.0], [0.1, 0.9]).save(path)
+    np.testing.assert_allclose(heart.HeartModel(model, heart._read_calibration(path, legacy)).calibrate(raw), [0.26, 0.66])
@@ -0,0 +1,130 @@
+import sys
+import pathlib
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import cascade
+import ml.distilled as distilled
+from cascade import DISTILLED, RULES, TRANSFORMER, TriageCascade
+from distill_triage_model import train
+from ml.distilled import DistilledClassifier, features
+
+PAIRS = [
+    ("crushing chest pain and cannot breathe", "high risk"),
+    ("chest pain spreading to left arm", "high risk"),
+    ("unconscious and not breathing", "high risk"),
+    ("sudden weakness on one side of face", "high risk"),
+    ("fever and cough for three days", "medium risk"),
+    ("vomiting since last night with fever", "medium risk"),
+    ("ear pain and fever", "medium risk"),
+    ("persistent cough and fever", "medium risk"),
+    ("mild runny nose", "low risk"),
+    ("small paper cut on finger", "low risk"),
+    ("slight itch on arm", "low risk"),
+    ("mild sneezing in the morning", "low risk"),
+] * 3
+
+
+class FakeDistilled:
+    version = "fake"
+
+    def __init__(self, preds):
+        self.preds = preds
+
+    def classify(self, text):
+        return self.preds
+
+
+def test_features_are_stable_and_phrase_bounded():
+    assert features("Chest pain, fever", 1024) == features("chest   pain , fever", 1024)
+    # "pain fever" is not a bigram because the comma ends the phrase
+    assert len(features("chest pain, fever", 2 ** 20)) == 4
+
+
+def test_train_save_load_round_trip(tmp_path):
+    model, accuracy = train(PAIRS, n_features=2 ** 12, version="t1")
+    assert accuracy is not None
+    assert model.classify("chest pain spreading to left arm")[0][0] == "high risk"
+    assert model.classify("mild runny nose")[0][0] == "low risk"
+
+    path = tmp_path / "distilled.npz"
+    model.save(path)
+    loaded = DistilledClassifier.load(path)
+    assert loaded.version == "t1" and loaded.labels == model.labels
+    assert loaded.classify("ear pain and fever") == model.classify("ear pain and fever")
+
+
+def test_confident_rules_answer_without_escalating(monkeypatch):
+    monkeypatch.setattr(cascade, "try_ml_triage", lambda *a, **k: pytest.fail("transformer called"))
+    c = TriageCascade(distilled=FakeDistilled([("low risk", 0.99)]))
+    (risk, _, _, _, matches), tier, spans = c.triage("Severe chest pain, shortness of breath")
+    assert (risk, tier) == ("High", RULES)
+    assert matches and spans
+    assert c.stats[DISTILLED].attempts == 0
+
+
+def test_distilled_tier_answers_when_confident(monkeypatch):
+    monkeypatch.setattr(cascade, "try_ml_triage", lambda *a, **k: pytest.fail("transformer called"))
+    c = TriageCascade(distilled=FakeDistilled([("medium risk", 0.9), ("low risk", 0.1)]))
+    result, tier, spans = c.triage("my ear hurts a bit")
+    assert (result[0], result[3], tier, spans) == ("Medium", 0.9, DISTILLED, None)
+
+
+def test_unsure_distilled_escalates_to_transformer(monkeypatch):
+    calls = []
+
+    def fake_ml(text, timeout):
+        calls.append(text)
+        return ("Low", "Self-care", ["Mild condition"], 0.7, [])
+
+    monkeypatch.setattr(cascade, "try_ml_triage", fake_ml)
+    c = TriageCascade(distilled=FakeDistilled([("medium risk", 0.5)]))
+    result, tier, _ = c.triage("my ear hurts a bit")
+    assert (result[0], tier, calls) == ("Low", TRANSFORMER, ["my ear hurts a bit"])
+    stats = c.snapshot()["tiers"]
+    assert stats[DISTILLED]["attempts"] == 1 and stats[DISTILLED]["hit_rate"] == 0.0
+    assert stats[TRANSFORMER]["accepted"] == 1
+
+
+@pytest.mark.parametrize("distilled_score, expected_tier", [(0.6, DISTILLED), (0.2, RULES)])
+def test_transformer_failure_falls_back_to_best_earlier_tier(monkeypatch, distilled_score, expected_tier):
+    def broken(text, timeout):
+        raise RuntimeError("ML model not initialized")
+
+    monkeypatch.setattr(cascade, "try_ml_triage", broken)
+    c = TriageCascade(distilled=FakeDistilled([("medium risk", distilled_score)]))
+    _, tier, spans = c.triage("my ear hurts a bit")
+    assert tier == expected_tier
+    assert (spans is not None) == (expected_tier == RULES)
+    assert c.snapshot()["fallbacks"] == 1
+
+
+def test_corrupt_distilled_artifact_falls_through_to_the_transformer(monkeypatch, tmp_path):
+    path = tmp_path / "triage_distilled.npz"
+    path.write_bytes(b"PK\x03\x04 truncated")
+    monkeypatch.setattr(distilled, "DISTILLED_PATH", path)
+    monkeypatch.setattr(distilled, "_loaded", False)
+    monkeypatch.setattr(distilled, "_model", None)
+    monkeypatch.setattr(cascade, "try_ml_triage", lambda text, timeout: ("Low", "Self-care", ["Mild condition"], 0.7, []))
+
+    c = TriageCascade()
+    result, tier, _ = c.triage("my ear hurts a bit")
+    assert (result[0], tier) == ("Low", TRANSFORMER)
+    assert c.snapshot()["distilled_version"] is None
+
+
+def test_failing_distilled_model_escalates(monkeypatch):
+    class Broken:
+        version = "broken"
+
+        def classify(self, text):
+            raise ValueError("shape mismatch")
+
+    monkeypatch.setattr(cascade, "try_ml_triage", lambda text, timeout: ("Low", "Self-care", ["Mild condition"], 0.7, []))
+    c = TriageCascade(distilled=Broken())
+    assert c.triage("my ear hurts a bit")[1] == TRANSFORMER
+    assert c.snapshot()["tiers"][DISTILLED]["accepted"] == 0
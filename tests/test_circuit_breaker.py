@@ -0,0 +1,176 @@
+import sys
+import pathlib
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import circuit_breaker
+import ml_triage
+from circuit_breaker import CLOSED, FAILURE, HALF_OPEN, LOW_CONFIDENCE, OK, OPEN, CircuitBreaker, CircuitOpen
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_trips_on_p95_latency_and_recovers_after_probes(clock):
+    seen = []
+    cb = CircuitBreaker(window=10, min_samples=10, p95_threshold=0.5, cooldown=30, probe_fraction=0.5, probe_successes=2, rng=lambda: 0.1)
+    cb.add_listener(lambda old, new, reason: seen.append((old, new)))
+    for _ in range(9):
+        cb.record(0.1, OK)
+    assert cb.state == CLOSED
+    cb.record(2.0, OK)  # one slow call in ten pushes p95 over the threshold
+    assert cb.state == OPEN and "p95" in cb.reason
+    assert not cb.allow()
+
+    clock[0] += 31
+    assert cb.allow() and cb.state == HALF_OPEN
+    cb.record(0.1, OK)
+    cb.record(0.1, OK)
+    assert cb.state == CLOSED
+    assert seen == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+    assert cb.stats()["skipped"] == 1
+    assert cb.stats()["transition_count"] == 3
+
+
+def test_failure_and_low_confidence_rates_trip(clock):
+    cb = CircuitBreaker(window=4, min_samples=4, failure_rate=0.5, low_confidence_rate=0.5)
+    for outcome in (OK, FAILURE, FAILURE, FAILURE):
+        cb.record(0.01, outcome)
+    assert cb.state == OPEN and "failure rate" in cb.reason
+
+    cb = CircuitBreaker(window=4, min_samples=4, failure_rate=0.9, low_confidence_rate=0.5)
+    for outcome in (OK, LOW_CONFIDENCE, LOW_CONFIDENCE, LOW_CONFIDENCE):
+        cb.record(0.01, outcome)
+    assert cb.state == OPEN and "low-confidence" in cb.reason
+
+
+def test_bad_probe_reopens_and_half_open_only_admits_a_fraction(clock):
+    draws = iter([0.9, 0.05])
+    cb = CircuitBreaker(window=1, min_samples=1, failure_rate=0.0, cooldown=5, probe_fraction=0.1, rng=lambda: next(draws))
+    cb.record(0.01, FAILURE)
+    clock[0] += 5
+    assert not cb.allow()  # half-open, but this request isn't a probe
+    assert cb.allow()
+    cb.record(0.01, FAILURE)
+    assert cb.state == OPEN
+
+
+def test_open_breaker_skips_ml(monkeypatch):
+    class Classifier:
+        model_version = "fake"
+        _initialized = True
+        calls = 0
+
+        def classify_batch(self, texts):
+            Classifier.calls += 1
+            return [[("low risk", 0.2)] for _ in texts]
+
+    cb = CircuitBreaker(window=2, min_samples=2, low_confidence_rate=0.5)
+    monkeypatch.setattr(ml_triage, "_ml", Classifier())
+    monkeypatch.setattr(ml_triage, "_BREAKER", cb)
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    monkeypatch.setattr(ml_triage, "_BATCHER", ml_triage.MicroBatcher(ml_triage._ml_triage_batch, window=0.0))
+
+    for text in ("cough", "fever"):
+        with pytest.raises(RuntimeError, match="confidence"):
+            ml_triage.try_ml_triage(text)
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpen):
+        ml_triage.try_ml_triage("headache")
+    assert Classifier.calls == 2
+
+
+def test_triage_ml_audits_breaker_state(monkeypatch):
+    from unittest.mock import Mock
+    from fastapi.testclient import TestClient
+    import main
+
+    class Classifier:
+        model_version = "fake"
+        _initialized = True
+
+    cb = CircuitBreaker(window=1, min_samples=1, failure_rate=0.0, cooldown=60)
+    cb.record(0.01, FAILURE)
+    monkeypatch.setattr(ml_triage, "_ml", Classifier())
+    monkeypatch.setattr(ml_triage, "_BREAKER", cb)
+
+    dummy = Mock()
+    dummy.create_session_with_audit = Mock(return_value=(type('S', (), {'session_id': 7})(), None))
+
+    def fake_get_db():
+        yield object()
+
+    monkeypatch.setattr(main, "crud", dummy)
+    monkeypatch.setattr(main, "get_db", fake_get_db)
+    monkeypatch.setattr(main, "DB_ENABLED", True)
+    resp = TestClient(main.app).post("/triage_ml", json={"symptom": "chest pain"})
+
+    assert resp.status_code == 200 and resp.json()["risk"] == "High"
+    kwargs = dummy.create_session_with_audit.call_args[1]
+    assert kwargs["fallback_to_rule"] is True
+    assert kwargs["breaker_state"] == OPEN
+
+
+def test_breaker_transitions_are_audited_between_requests(monkeypatch, clock):
+    from unittest.mock import Mock
+    import main
+
+    assert main._audit_breaker_transition in ml_triage._BREAKER._listeners
+    dummy = Mock()
+
+    def fake_get_db():
+        yield object()
+
+    monkeypatch.setattr(main, "crud", dummy)
+    monkeypatch.setattr(main, "get_db", fake_get_db)
+    monkeypatch.setattr(main, "DB_ENABLED", True)
+    cb = CircuitBreaker(window=1, min_samples=1, failure_rate=0.0, cooldown=5)
+    cb.add_listener(main._audit_breaker_transition)
+    cb.record(0.01, FAILURE)
+    clock[0] += 5
+    cb.allow()  # goes half-open with no request recorded in audit_log
+    main._BREAKER_AUDIT_QUEUE.join()
+
+    calls = [c[1] for c in dummy.record_breaker_transition.call_args_list]
+    assert [(c["from_state"], c["to_state"], c["fallback_to_rule"]) for c in calls] == [(CLOSED, OPEN, True), (OPEN, HALF_OPEN, True)]
+    assert "failure rate" in calls[0]["reason"]
+
+
+def test_slow_audit_db_never_delays_or_breaks_a_transition(monkeypatch):
+    import threading
+    import time
+    from unittest.mock import Mock
+    import main
+
+    release = threading.Event()
+    dummy = Mock()
+    dummy.record_breaker_transition = Mock(side_effect=lambda db, **kw: release.wait(5))
+
+    def fake_get_db():
+        yield object()
+
+    monkeypatch.setattr(main, "crud", dummy)
+    monkeypatch.setattr(main, "get_db", fake_get_db)
+    monkeypatch.setattr(main, "DB_ENABLED", True)
+
+    def broken(old, new, reason):
+        raise RuntimeError("listener bug")
+
+    cb = CircuitBreaker(window=1, min_samples=1, failure_rate=0.0)
+    cb.add_listener(broken)
+    cb.add_listener(main._audit_breaker_transition)
+    start = time.monotonic()
+    cb.record(0.01, FAILURE)
+    assert time.monotonic() - start < 1.0
+    assert cb.state == OPEN
+    release.set()
+    main._BREAKER_AUDIT_QUEUE.join()
+    assert dummy.record_breaker_transition.call_count == 1
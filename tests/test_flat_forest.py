@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+from ml.forest import FlatForest
+
+
+def data(n=400, n_features=6, n_classes=2, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int) + (n_classes > 2) * (X[:, 3] > 1)
+    return X, y
+
+
+@pytest.mark.parametrize("make", [
+    lambda: RandomForestClassifier(n_estimators=30, random_state=0),
+    lambda: RandomForestClassifier(n_estimators=10, max_depth=3, bootstrap=False, random_state=1),
+    lambda: RandomForestClassifier(n_estimators=15, min_samples_leaf=2, max_features=None, random_state=2),
+    lambda: ExtraTreesClassifier(n_estimators=20, random_state=3),
+])
+@pytest.mark.parametrize("n_classes", [2, 3])
+def test_matches_sklearn_predict_proba(make, n_classes):
+    X, y = data(n_classes=n_classes)
+    forest = make().fit(X, y)
+    flat = FlatForest.compile(forest)
+    assert flat.n_trees == len(forest.estimators_)
+    X_test, _ = data(n=3000, seed=9)
+    # Values sitting exactly on split thresholds must go the same way as in sklearn
+    splits = flat.threshold[np.isfinite(flat.threshold) & (flat.feature == 0)][:50]
+    X_test[:len(splits), 0] = splits
+    np.testing.assert_allclose(flat.predict_proba(X_test), forest.predict_proba(X_test), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(flat.predict_proba(X_test[:1]), forest.predict_proba(X_test[:1]), rtol=0, atol=1e-12)
+
+
+def test_missing_values_follow_the_learned_direction():
+    X, y = data()
+    X[::7, 1] = np.nan
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    flat = FlatForest.compile(forest)
+    X_test, _ = data(n=500, seed=4)
+    X_test[::3, 1] = np.nan
+    np.testing.assert_allclose(flat.predict_proba(X_test), forest.predict_proba(X_test), rtol=0, atol=1e-12)
+
+
+def test_chunking_and_shape_checks(monkeypatch):
+    import ml.forest
+
+    X, y = data()
+    forest = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    flat = FlatForest.compile(forest)
+    monkeypatch.setattr(ml.forest, "CHUNK_ROWS", 7)
+    np.testing.assert_allclose(flat.predict_proba(X[:50]), forest.predict_proba(X[:50]), rtol=0, atol=1e-12)
+    with pytest.raises(ValueError):
+        flat.predict_proba(X[:, :3])
+    assert FlatForest.compile(object()) is None
+
+
+def test_flat_store_round_trip(tmp_path):
+    from ml import flat_store
+
+    arrays = {"a": np.arange(5, dtype=np.int16), "b": np.linspace(0, 1, 12).reshape(3, 4), "c": np.array([True, False])}
+    flat_store.save(tmp_path / "x.flat", arrays, {"k": [1, 2]})
+    for mmap in (True, False):
+        loaded, meta = flat_store.load(tmp_path / "x.flat", mmap=mmap)
+        assert meta == {"k": [1, 2]}
+        for name, a in arrays.items():
+            np.testing.assert_array_equal(loaded[name], a)
+            assert loaded[name].dtype == a.dtype
+            assert loaded[name].ctypes.data % flat_store.ALIGN == 0 or not mmap
+    with pytest.raises(ValueError):
+        flat_store.save(tmp_path / "y.flat", {"o": np.array(["x"], dtype=object)}, {})
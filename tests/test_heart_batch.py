@@ -0,0 +1,114 @@
+import ast
+from unittest.mock import Mock, patch
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import ml.heart_attack as heart
+from ml.heart_attack import REQUIRED_FEATURES, _is_calibrated, _load_calibrator, _load_model, predict_heart_attack, predict_heart_attack_batch
+
+from result_cache import ResultCache, approx_sizeof
+
+client = TestClient(main.app)
+
+PATIENTS = [
+    {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'thalach': 150, 'exang': 0, 'oldpeak': 2.3},
+    {'age': 37, 'sex': 0, 'cp': 0, 'trestbps': 120, 'chol': 180, 'fbs': 0, 'thalach': 185, 'exang': 0, 'oldpeak': 0.0},
+    {'age': 58, 'sex': 1, 'cp': 2, 'trestbps': 132, 'chol': 224, 'fbs': 0, 'thalach': 173, 'exang': 1, 'oldpeak': 3.2},
+    {'age': 71, 'sex': 0, 'cp': 1, 'trestbps': 160, 'chol': 302, 'fbs': 1, 'thalach': 112, 'exang': 1, 'oldpeak': 1.4},
+]
+
+
+def test_batch_matches_two_pass_single_row_prediction():
+    model = _load_model()
+    calib = _load_calibrator()
+    out = predict_heart_attack_batch(PATIENTS)
+    assert len(out) == len(PATIENTS)
+    for row, res in zip(PATIENTS, out):
+        # The original per-row path: predict_proba and predict, calibrator per value
+        df = pd.DataFrame([{k: row[k] for k in REQUIRED_FEATURES}])
+        raw = float(model.predict_proba(df)[:, 1][0])
+        assert res['details']['raw_prediction'] == int(model.predict(df)[0])
+        assert res['details']['raw_probability'] == pytest.approx(raw, abs=1e-12)
+        if _is_calibrated(model):
+            assert res['confidence'] == res['details']['raw_probability']
+        elif calib is not None:
+            assert res['confidence'] == pytest.approx(calib(raw), abs=1e-12)
+        assert res == predict_heart_attack(row)
+
+
+def test_batch_reports_the_row_with_missing_features():
+    bad = dict(PATIENTS[0])
+    del bad['chol']
+    with pytest.raises(ValueError, match=r"Row 1: .*chol"):
+        predict_heart_attack_batch([PATIENTS[0], bad])
+    assert predict_heart_attack_batch([]) == []
+
+
+def test_batch_endpoint_matches_single_endpoint_and_records_once():
+    singles = [client.post('/triage_heart', json=p).json() for p in PATIENTS]
+
+    dummy = Mock()
+    dummy.create_sessions_with_audit = Mock(side_effect=lambda db, items, **kw: list(range(len(items))))
+
+    def fake_get_db():
+        yield object()
+
+    with patch.object(main, 'crud', dummy), patch.object(main, 'get_db', fake_get_db), patch.object(main, 'DB_ENABLED', True):
+        resp = client.post('/triage_heart/batch', json={'patients': PATIENTS})
+
+    assert resp.status_code == 200
+    assert resp.json()['results'] == singles
+    dummy.create_sessions_with_audit.assert_called_once()
+    items = dummy.create_sessions_with_audit.call_args.args[1]
+    assert [ast.literal_eval(i['input_text'])['age'] for i in items] == [p['age'] for p in PATIENTS]
+    assert all('fallback_to_rule' in i for i in items)
+
+
+def test_batch_endpoint_falls_back_per_row_when_model_fails(monkeypatch):
+    monkeypatch.setattr(main, 'try_heart_attack_triage_batch', lambda rows: [(None, 0.0, [], True)] * len(rows))
+    resp = client.post('/triage_heart/batch', json={'patients': PATIENTS[:2]})
+    assert resp.status_code == 200
+    assert [r['prediction'] in ('Heart Attack Risk', 'Normal') for r in resp.json()['results']] == [True, True]
+
+
+def test_repeat_patient_is_served_from_cache_without_the_forest(monkeypatch):
+    monkeypatch.setattr(heart, "_PREDICTION_CACHE", ResultCache(max_size=8, ttl=60, sizeof=approx_sizeof))
+    first = predict_heart_attack(PATIENTS[0])
+    # Same patient with floats for the integer columns: one canonical key
+    same = {k: float(v) for k, v in PATIENTS[0].items()}
+    monkeypatch.setattr(heart, "_predict_rows", Mock(side_effect=AssertionError("model called")))
+    monkeypatch.setattr(heart._current(), "fast", None)
+    second = predict_heart_attack(same)
+    assert second == first
+    second['details']['top_features'].append('mutated')
+    assert predict_heart_attack(PATIENTS[0]) == first
+    stats = heart.cache_stats()
+    assert stats['hits'] == 2 and stats['misses'] == 1 and stats['size'] == 1
+    assert stats['bytes'] > 0
+
+
+def test_cache_is_tied_to_the_loaded_model(monkeypatch):
+    monkeypatch.setattr(heart, "_PREDICTION_CACHE", ResultCache(max_size=8, ttl=60, sizeof=approx_sizeof))
+    predict_heart_attack(PATIENTS[0])
+    reloaded = heart.HeartModel(_load_model(), _load_calibrator(), version=heart.model_version())
+    monkeypatch.setattr(heart, "_active", reloaded)
+    predict_heart_attack(PATIENTS[0])
+    stats = heart.cache_stats()
+    assert stats['hits'] == 0 and stats['invalidations'] == 1
+    assert stats['version'] == reloaded.cache_version
+
+
+def test_batch_scores_each_uncached_patient_once(monkeypatch):
+    monkeypatch.setattr(heart, "_PREDICTION_CACHE", ResultCache(max_size=8, ttl=60, sizeof=approx_sizeof))
+    expected = predict_heart_attack_batch(PATIENTS)
+    scored = []
+    predict_rows = heart._predict_rows
+    monkeypatch.setattr(heart, "_predict_rows", lambda loaded, rows: scored.append(len(rows)) or predict_rows(loaded, rows))
+    new = dict(PATIENTS[0], age=64)
+    out = predict_heart_attack_batch([PATIENTS[1], new, PATIENTS[3], new])
+    assert scored == [1]
+    assert out[0] == expected[1] and out[2] == expected[3] and out[1] == out[3]
+    assert out[1] is not out[3]
@@ -0,0 +1,135 @@
+import math
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+import ml.heart_attack as heart
+from ml.heart_attack import REQUIRED_FEATURES
+from ml.heart_fast import FastHeartModel
+from result_cache import ResultCache
+
+DATA = heart.ROOT / "scripts" / "data" / "heart.csv"
+NUMERIC = ['age', 'trestbps', 'chol', 'thalach', 'oldpeak']
+CATEGORICAL = ['sex', 'cp', 'fbs', 'exang']
+
+
+def dataset():
+    df = pd.read_csv(DATA)
+    return df[REQUIRED_FEATURES], df['target']
+
+
+def pipeline():
+    preproc = ColumnTransformer([
+        ('num', Pipeline([('impute', SimpleImputer(strategy='median')), ('scale', StandardScaler())]), NUMERIC),
+        ('cat', Pipeline([('impute', SimpleImputer(strategy='most_frequent')), ('ohe', OneHotEncoder(handle_unknown='ignore'))]), CATEGORICAL),
+    ])
+    return Pipeline([('preproc', preproc), ('clf', RandomForestClassifier(n_estimators=25, random_state=0))])
+
+
+def rows(X):
+    out = X.to_dict("records")
+    # Unknown category, missing numeric and missing categorical values
+    out.append(dict(out[0], cp=7))
+    out.append(dict(out[1], chol=None))
+    out.append(dict(out[2], sex=None))
+    return out
+
+
+def assert_parity(model, X):
+    # Flat forest, sklearn's forest, and flat forest with batches above its row limit
+    for options in ({}, {"flat_forest": False}, {"flat_max_rows": 5}):
+        fast = FastHeartModel.compile(model, **options)
+        assert fast is not None
+        batch = rows(X)
+        df = pd.DataFrame([{k: (np.nan if row[k] is None else row[k]) for k in REQUIRED_FEATURES} for row in batch])
+        expected = model.predict_proba(df)
+        for row, want in zip(batch, expected):
+            np.testing.assert_allclose(fast.predict_proba_row(row), want, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(fast.predict_proba(batch), expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("calibrated", [False, True])
+def test_fast_path_matches_sklearn_on_bundled_dataset(calibrated):
+    X, y = dataset()
+    model = CalibratedClassifierCV(pipeline(), cv=3) if calibrated else pipeline()
+    model.fit(X, y)
+    assert_parity(model, X)
+
+
+def test_fast_path_matches_shipped_model():
+    X, _ = dataset()
+    assert_parity(joblib.load(heart.MODEL_PATH), X)
+
+
+def test_unsupported_shapes_fall_back_to_sklearn():
+    X, y = dataset()
+    model = pipeline()
+    model.steps[0][1].transformers[1][1].steps[1] = ('ohe', OneHotEncoder(handle_unknown='error'))
+    model.fit(X, y)
+    assert FastHeartModel.compile(model) is None
+
+    fast = FastHeartModel.compile(pipeline().fit(X, y))
+    assert fast.predict_proba_row(dict(rows(X)[0], age="63")) is None
+
+
+def test_predict_uses_fast_path_with_identical_output(monkeypatch):
+    X, y = dataset()
+    model = CalibratedClassifierCV(pipeline(), cv=3).fit(X, y)
+    # Restored afterwards so later tests see the shipped model again
+    monkeypatch.setattr(heart, "_active", None)
+    monkeypatch.setattr(heart, "MMAP", False)
+    monkeypatch.setattr(heart, "_PREDICTION_CACHE", ResultCache(max_size=0))
+    monkeypatch.setattr(joblib, "load", lambda path: model)
+    heart._load_model()
+    assert heart._active.fast is not None
+
+    row = rows(X)[3]
+    fast_out = heart._predict_local(row)
+    assert fast_out == heart._predict_local_batch([row])[0]
+    assert not math.isnan(fast_out["confidence"])
+
+
+@pytest.mark.parametrize("method", ["sigmoid", "isotonic"])
+def test_saved_model_is_memory_mapped_and_matches(tmp_path, method):
+    X, y = dataset()
+    model = CalibratedClassifierCV(pipeline(), cv=3, method=method).fit(X, y)
+    path = tmp_path / "model.flat"
+    FastHeartModel.compile(model).save(path, {"note": "x"})
+
+    loaded = FastHeartModel.load(path)
+    assert loaded.info == {"note": "x"}
+    forest = loaded.members[0][2]
+    assert not forest.value.flags.writeable and isinstance(forest.value.base, np.memmap)
+    batch = rows(X)
+    df = pd.DataFrame([{k: (np.nan if row[k] is None else row[k]) for k in REQUIRED_FEATURES} for row in batch])
+    np.testing.assert_allclose(loaded.predict_proba(batch), model.predict_proba(df), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(loaded.predict_proba_row(batch[0]), model.predict_proba(df.iloc[:1])[0], rtol=0, atol=1e-12)
+
+
+def test_heart_loads_a_matching_flat_export_without_unpickling(monkeypatch, tmp_path):
+    X, y = dataset()
+    model_path, flat_path = tmp_path / "model.pkl", tmp_path / "model.flat"
+    model = CalibratedClassifierCV(pipeline(), cv=3).fit(X, y)
+    joblib.dump(model, model_path)
+    heart.export_flat(model, model_path, flat_path)
+    row = rows(X)[0]
+
+    mapped = heart._read_model(model_path, flat_path, None)
+    assert mapped._model is None and mapped.fast.members[0][1] is None
+    pickled = heart._read_model(model_path, tmp_path / "missing.flat", None)
+    got, want = heart._predict_rows(mapped, [row])[0], heart._predict_rows(pickled, [row])[0]
+    assert got["prediction"] == want["prediction"] and got["confidence"] == pytest.approx(want["confidence"], abs=1e-12)
+    # The sklearn path still works, loading the pickle on demand
+    assert list(mapped.model.classes_) == [0, 1]
+
+    # An export of another pickle is ignored
+    joblib.dump(pipeline().fit(X, y), model_path)
+    assert heart._read_model(model_path, flat_path, None)._model is not None
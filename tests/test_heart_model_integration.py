@@ -11,10 +11,10 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 
-from ml.heart_attack import predict_heart_attack, MODEL_PATH, REQUIRED_FEATURES
+from ml.heart_attack import predict_heart_attack, REQUIRED_FEATURES
 
 
-def train_dummy_model():
+def train_dummy_model(path):
     # Create a tiny dataset
     df = pd.DataFrame([
         {'age':60,'sex':1,'cp':3,'trestbps':140,'chol':240,'fbs':0,'thalach':150,'exang':0,'oldpeak':1.0,'target':1},
@@ -37,14 +37,12 @@ def train_dummy_model():
     pipe = Pipeline([('preproc', preproc), ('clf', RandomForestClassifier(n_estimators=10, random_state=42))])
     pipe.fit(X, y)
 
-    # Ensure models directory exists
-    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
-    joblib.dump(pipe, MODEL_PATH)
+    joblib.dump(pipe, path)
 
 
-def test_predict_heart_attack_with_dummy_model(tmp_path):
-    # Train and save dummy model
-    train_dummy_model()
+def test_predict_heart_attack_with_dummy_model(missing_heart_model):
+    # Train and save dummy model; the shipped model and registry stay untouched
+    train_dummy_model(missing_heart_model)
 
     sample = {'age':63,'sex':1,'cp':3,'trestbps':145,'chol':233,'fbs':1,'thalach':150,'exang':0,'oldpeak':2.3}
     out = predict_heart_attack(sample)
@@ -53,7 +51,7 @@ def test_predict_heart_attack_with_dummy_model(tmp_path):
     assert out['prediction'] in ('Heart Attack Risk', 'Normal')
 
 
-def test_db_audit_called_on_fallback(monkeypatch):
+def test_db_audit_called_on_fallback(monkeypatch, missing_heart_model):
     # Mock crud.create_session_with_audit to capture calls
     called = {}
 
@@ -64,13 +62,7 @@ def test_db_audit_called_on_fallback(monkeypatch):
 
     monkeypatch.setattr('crud.create_session_with_audit', fake_create_session_with_audit, raising=False)
 
-    # Remove model if exists to force fallback
-    try:
-        if MODEL_PATH.exists():
-            MODEL_PATH.unlink()
-    except Exception:
-        pass
-
+    # The missing_heart_model fixture forces the fallback
     # Import app and call endpoint via TestClient
     from fastapi.testclient import TestClient
     from main import app
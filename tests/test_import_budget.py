@@ -0,0 +1,15 @@
+import sys
+import pathlib
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+import check_import_time
+
+
+@pytest.mark.parametrize("module", ["main", "ml_triage", "ml.heart_attack"])
+def test_heavy_ml_dependencies_are_imported_lazily(module):
+    _, modules = check_import_time.measure(module)
+    assert check_import_time.heavy_loaded(modules) == []
@@ -6,17 +6,9 @@ import main
 client = TestClient(main.app)
 
 
-def test_audit_called_with_fallback_when_model_missing():
+def test_audit_called_with_fallback_when_model_missing(missing_heart_model):
     sample = {'age':63,'sex':1,'cp':3,'trestbps':145,'chol':233,'fbs':1,'thalach':150,'exang':0,'oldpeak':2.3}
-
-    # Ensure model file is removed to force fallback
-    from pathlib import Path
-    from ml.heart_attack import MODEL_PATH
-    try:
-        if MODEL_PATH.exists():
-            MODEL_PATH.unlink()
-    except Exception:
-        pass
+    # missing_heart_model points the loader at a missing model to force fallback
 
     # Inject a dummy crud object if main.crud is None so we can assert it was called
     dummy = Mock()
@@ -37,4 +29,4 @@ def test_audit_called_with_fallback_when_model_missing():
         assert dummy.create_session_with_audit.called
         # Verify fallback_to_rule kwarg exists in the call
         call_kwargs = dummy.create_session_with_audit.call_args[1]
-        assert 'fallback_to_rule' in call_kwargs
+        assert call_kwargs['fallback_to_rule'] is True
@@ -0,0 +1,75 @@
+import io
+import json
+import sys
+import pathlib
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "scripts"))
+
+import medtriage_score
+import ml_triage
+from triage import classify_symptom
+
+
+def test_read_rows_jsonl_and_csv():
+    jsonl = io.StringIO('{"id": 1, "symptom": "fever"}\n\nnot json\n{"id": 3, "symptom": 5}\n')
+    assert list(medtriage_score.read_rows(jsonl, "jsonl", "symptom", "id")) == [(1, "fever"), (None, None), (3, None)]
+    rows = io.StringIO("id,input_text\n7,\"cough, mild\"\n")
+    assert list(medtriage_score.read_rows(rows, "csv", "input_text", "id")) == [("7", "cough, mild")]
+
+
+def test_run_keeps_input_order_across_workers():
+    texts = ["Severe chest pain", "", "runny nose", None, "mild headache"] * 5
+    out = io.StringIO()
+    count, totals = medtriage_score.run(
+        ((i, t) for i, t in enumerate(texts)), out, ("rules",), workers=2, chunk_size=3, id_field="id", max_inflight=2
+    )
+    assert count == len(texts)
+    assert set(totals) == {"rules"}
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["index"] for r in records] == list(range(len(texts)))
+    assert [r["id"] for r in records] == list(range(len(texts)))
+    assert records[0]["rules"]["risk"] == classify_symptom("Severe chest pain")[0]
+    assert "error" in records[1]["rules"] and "error" in records[3]["rules"]
+
+
+def test_main_inline_writes_output_file(tmp_path, capsys):
+    src = tmp_path / "in.jsonl"
+    src.write_text("\n".join(json.dumps({"symptom": s}) for s in ["fever and cough", "chest pain"]))
+    dst = tmp_path / "out.jsonl"
+    assert medtriage_score.main([str(src), "-o", str(dst), "--workers", "0"]) == 0
+    records = [json.loads(line) for line in dst.read_text().splitlines()]
+    assert [r["rules"]["risk"] for r in records] == ["Medium", "High"]
+    assert "rows/sec" in capsys.readouterr().err
+
+
+class _StubClassifier(ml_triage.MLClassifier):
+    def _init(self):
+        self._classifier = lambda text, labels: {"labels": list(labels), "scores": [0.8, 0.15, 0.05]}
+        self._initialized = True
+
+
+def test_ml_engine_is_initialized_before_scoring(monkeypatch):
+    monkeypatch.setattr(ml_triage, "_ml", _StubClassifier("stub-score-model"))
+    out = io.StringIO()
+    count, _ = medtriage_score.run(iter([(0, "crushing chest pain"), (1, "")]), out, ("ml",), workers=0, chunk_size=10)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert count == 2
+    assert records[0]["ml"]["risk"] == "High"
+    assert "error" in records[1]["ml"]
+
+
+class _MissingClassifier(ml_triage.MLClassifier):
+    def _init(self):
+        raise RuntimeError("model weights not found")
+
+
+def test_ml_engine_init_failure_exits_with_an_error(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(ml_triage, "_ml", _MissingClassifier("missing-score-model"))
+    src = tmp_path / "in.jsonl"
+    src.write_text(json.dumps({"symptom": "fever"}))
+    dst = tmp_path / "out.jsonl"
+    assert medtriage_score.main([str(src), "-o", str(dst), "--engine", "ml", "--workers", "0"]) == 1
+    assert "ML engine failed to initialize" in capsys.readouterr().err
+    assert dst.read_text() == ""
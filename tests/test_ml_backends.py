@@ -0,0 +1,80 @@
+import sys
+import pathlib
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.zero_shot import PairEncoder, zero_shot_output
+from ml_triage import MLClassifier
+
+
+def test_zero_shot_output_matches_pipeline_semantics():
+    labels = ["high risk", "medium risk", "low risk"]
+    # (contradiction, neutral, entailment) logits per (text, label) pair
+    logits = np.array([
+        [0.0, 0.0, 2.0], [0.0, 0.0, 1.0], [0.0, 0.0, 0.0],
+        [5.0, 0.0, -1.0], [0.0, 0.0, -1.0], [0.0, 0.0, 3.0],
+    ])
+    out = zero_shot_output(["a", "b"], labels, logits, 2)
+    assert out[0]["labels"] == labels
+    expected = np.exp([2.0, 1.0, 0.0]) / np.exp([2.0, 1.0, 0.0]).sum()
+    assert np.allclose(out[0]["scores"], expected)
+    assert out[1]["labels"][0] == "low risk"
+    assert abs(sum(out[1]["scores"]) - 1.0) < 1e-9
+
+
+def test_backend_selection_and_version():
+    assert MLClassifier("m", backend="torch").model_version == "m"
+    assert MLClassifier("m", backend="onnx").model_version == "m+onnx-int8"
+    with pytest.raises(ValueError):
+        MLClassifier("m", backend="tensorrt")
+
+
+class _WordTokenizer:
+    """BERT-shaped stand-in: [CLS]=1, [SEP]=2, pad=0, words get ids from 10."""
+
+    model_max_length = 12
+    pad_token_id = 0
+    model_input_names = ["input_ids", "token_type_ids", "attention_mask"]
+
+    def __init__(self):
+        self.vocab = {}
+        self.calls = []
+
+    def _ids(self, text):
+        return [self.vocab.setdefault(w, 10 + len(self.vocab)) for w in text.lower().split()]
+
+    def encode(self, text, add_special_tokens=True):
+        self.calls.append(text)
+        return self._ids(text)
+
+    def __call__(self, texts, add_special_tokens=True):
+        self.calls.extend(texts)
+        return {"input_ids": [self._ids(t) for t in texts]}
+
+    def build_inputs_with_special_tokens(self, a, b):
+        return [1] + a + [2] + b + [2]
+
+    def create_token_type_ids_from_sequences(self, a, b):
+        return [0] * (len(a) + 2) + [1] * (len(b) + 1)
+
+
+def test_pair_encoder_reuses_hypothesis_ids():
+    tok = _WordTokenizer()
+    enc = PairEncoder(tok, ["high risk", "low risk"])
+    assert len(tok.calls) == 2
+    tok.calls.clear()
+
+    arrays = enc.encode(["chest pain", "a b c d e f g h"])
+    assert tok.calls == ["chest pain", "a b c d e f g h"]  # premises only
+    hyp_high = tok._ids("This example is high risk.")
+    first = [1] + tok._ids("chest pain") + [2] + hyp_high + [2]
+    assert arrays["input_ids"][0, :len(first)].tolist() == first
+    assert arrays["token_type_ids"][0, :len(first)].tolist() == [0] * 4 + [1] * (len(hyp_high) + 1)
+    assert arrays["attention_mask"][0].sum() == len(first)
+    # Long premises are truncated to fit model_max_length, hypotheses never are
+    assert arrays["input_ids"].shape == (4, 12)
+    assert arrays["input_ids"][2, -len(hyp_high) - 1:].tolist() == hyp_high + [2]
@@ -0,0 +1,106 @@
+import sys
+import pathlib
+import threading
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import ml_triage
+from ml_triage import MicroBatcher
+from result_cache import ResultCache
+
+
+def _submit_concurrently(batcher, texts):
+    futures = [None] * len(texts)
+    start = threading.Barrier(len(texts))
+
+    def go(i):
+        start.wait()
+        futures[i] = batcher.submit(texts[i])
+
+    threads = [threading.Thread(target=go, args=(i,)) for i in range(len(texts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [f.result(timeout=5) for f in futures]
+
+
+def test_concurrent_texts_share_batches_by_length_bucket():
+    calls = []
+
+    def fn(texts):
+        calls.append(list(texts))
+        return [t.upper() for t in texts]
+
+    batcher = MicroBatcher(fn, max_batch=8, window=0.2, bucket_edges=(3,))
+    texts = ["cough", "fever", "mild headache", "a b c d e f", "g h i j k", "cough"]
+    assert _submit_concurrently(batcher, texts) == [t.upper() for t in texts]
+
+    # Two buckets, duplicates coalesced: short texts in one call, long in another
+    assert sorted(len(c) for c in calls) == [2, 3]
+    assert all(len({t.count(" ") > 2 for t in c}) == 1 for c in calls)
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == 2 and stats["queued"] == 0
+
+
+def test_batch_errors_reach_every_caller():
+    def fn(texts):
+        raise ValueError("model exploded")
+
+    batcher = MicroBatcher(fn, max_batch=4, window=0.0)
+    with pytest.raises(ValueError, match="exploded"):
+        batcher.submit("cough").result(timeout=5)
+
+
+def test_try_ml_triage_goes_through_batcher(monkeypatch):
+    class FakeClassifier:
+        model_version = "fake-1"
+        _initialized = True
+        batches = []
+
+        def classify_batch(self, texts):
+            self.batches.append(list(texts))
+            return [[("high risk", 0.9), ("low risk", 0.1)] for _ in texts]
+
+    fake = FakeClassifier()
+    monkeypatch.setattr(ml_triage, "_ml", fake)
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    monkeypatch.setattr(ml_triage, "_BATCHER", MicroBatcher(ml_triage._ml_triage_batch, max_batch=4, window=0.001))
+
+    assert ml_triage.try_ml_triage("Chest pain")[0] == "High"
+    assert fake.batches == [["chest pain"]]
+    # Served from the cache the batcher filled
+    assert ml_triage.try_ml_triage("chest  pain")[0] == "High"
+    assert len(fake.batches) == 1
+
+
+def test_full_queue_rejects_and_expired_work_is_cancelled():
+    release = threading.Event()
+    seen = []
+
+    def fn(texts):
+        seen.extend(texts)
+        release.wait(5)
+        return list(texts)
+
+    batcher = MicroBatcher(fn, max_batch=1, window=0.0, max_queue=2)
+    running = batcher.submit("first")
+    while not running.running():
+        pass
+    # Worker is busy: these two fill the admission queue
+    expired = batcher.submit("stale", deadline=0.0)
+    kept = batcher.submit("fresh")
+    with pytest.raises(ml_triage.QueueFull):
+        batcher.submit("one too many")
+    batcher.abandon(running)
+    release.set()
+
+    assert kept.result(timeout=5) == "fresh"
+    assert expired.cancelled()
+    assert seen == ["first", "fresh"]
+    stats = batcher.stats()
+    assert (stats["rejected"], stats["expired"], stats["abandoned"]) == (1, 1, 1)
+    assert stats["queued"] == 0
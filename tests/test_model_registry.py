@@ -0,0 +1,157 @@
+import threading
+from unittest.mock import Mock
+
+import joblib
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestClassifier
+
+import main
+import ml.heart_attack as heart
+import ml_triage
+from model_registry import ModelRegistry, RegistryWatcher
+
+SAMPLE = {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'thalach': 150, 'exang': 0, 'oldpeak': 2.3}
+
+
+def tiny_model(tmp_path, seed):
+    X = pd.DataFrame([dict(SAMPLE, age=40 + i, oldpeak=i / 10) for i in range(20)])[heart.REQUIRED_FEATURES]
+    y = [i % 2 for i in range(20)]
+    path = tmp_path / f"model-{seed}.pkl"
+    joblib.dump(RandomForestClassifier(n_estimators=5, random_state=seed).fit(X, y), path)
+    return path
+
+
+def test_publish_activate_and_verify(tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    src = tmp_path / "report.json"
+    src.write_text("{}")
+    assert registry.current(heart.REGISTRY_NAME) is None
+
+    v1 = registry.publish("heart", {"report.json": src})
+    v2 = registry.publish("heart", {"report.json": src}, activate=False)
+    assert (v1.version, v2.version) == ("v1", "v2")
+    assert registry.versions("heart") == ["v1", "v2"]
+    assert registry.current("heart").version == "v1"
+    assert "report.json" in v1.manifest["files"]
+
+    registry.activate("heart", "v2")
+    assert registry.current_version("heart") == "v2"
+    with pytest.raises(ValueError):
+        registry.publish("heart", {"report.json": src}, version="v2")
+    with pytest.raises(KeyError):
+        registry.activate("heart", "v9")
+
+    (v1.path / "report.json").write_text('{"tampered": true}')
+    with pytest.raises(ValueError, match="checksum"):
+        registry.activate("heart", "v1")
+    assert registry.current_version("heart") == "v2"
+    assert not any(p.name.endswith(".tmp") for p in (tmp_path / "registry" / "heart").iterdir())
+
+
+def test_watcher_swaps_in_the_background_and_skips_broken_versions(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    src = tmp_path / "weights.bin"
+    src.write_bytes(b"1")
+    registry.publish("m", {"weights.bin": src})
+
+    installed = []
+    done = threading.Event()
+
+    def load(entry):
+        if entry.version == "v3":
+            raise RuntimeError("bad weights")
+        return entry.file("weights.bin").read_bytes()
+
+    def install(value, entry):
+        installed.append((value, entry.version))
+        done.set()
+
+    watcher = RegistryWatcher("m", load, install, registry=registry, check_interval=60)
+    watcher.poll("v1")
+    assert installed == []  # pointer unchanged
+
+    src.write_bytes(b"2")
+    registry.publish("m", {"weights.bin": src})
+    watcher.poll("v1", force=True)
+    assert done.wait(5)
+    assert installed == [(b"2", "v2")]
+
+    watcher.poll("v2")  # within check_interval: not even read
+    registry.publish("m", {"weights.bin": src})
+    watcher.poll("v2", force=True, wait=True)
+    watcher.poll("v2", force=True, wait=True)
+    assert installed == [(b"2", "v2")]
+    assert watcher.stats()["swaps"] == 1 and watcher.stats()["swap_failures"] == 1
+
+
+def test_heart_model_hot_swaps_between_registry_versions(monkeypatch, tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    registry.publish("heart", {heart.MODEL_FILE: tiny_model(tmp_path, 1)})
+    monkeypatch.setattr(heart._WATCHER, "registry", registry)
+    monkeypatch.setattr(heart, "_active", None)
+
+    first = heart.predict_heart_attack(SAMPLE)
+    assert first["details"]["model_version"] == "v1"
+    old = heart._active
+
+    registry.publish("heart", {heart.MODEL_FILE: tiny_model(tmp_path, 2)})
+    assert heart._active is old  # still serving v1 until the watcher swaps
+    heart._WATCHER.poll(heart.model_version(), force=True, wait=True)
+    assert heart.model_version() == "v2" and heart._active is not old
+    assert heart.predict_heart_attack(SAMPLE)["details"]["model_version"] == "v2"
+    assert heart.loader_stats()["registry"]["swaps"] >= 1
+
+
+def test_heart_cold_start_falls_back_to_legacy_when_current_version_is_broken(monkeypatch, tmp_path):
+    registry = ModelRegistry(tmp_path / "registry")
+    entry = registry.publish("heart", {heart.MODEL_FILE: tiny_model(tmp_path, 1)})
+    entry.file(heart.MODEL_FILE).write_bytes(b"corrupt")
+    monkeypatch.setattr(heart, "_WATCHER", RegistryWatcher("heart", heart._read_version, heart._install, registry))
+    monkeypatch.setattr(heart, "_active", None)
+
+    out = heart.predict_heart_attack(SAMPLE)
+    assert out["details"]["model_version"] is None  # models/heart_attack_model.pkl
+    stats = heart.loader_stats()["registry"]
+    assert stats["swap_failures"] == 1 and "checksum mismatch" in stats["last_error"]
+    # The broken version is not retried on later polls
+    heart._WATCHER.poll(heart.model_version(), force=True, wait=True)
+    assert heart.model_version() is None and heart.loader_stats()["registry"]["swap_failures"] == 1
+
+
+def recording_crud(monkeypatch):
+    dummy = Mock()
+    dummy.create_session_with_audit = Mock(return_value=(type('S', (), {'session_id': 7})(), None))
+
+    def fake_get_db():
+        yield object()
+
+    monkeypatch.setattr(main, "crud", dummy)
+    monkeypatch.setattr(main, "get_db", fake_get_db)
+    monkeypatch.setattr(main, "DB_ENABLED", True)
+    return dummy
+
+
+def test_heart_audit_records_the_answering_version(monkeypatch):
+    dummy = recording_crud(monkeypatch)
+    monkeypatch.setattr(main, "try_heart_attack_triage", lambda data: ('Heart Attack Risk', 0.9, ['cp'], False, 'v7'))
+    assert TestClient(main.app).post('/triage_heart', json=SAMPLE).status_code == 200
+    assert dummy.create_session_with_audit.call_args[1]["model_version"] == "v7"
+
+    monkeypatch.setattr(main, "try_heart_attack_triage", lambda data: (None, 0.0, [], True, None))
+    TestClient(main.app).post('/triage_heart', json=SAMPLE)
+    assert dummy.create_session_with_audit.call_args[1]["model_version"] is None
+
+
+def test_ml_audit_records_the_text_model_version(monkeypatch):
+    class Classifier:
+        model_version = "triage_nli-v3"
+        _initialized = True
+
+    dummy = recording_crud(monkeypatch)
+    monkeypatch.setattr(ml_triage, "_ml", Classifier())
+    monkeypatch.setattr(main, "cascade_enabled", lambda: False)
+    monkeypatch.setattr(main, "try_ml_triage", lambda text, timeout: ("High", "Visit ER immediately", [], 0.9, []))
+    assert TestClient(main.app).post("/triage_ml", json={"symptom": "chest pain"}).status_code == 200
+    assert dummy.create_session_with_audit.call_args[1]["model_version"] == "triage_nli-v3"
@@ -0,0 +1,146 @@
+import os
+import pathlib
+import stat
+import sys
+import tempfile
+import threading
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import ml_triage
+import model_server
+from ml.heart_attack import REQUIRED_FEATURES, predict_heart_attack
+from model_server import ModelServer, ModelServerClient, ModelServerError, ModelServerUnavailable
+from result_cache import ResultCache
+
+SAMPLE = {'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1, 'thalach': 150, 'exang': 0, 'oldpeak': 2.3}
+
+
+@pytest.fixture
+def server():
+    batches = []
+
+    def classify_batch(texts):
+        batches.append(list(texts))
+        return [[("high risk", 0.75), ("low risk", 0.25)] if "chest" in t else [("low risk", 0.5)] for t in texts], srv.version
+
+    def predict_heart(data):
+        if data["age"] < 0:
+            raise ValueError("bad age")
+        return {"prediction": "Normal", "confidence": 0.1, "details": {"echo": data}}
+
+    # Short path: Unix socket paths are limited to ~100 bytes
+    path = tempfile.mktemp(prefix="mt-", suffix=".sock", dir="/tmp")
+    srv = ModelServer(path, classify_batch, predict_heart, window=0.005, predict_heart_batch=lambda rows: [predict_heart(r) for r in rows])
+    srv.version = "v1"
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    srv.batches = batches
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    pathlib.Path(path).unlink(missing_ok=True)
+
+
+def test_protocol_round_trip(server):
+    client = ModelServerClient(server.server_address, pool_size=2, timeout=5)
+    assert client.ping()
+    preds = client.classify_batch(["chest pain", "a cough"])
+    assert preds[0][0][0] == "high risk" and preds[0][0][1] == pytest.approx(0.75)
+    assert preds[1] == [("low risk", 0.5)]
+    assert client.classify_batch_with_versions(["a cough"]) == ([[("low risk", 0.5)]], ["v1"])
+
+    out = client.predict_heart([SAMPLE[c] for c in REQUIRED_FEATURES])
+    assert out["details"]["echo"] == SAMPLE
+    assert isinstance(out["details"]["echo"]["age"], int)
+    with pytest.raises(ModelServerError, match="bad age"):
+        client.predict_heart([-1] + [0] * (len(REQUIRED_FEATURES) - 1))
+    rows = [[SAMPLE[c] for c in REQUIRED_FEATURES], [SAMPLE[c] + 1 for c in REQUIRED_FEATURES]]
+    batch = client.predict_heart_batch(rows)
+    assert [r["details"]["echo"]["age"] for r in batch] == [63, 64]
+    # Connections are reused, errors don't poison the pool
+    stats = client.stats()
+    assert stats["calls"] == 6 and stats["errors"] == 1 and stats["idle_connections"] == 1
+
+
+def test_socket_is_created_owner_only(server):
+    assert stat.S_IMODE(os.stat(server.server_address).st_mode) == 0o600
+    # Bound in a private directory that is gone afterwards
+    assert not [p for p in os.listdir(os.path.dirname(server.server_address)) if p.startswith(".medtriage-sock-")]
+
+
+def test_requests_from_several_workers_share_a_batch(server):
+    clients = [ModelServerClient(server.server_address, timeout=5) for _ in range(4)]
+    barrier = threading.Barrier(len(clients))
+    results = [None] * len(clients)
+
+    def go(i):
+        barrier.wait()
+        results[i] = clients[i].classify_batch([f"chest pain {i}"])
+
+    server.batcher.window = 0.2
+    threads = [threading.Thread(target=go, args=(i,)) for i in range(len(clients))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(r[0][0][0] == "high risk" for r in results)
+    assert len(server.batches) < len(clients)
+
+
+def test_unreachable_server_falls_back_in_process(monkeypatch, tmp_path):
+    monkeypatch.setenv("MEDTRIAGE_MODEL_SERVER_SOCKET", str(tmp_path / "missing.sock"))
+    monkeypatch.setattr(model_server, "_client", None)
+    client = model_server.get_client()
+    assert not client.ping()
+    assert not client.available()  # marked down: later calls fail fast
+    with pytest.raises(ModelServerUnavailable, match="marked down"):
+        client.call(model_server.OP_PING)
+
+    class LocalClassifier:
+        model_version = "local"
+        _initialized = True
+
+        def classify_batch(self, texts):
+            return [[("medium risk", 0.8)] for _ in texts]
+
+    monkeypatch.setattr(ml_triage, "_ml", LocalClassifier())
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    assert ml_triage._ml_triage_batch(["fever"])[0][0] == "Medium"
+
+    # Heart predictions fall back to the in-process model as well
+    assert predict_heart_attack(SAMPLE)["prediction"] in ("Heart Attack Risk", "Normal")
+
+
+def test_ml_triage_uses_server_without_local_model(server, monkeypatch):
+    monkeypatch.setenv("MEDTRIAGE_MODEL_SERVER_SOCKET", server.server_address)
+    monkeypatch.setattr(model_server, "_client", None)
+    monkeypatch.setattr(ml_triage, "_ml", ml_triage.MLClassifier("remote-only"))
+    monkeypatch.setattr(ml_triage, "_remote_version", None)
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    monkeypatch.setattr(ml_triage, "_BATCHER", ml_triage.MicroBatcher(ml_triage._ml_triage_batch, window=0.001))
+    assert ml_triage.try_ml_triage("Chest pain")[0] == "High"
+    assert server.batches == [["chest pain"]]
+
+
+def test_server_answers_are_cached_and_audited_under_the_server_version(server, monkeypatch):
+    monkeypatch.setenv("MEDTRIAGE_MODEL_SERVER_SOCKET", server.server_address)
+    monkeypatch.setattr(model_server, "_client", None)
+    monkeypatch.setattr(ml_triage, "_ml", ml_triage.MLClassifier("remote-only"))
+    monkeypatch.setattr(ml_triage, "_remote_version", None)
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    monkeypatch.setattr(ml_triage, "_BATCHER", ml_triage.MicroBatcher(ml_triage._ml_triage_batch, window=0.001))
+    ml_triage.try_ml_triage("Chest pain")
+    assert ml_triage.model_version() == "v1"
+    assert ml_triage.cache_stats()["version"] == "v1"
+
+    # The server hot-swaps; the next answer moves the worker to v2 and drops v1 results
+    server.version = "v2"
+    ml_triage.try_ml_triage("chest tightness")
+    assert ml_triage.model_version() == "v2"
+    ml_triage.try_ml_triage("Chest pain")
+    assert server.batches == [["chest pain"], ["chest tightness"], ["chest pain"]]
+    assert ml_triage.cache_stats()["invalidations"] == 1
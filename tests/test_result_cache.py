@@ -0,0 +1,107 @@
+import sys
+import pathlib
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import ml_triage
+import triage
+from result_cache import ResultCache, approx_sizeof, normalize_symptom_text, normalize_with_offsets
+
+
+def test_normalize_collapses_whitespace_and_punctuation():
+    assert normalize_symptom_text("  Fever   and\tCOUGH!! ") == "fever and cough"
+    assert normalize_symptom_text("Chest pain,  shortness of breath") == "chest pain . shortness of breath"
+    # punctuation stays a boundary so it can't glue two phrases into one trigger
+    assert normalize_symptom_text("severe. Chest") == "severe . chest"
+
+
+def test_normalize_with_offsets_maps_back_to_source():
+    text = "  I don't feel well...  Chest_pain!"
+    key, offsets = normalize_with_offsets(text)
+    assert key == normalize_symptom_text(text) == "i dont feel well . chest pain"
+    start = key.index("dont")
+    a, b = offsets.span(start, start + 4)
+    assert text[a:b] == "don't"
+    start = key.index("chest pain")
+    a, b = offsets.span(start, start + 10)
+    assert text[a:b] == "Chest_pain"
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a is now most recent
+    cache.put("c", 3)  # evicts b
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = ResultCache(max_size=4, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr("result_cache.time.monotonic", lambda: now[0])
+    cache.put("a", 1)
+    now[0] = 111.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_sizeof_tracks_bytes_held():
+    cache = ResultCache(max_size=2, ttl=60, sizeof=approx_sizeof)
+    assert "bytes" not in ResultCache().stats()
+    cache.put("a", {"x": [1.0, 2.0]})
+    one = cache.stats()["bytes"]
+    assert one == approx_sizeof("a") + approx_sizeof({"x": [1.0, 2.0]}) > 0
+    cache.put("a", {"x": [1.0, 2.0]})  # replacing doesn't double count
+    assert cache.stats()["bytes"] == one
+    cache.put("b", 1)
+    cache.put("c", 2)  # evicts a
+    assert cache.stats()["bytes"] == approx_sizeof("b") + approx_sizeof(1) + approx_sizeof("c") + approx_sizeof(2)
+    cache.get("c", version="v2")
+    assert cache.stats()["bytes"] == 0
+
+
+def test_version_change_invalidates():
+    cache = ResultCache(max_size=4, ttl=60)
+    cache.put("a", 1, version="v1")
+    assert cache.get("a", version="v1") == 1
+    assert cache.get("a", version="v2") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_classify_symptom_served_from_cache(monkeypatch):
+    monkeypatch.setattr(triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+    first = triage.classify_symptom("Fever and cough")
+    second = triage.classify_symptom("  fever AND cough ")
+    assert first == second
+    assert triage.cache_stats()["hits"] == 1
+    # Callers get their own lists
+    second[2].append("mutated")
+    assert triage.classify_symptom("fever and cough")[2] == first[2]
+
+
+def test_ml_triage_cache_keyed_on_model_version(monkeypatch):
+    calls = []
+
+    class FakeClassifier:
+        model_version = "fake-1"
+
+        def classify(self, text):
+            calls.append(text)
+            return [("high risk", 0.9)]
+
+    fake = FakeClassifier()
+    monkeypatch.setattr(ml_triage, "_ml", fake)
+    monkeypatch.setattr(ml_triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+
+    assert ml_triage.ml_triage("Chest pain")[0] == "High"
+    assert ml_triage.ml_triage("chest   pain")[0] == "High"
+    assert calls == ["chest pain"]
+
+    fake.model_version = "fake-2"
+    ml_triage.ml_triage("chest pain")
+    assert len(calls) == 2
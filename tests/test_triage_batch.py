@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+from unittest.mock import patch, Mock
+import main
+from triage import classify_symptom, classify_symptoms
+
+
+client = TestClient(main.app)
+
+
+def test_classify_symptoms_preserves_order_and_reports_errors():
+    texts = ["runny nose and cough", "", "Severe chest pain", "runny nose and cough"]
+    out = classify_symptoms(texts)
+    assert len(out) == 4
+    assert out[0] == classify_symptom(texts[0])
+    assert isinstance(out[1], ValueError)
+    assert out[2] == classify_symptom(texts[2])
+    assert out[3] == out[0]
+
+
+def test_triage_batch_endpoint_records_all_sessions_in_one_call():
+    dummy = Mock()
+    dummy.create_sessions_with_audit = Mock(side_effect=lambda db, items, **kw: [100 + i for i in range(len(items))])
+
+    def fake_get_db():
+        try:
+            yield object()
+        finally:
+            return
+
+    payload = {"symptoms": ["Mild headache", "x" * 2001, "  ", "Severe chest pain, shortness of breath"]}
+    with patch.object(main, 'crud', dummy), patch.object(main, 'get_db', fake_get_db), patch.object(main, 'DB_ENABLED', True):
+        resp = client.post('/triage/batch', json=payload)
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["result"]["risk"] == "Low"
+    assert results[0]["result"]["session_id"] == 100
+    assert results[1]["error"] == "symptom text too long"
+    assert results[2]["error"]
+    assert results[3]["result"]["risk"] == "High"
+    assert results[3]["result"]["session_id"] == 101
+    assert results[0]["result"]["rules_version"] == main.get_rule_engine().version
+    assert results[0]["result"]["spans"] == [{"start": 0, "end": 13, "trigger": "mild headache", "weight": 0.5}]
+
+    assert dummy.create_sessions_with_audit.call_count == 1
+    items = dummy.create_sessions_with_audit.call_args[0][1]
+    assert [i["input_text"] for i in items] == ["Mild headache", "Severe chest pain, shortness of breath"]
@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+import pathlib
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import triage
+from triage import classify_symptom, _Automaton, RuleEngine, load_rule_pack
+from result_cache import ResultCache
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Severe chest pain, shortness of breath",
+         ("High", "Visit ER immediately", ["shortness of breath", "severe chest", "chest pain"], 7.0, ["shortness of breath", "severe chest", "chest pain"])),
+        ("Mild headache for two days",
+         ("Low", "Self-care", ["mild headache"], 0.25, ["mild headache"])),
+        ("runny nose and cough",
+         ("Medium", "Telehealth", ["runny nose", "cough"], 1.0, ["runny nose", "cough"])),
+        ("persistent fever and a headache, mild headache too",
+         ("Medium", "Telehealth", ["persistent fever", "mild headache"], 1.25, ["persistent fever", "mild headache"])),
+        ("severe fever with vomiting",
+         ("High", "Visit ER immediately", ["severe fever", "vomiting"], 4.0, ["severe fever", "vomiting"])),
+        ("twitchy and itchy",
+         ("Low", "Self-care", ["itch"], 0.5, ["itch"])),
+        ("Feeling fine",
+         ("Low", "Self-care", ["Mild condition"], 0.0, [])),
+    ],
+)
+def test_classify_symptom_matches_legacy_output(text, expected):
+    assert classify_symptom(text) == expected
+
+
+def test_automaton_reports_overlapping_keywords():
+    ac = _Automaton(["he", "she", "his", "hers"])
+    hits = sorted((end, ac.keywords[idx]) for end, idx in ac.iter_matches("ushers"))
+    assert hits == [(3, "he"), (3, "she"), (5, "hers")]
+    assert ac.found("ushers") == frozenset({0, 1, 3})
+
+
+def test_shipped_rule_pack_matches_builtin_rules():
+    shipped = load_rule_pack(PROJECT_ROOT / "rules" / "triage_rules.json")
+    builtin = triage._build_default_engine()
+    assert shipped.triggers == builtin.triggers
+    assert shipped.weights == builtin.weights
+    assert shipped.levels == builtin.levels
+    for text in ["Severe chest pain", "mild cough", "fever and vomiting", "nothing much"]:
+        assert shipped.classify(text) == builtin.classify(text)
+
+
+def test_rule_pack_hot_reload(tmp_path, monkeypatch):
+    pack = json.loads((PROJECT_ROOT / "rules" / "triage_rules.json").read_text())
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(pack))
+    monkeypatch.setattr(triage, "RULES_PATH", path)
+    monkeypatch.setattr(triage, "_ENGINE", triage._ENGINE)
+    monkeypatch.setattr(triage, "_ENGINE_STAMP", None)
+
+    first = triage.reload_rules()
+    assert first.version == pack["version"]
+    # Unchanged file: no recompile
+    assert triage.reload_rules() is first
+
+    pack["version"] = "test-2"
+    pack["triggers"][2]["keywords"].append("hiccups")
+    path.write_text(json.dumps(pack))
+    os.utime(path, ns=(1, 1))
+    second = triage.reload_rules()
+    assert second is not first and second.version == "test-2"
+    assert classify_symptom("hiccups", engine=second)[4] == ["hiccups"]
+
+    # A broken pack is ignored and the last good engine stays active
+    path.write_text("{not json")
+    assert triage.reload_rules() is second
+
+
+def test_pack_edit_without_version_bump_invalidates_cached_results(tmp_path, monkeypatch):
+    pack = json.loads((PROJECT_ROOT / "rules" / "triage_rules.json").read_text())
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(pack))
+    monkeypatch.setattr(triage, "RULES_PATH", path)
+    monkeypatch.setattr(triage, "_ENGINE", triage._ENGINE)
+    monkeypatch.setattr(triage, "_ENGINE_STAMP", None)
+    monkeypatch.setattr(triage, "_RESULT_CACHE", ResultCache(max_size=8, ttl=60))
+
+    first = triage.reload_rules()
+    assert classify_symptom("fever", engine=first)[0] == "Medium"
+    for trigger in pack["triggers"]:
+        trigger["keywords"] = [k for k in trigger["keywords"] if k != "fever"]
+    path.write_text(json.dumps(pack))  # same "version" string
+    os.utime(path, ns=(1, 1))
+    second = triage.reload_rules()
+    assert second.version == first.version and second.cache_version != first.cache_version
+    assert classify_symptom("fever")[0] == second.classify("fever")[0] == "Low"
+
+
+def test_rule_pack_requires_catch_all_level():
+    with pytest.raises(ValueError):
+        RuleEngine({"cough": 0.5}, [], [("High", 2.0, "ER", "Severe")])
+
+
+@pytest.mark.parametrize(
+    "text,risk,matches",
+    [
+        ("No chest pain, just a mild cough", "Low", ["mild cough", "negated:chest pain"]),
+        ("I don't have chest pain but my runny nose is bad", "Low", ["runny nose", "negated:chest pain"]),
+        ("denies fever, vomiting", "Medium", ["vomiting", "negated:fever"]),
+        ("no severe chest pain", "Low", ["negated:severe chest", "negated:chest pain"]),
+        ("not sure if it is chest pain", "High", ["hedged:chest pain"]),
+        ("no fever yesterday but fever today", "Medium", ["fever"]),
+        # "no" inside a word is not a cue
+        ("runny nose and chest pain", "High", ["chest pain", "runny nose"]),
+    ],
+)
+def test_negation_and_hedge_scopes(text, risk, matches):
+    out = classify_symptom(text, engine=triage._build_default_engine())
+    assert out[0] == risk
+    assert out[4] == matches
+    assert not any(c.startswith(triage.NEGATED_PREFIX) for c in out[2])
+
+
+@pytest.mark.parametrize(
+    "text,matches",
+    [
+        # pseudo-negations contain a cue but deny nothing
+        ("no relief from chest pain", ["chest pain"]),
+        ("without warning I had chest pain", ["chest pain"]),
+        ("I have no idea why I have chest pain", ["chest pain"]),
+        ("Not only chest pain but also fever", ["chest pain", "fever"]),
+        # a comparison, not a denial
+        ("never had chest pain this bad before", ["chest pain"]),
+    ],
+)
+@pytest.mark.parametrize("engine", [triage._build_default_engine(), triage.load_rule_pack(triage.RULES_PATH)], ids=["builtin", "pack"])
+def test_pseudo_negations_keep_high_triggers(engine, text, matches):
+    out = engine.classify(text)
+    assert out[:2] == ("High", "Visit ER immediately")
+    assert out[4] == matches
+
+
+def test_negation_governs_one_phrase():
+    engine = triage._build_default_engine()
+    assert engine.evaluate("no fever or cough")[2] == ["fever", "cough"]
+    # the cue stops at the phrase it governs, not after a fixed word count
+    assert engine.evaluate("never had fever and then chest pain")[1:3] == (["chest pain"], ["fever"])
+    assert engine.evaluate("never had chest pain")[2] == ["chest pain"]
+
+
+def test_negation_scope_is_bounded():
+    engine = triage._build_default_engine()
+    _, _, negated, _, _ = engine.evaluate("no a b c d e f fever")
+    assert negated == []
+    _, _, negated, _, _ = engine.evaluate("no a b c fever")
+    assert negated == ["fever"]
+
+
+@pytest.mark.parametrize(
+    "text,matches",
+    [
+        ("chestpain", ["chest pain"]),
+        ("shortnes of breath", ["shortness of breath"]),
+        ("diarhea since yesterday", ["diarrhea"]),
+        ("no chestpain", ["negated:chest pain"]),
+        # common words close to a trigger are left alone
+        ("fewer visits this week", []),
+    ],
+)
+def test_fuzzy_trigger_matching(text, matches):
+    assert classify_symptom(text, engine=triage._build_default_engine())[4] == matches
+
+
+@pytest.mark.parametrize(
+    "text,matches",
+    [
+        # real words one edit away from a keyword are never corrected
+        ("I was painting the fence and got a headache", ["headache"]),
+        ("the miner has a cough", ["cough"]),
+        ("no threat of a sore throat", ["negated:sore throat"]),
+    ],
+)
+@pytest.mark.parametrize("engine", [triage._build_default_engine(), triage.load_rule_pack(triage.RULES_PATH)], ids=["builtin", "pack"])
+def test_fuzzy_matching_leaves_real_words_alone(engine, text, matches):
+    out = engine.classify(text)
+    assert out[0] == "Low"
+    assert out[4] == matches
+
+
+def test_fuzzy_only_match_never_reaches_high():
+    engine = triage._build_default_engine()
+    assert engine.classify("fainitng")[:2] == ("Medium", "Telehealth")
+    assert engine.classify("fainitng and chest pain")[0] == "High"
+
+
+def test_fuzzy_index_lookup_and_distance():
+    index = triage._FuzzyIndex(["chest pain", "fever", "diarrhea"], max_distance=1, min_length=5)
+    assert index.lookup("diarhea") == "diarrhea"
+    assert index.lookup("chestpain") == "chest pain"
+    assert index.lookup("feevr") == "fever"  # transposition
+    assert index.lookup("fvr") is None
+    index2 = triage._FuzzyIndex(["fever"], max_distance=2, min_length=5)
+    assert index2.lookup("feevrr") == "fever"
+
+
+def test_match_spans_point_into_original_text():
+    engine = triage._build_default_engine()
+    text = "No VOMITTING,  but  Severe   chest pain and I'm not sure about diarhea"
+    out = classify_symptom(text, engine=engine, spans=True)
+    assert out[:5] == classify_symptom(text, engine=engine)
+    found = [(text[a:b], name, w) for a, b, name, w in out[5]]
+    assert found == [
+        ("VOMITTING", "negated:vomiting", 0.0),
+        ("Severe   chest", "severe chest", 2.0),
+        ("chest pain", "chest pain", 2.0),
+        ("diarhea", "hedged:diarrhea", 1.0),
+    ]
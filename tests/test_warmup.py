@@ -0,0 +1,83 @@
+import sys
+import pathlib
+
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import main
+import warmup
+
+
+def test_run_warmup_records_state_and_durations(monkeypatch):
+    calls = []
+    monkeypatch.setitem(warmup.COMPONENTS, "rules", lambda n: calls.append(("rules", n)))
+
+    def broken(n):
+        raise RuntimeError("no model file")
+
+    monkeypatch.setitem(warmup.COMPONENTS, "heart", broken)
+    state = warmup.Readiness()
+    out = warmup.run_warmup(["rules", "heart"], required=["rules"], inferences=2, state=state)
+
+    assert calls == [("rules", 2)]
+    assert out["ready"] and out["warmup_complete"]
+    assert out["components"]["rules"]["state"] == "ready"
+    assert out["components"]["rules"]["seconds"] >= 0
+    assert out["components"]["heart"] == {"state": "failed", "seconds": out["components"]["heart"]["seconds"], "error": "no model file"}
+
+    # A failed required component keeps the worker out of rotation
+    out = warmup.run_warmup(["heart"], required=["heart"], inferences=0, state=state)
+    assert not out["ready"]
+
+
+def test_rules_warmup_runs_for_real():
+    out = warmup.run_warmup(["rules"], required=["rules"], inferences=1, state=warmup.Readiness())
+    assert out["ready"]
+
+
+def test_heart_warmup_uses_the_model_server_instead_of_loading(monkeypatch):
+    import ml.heart_attack as heart
+    import model_server
+
+    calls = []
+
+    class Client:
+        path = "/tmp/models.sock"
+        up = True
+
+        def ping(self):
+            return self.up
+
+        def predict_heart(self, values):
+            calls.append(values)
+            return {}
+
+    client = Client()
+    monkeypatch.setattr(model_server, "get_client", lambda: client)
+    monkeypatch.setattr(heart, "_active", None)
+    out = warmup.run_warmup(["heart"], required=["heart"], inferences=2, state=warmup.Readiness())
+    assert out["ready"] and len(calls) == 2
+    assert heart._active is None  # nothing loaded in this worker
+
+    client.up = False
+    out = warmup.run_warmup(["heart"], required=["heart"], inferences=2, state=warmup.Readiness())
+    assert not out["ready"] and "not reachable" in out["components"]["heart"]["error"]
+    assert heart._active is None
+
+
+def test_healthz_and_readyz(monkeypatch):
+    client = TestClient(main.app)
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+    state = warmup.Readiness()
+    monkeypatch.setattr(warmup, "_READINESS", state)
+    state.plan(["rules"], ["rules"])
+    resp = client.get("/readyz")
+    assert resp.status_code == 503
+    assert resp.json()["components"]["rules"]["state"] == "cold"
+
+    warmup.run_warmup(["rules"], required=["rules"], inferences=1, state=state)
+    resp = client.get("/readyz")
+    assert resp.status_code == 200 and resp.json()["ready"]
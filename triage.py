@@ -1,129 +1,906 @@
-from typing import List, Tuple
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from result_cache import OffsetMap, ResultCache, normalize_symptom_text, normalize_with_offsets
+
+try:
+    import yaml
+except Exception:  # PyYAML is optional; JSON rule packs work without it
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+RULES_PATH = Path(os.environ.get("MEDTRIAGE_RULES_PATH", str(ROOT / "rules" / "triage_rules.json")))
+
+
+# Built-in rule pack, used when no rule pack file can be loaded. Keep in sync
+# with rules/triage_rules.json.
+BUILTIN_RULES_VERSION = "builtin"
+
+# Trigger keywords for each bucket. Weights are assigned per bucket below.
+HIGH_TRIGGERS = [
+    "chest pain",
+    "shortness of breath",
+    "difficulty breathing",
+    "severe breath",
+    "severe chest",
+    "loss of consciousness",
+    "fainting",
+    "unconscious",
+    "severe bleeding",
+    "stroke",
+    "face droop",
+    "slurred speech",
+    "weakness on one side",
+    "sudden weakness",
+    "severe fever",
+    "severe abdominal pain",
+]
+
+MEDIUM_TRIGGERS = [
+    "fever",
+    "persistent fever",
+    "vomiting",
+    "diarrhea",
+    "abdominal pain",
+    "moderate pain",
+    "persistent cough",
+    "high temperature",
+    "dehydration",
+    "worsening",
+]
+
+LOW_TRIGGERS = [
+    "headache",
+    "mild headache",
+    "sore throat",
+    "runny nose",
+    "sneezing",
+    "mild cough",
+    "cough",
+    "minor",
+    "itch",
+]
+
+# Intensity words nudge the score up (intensifiers) or down (softeners)
+INTENSIFIERS = ["severe", "intense", "very bad", "excruciating"]
+SOFTENERS = ["mild", "slight", "tiny"]
+
+# Negation/hedge scope cues. A negation cue ("no chest pain") removes the
+# triggers it governs from the score; a hedge cue ("not sure if") keeps them
+# but marks them as hedged, and also shields the negation word inside it.
+# A cue governs the first trigger phrase starting within NEGATION_SCOPE_WORDS
+# words of it, plus triggers coordinated with that one ("no fever or cough"),
+# and never reaches past punctuation, a terminator word or the next cue.
+NEGATION_CUES = ["no", "not", "denies", "denied", "without", "negative for", "free of", "never", "dont", "doesnt", "didnt"]
+HEDGE_CUES = ["maybe", "possibly", "possible", "probably", "might", "not sure", "unsure", "uncertain", "cant rule out", "cannot rule out"]
+SCOPE_TERMINATORS = ["but", "however", "just", "although", "though", "except", "apart from", "aside from", "yet", "still"]
+NEGATION_SCOPE_WORDS = 5
+# Pseudo-negations contain a negation cue but deny nothing ("no relief from
+# chest pain"): they open no scope and end any open one. A negated phrase
+# followed by a canceller is a comparison, not a denial ("never had chest pain
+# this bad"), and stays scored.
+PSEUDO_NEGATIONS = [
+    "no relief", "no idea", "not only", "not just", "without warning", "no change", "no improvement",
+    "no better", "not better", "no doubt", "no wonder", "no matter",
+]
+NEGATION_CANCELLERS = ["this bad", "this severe", "this intense", "this strong", "this painful", "this much", "as bad", "so bad", "like this", "like that"]
+SCOPE_COORDINATORS = ["or", "and", "nor"]
+
+# Typo tolerance: words of at least FUZZY_MIN_TOKEN_LENGTH letters that no
+# keyword matched exactly are looked up in a deletion index over the keyword
+# vocabulary ("diarhea" -> "diarrhea", "chestpain" -> "chest pain"). Words in
+# the word list at FUZZY_DICTIONARY_PATH are real words, not typos, and are
+# never rewritten ("painting" is not "fainting"). A corrected word can add to
+# the score but never lifts a text into the top risk level on its own.
+FUZZY_MAX_EDIT_DISTANCE = 1
+FUZZY_MIN_TOKEN_LENGTH = 6
+FUZZY_DICTIONARY_PATH = Path(os.environ.get("MEDTRIAGE_FUZZY_DICTIONARY", str(ROOT / "rules" / "english_words.txt")))
+
+# Prefixes used in `matches` for triggers found inside a negation/hedge scope
+NEGATED_PREFIX = "negated:"
+HEDGED_PREFIX = "hedged:"
+
+# A matched trigger occurrence: (start, end, trigger, weight), end exclusive
+Span = Tuple[int, int, str, float]
+
+# (risk, minimum score, suggestion, condition reported when nothing matched);
+# the last level is the catch-all
+RISK_LEVELS = [
+    ("High", 2.0, "Visit ER immediately", "Severe condition"),
+    ("Medium", 1.0, "Telehealth", "Monitor symptoms"),
+    ("Low", None, "Self-care", "Mild condition"),
+]
 
 
 def _matches_any(text_l: str, keywords: List[str]) -> bool:
     return any(k in text_l for k in keywords)
 
 
-def classify_symptom(text: str) -> Tuple[str, str, List[str], float, List[str]]:
-    """Classify symptom text into (risk, suggestion, conditions).
+class _Automaton:
+    """Aho-Corasick automaton over a fixed keyword list.
 
-    Uses a simple weighted trigger system: high/medium/low trigger matches
-    contribute to a score which is mapped to an overall risk level. Returns
-    (risk, suggestion, conditions).
+    The failure links are folded into a full transition table at build time so
+    scanning is one dict lookup per character with no backtracking. Characters
+    that do not occur in any keyword always lead back to the root.
     """
-    if not text or not text.strip():
-        return "Medium", "Telehealth", ["Undetermined"]
 
-    text_l = text.lower()
-
-    # Define trigger keywords for each bucket with weights
-    HIGH_TRIGGERS = [
-        "chest pain",
-        "shortness of breath",
-        "difficulty breathing",
-        "severe breath",
-        "severe chest",
-        "loss of consciousness",
-        "fainting",
-        "unconscious",
-        "severe bleeding",
-        "stroke",
-        "face droop",
-        "slurred speech",
-        "weakness on one side",
-        "sudden weakness",
-        "severe fever",
-        "severe abdominal pain",
-    ]
-
-    MEDIUM_TRIGGERS = [
-        "fever",
-        "persistent fever",
-        "vomiting",
-        "diarrhea",
-        "abdominal pain",
-        "moderate pain",
-        "persistent cough",
-        "high temperature",
-        "dehydration",
-        "worsening",
-    ]
-
-    LOW_TRIGGERS = [
-        "headache",
-        "mild headache",
-        "sore throat",
-        "runny nose",
-        "sneezing",
-        "mild cough",
-        "cough",
-        "minor",
-        "itch",
-    ]
-
-    # Weighting per trigger
-    weight_map = {}
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for idx, kw in enumerate(self.keywords):
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(idx)
+
+        alphabet = {ch for kw in self.keywords for ch in kw}
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        # Breadth-first so a node's failure target is complete before its children
+        queue = []
+        for ch in alphabet:
+            nxt = goto[0].get(ch, 0)
+            delta[0][ch] = nxt
+            if nxt:
+                queue.append(nxt)
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            out[state].extend(out[fail[state]])
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    delta[state][ch] = delta[fail[state]][ch]
+                else:
+                    fail[nxt] = delta[fail[state]][ch]
+                    delta[state][ch] = nxt
+                    queue.append(nxt)
+
+        # Drop root transitions from the per-node tables; a miss means "go to root"
+        self._delta = [{ch: s for ch, s in d.items() if s} for d in delta]
+        self._out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (end_index, keyword_index) for every occurrence in `text`."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for idx in out[state]:
+                    yield i, idx
+
+    def scan(self, text: str) -> List[Tuple[int, int, Tuple[int, ...]]]:
+        """Return (end_index, word_index, keyword_indexes) wherever keywords end.
+
+        `word_index` is the number of spaces seen up to `end_index`, which lets
+        callers reason about word distances without rescanning the text.
+        """
+        delta = self._delta
+        out = self._out
+        state = 0
+        word = 0
+        events = []
+        for i, ch in enumerate(text):
+            if ch == " ":
+                word += 1
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                events.append((i, word, out[state]))
+        return events
+
+    def found(self, text: str) -> FrozenSet[int]:
+        """Return the set of keyword indexes occurring anywhere in `text`."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        hits = set()
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+        return frozenset(hits)
+
+
+def _deletes(word: str, distance: int) -> set:
+    """All strings reachable from `word` by up to `distance` deletions (incl. itself)."""
+    out = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions cost 1), or
+    `limit + 1` once it is known to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+_dictionary: Optional[FrozenSet[str]] = None
+_dictionary_lock = threading.Lock()
+
+
+def _dictionary_words() -> FrozenSet[str]:
+    """The words in FUZZY_DICTIONARY_PATH, read once on first use (empty if
+    the file can't be read)."""
+    global _dictionary
+    if _dictionary is None:
+        with _dictionary_lock:
+            if _dictionary is None:
+                try:
+                    with open(FUZZY_DICTIONARY_PATH, encoding="utf-8") as fh:
+                        words = frozenset(w for w in (line.strip().lower() for line in fh) if w and not w.startswith("#"))
+                except OSError:
+                    logger.warning("Word list %s not found; typo correction may rewrite real words", FUZZY_DICTIONARY_PATH)
+                    words = frozenset()
+                _dictionary = words
+    return _dictionary
+
+
+class _FuzzyIndex:
+    """SymSpell-style deletion index over the keyword vocabulary.
+
+    Every vocabulary entry is indexed under all of its deletions up to
+    `max_distance`, so a lookup only generates the deletions of the query
+    token and verifies the few candidates that share one. Multi-word keywords
+    are also indexed with the spaces removed so "chestpain" maps back to
+    "chest pain".
+    """
+
+    _MEMO_SIZE = 4096
+
+    def __init__(self, keywords: Iterable[str], max_distance: int, min_length: int, ignore: Iterable[str] = ()):
+        self.max_distance = int(max_distance)
+        self.min_length = int(min_length)
+        self._ignore = frozenset(ignore)
+        targets: Dict[str, str] = {}
+        for kw in keywords:
+            for w in kw.split(" "):
+                if w.isalpha() and len(w) >= max(2, self.min_length - self.max_distance):
+                    targets.setdefault(w, w)
+            if " " in kw:
+                targets.setdefault(kw.replace(" ", ""), kw)
+        # Words that appear verbatim in a keyword are never "corrected"
+        self._known = frozenset(w for kw in keywords for w in kw.split(" "))
+        self._targets = targets
+        index: Dict[str, List[str]] = {}
+        for variant in targets:
+            for d in _deletes(variant, self.max_distance):
+                index.setdefault(d, []).append(variant)
+        self._index: Dict[str, Tuple[str, ...]] = {k: tuple(v) for k, v in index.items()}
+        self._memo: Dict[str, Optional[str]] = {}
+
+    def lookup(self, token: str) -> Optional[str]:
+        """Return the keyword text `token` is a typo of, or None if there is no
+        single closest candidate within `max_distance`."""
+        hit = self._memo.get(token, self)
+        if hit is not self:
+            return hit
+        best: Optional[str] = None
+        best_d = self.max_distance + 1
+        ambiguous = False
+        seen = set()
+        for d in _deletes(token, self.max_distance):
+            for variant in self._index.get(d, ()):
+                if variant in seen:
+                    continue
+                seen.add(variant)
+                dist = _edit_distance(token, variant, self.max_distance)
+                if dist < best_d:
+                    best, best_d, ambiguous = variant, dist, False
+                elif dist == best_d and variant != best:
+                    ambiguous = True
+        result = None if (best is None or ambiguous) else self._targets[best]
+        if len(self._memo) >= self._MEMO_SIZE:
+            self._memo.clear()
+        self._memo[token] = result
+        return result
+
+    def correct(self, text_l: str, covered: FrozenSet[int]) -> Optional[Tuple[str, OffsetMap]]:
+        """Rewrite typo'd words of normalized text; None when nothing changed.
+
+        `covered` holds the word indexes already claimed by exact keyword
+        matches, which are left untouched. Returns the corrected text and an
+        OffsetMap from it back to `text_l`, so match spans can point at the
+        typo'd word the user actually wrote.
+        """
+        tokens = text_l.split(" ")
+        changed = False
+        for i, tok in enumerate(tokens):
+            if i in covered or len(tok) < self.min_length or tok in self._known or tok in self._ignore or not tok.isalpha():
+                continue
+            fix = self.lookup(tok)
+            # Only near-misses are checked, so the word list loads on first need
+            if fix is not None and tok not in _dictionary_words():
+                tokens[i] = fix
+                changed = True
+        if not changed:
+            return None
+        segments: List[Tuple[int, int]] = []
+        dst = src = 0
+        for tok, orig in zip(tokens, text_l.split(" ")):
+            segments.append((dst, src))
+            if tok != orig:
+                # Pin the last character too so a span ending in a corrected
+                # word ends where the original word does
+                segments.append((dst + len(tok) - 1, src + len(orig) - 1))
+            dst += len(tok) + 1
+            src += len(orig) + 1
+        return " ".join(tokens), OffsetMap([segments])
+
+
+_NEGATION, _HEDGE, _TERMINATOR = "negation", "hedge", "terminator"
+_PSEUDO, _CANCEL, _COORDINATOR = "pseudo", "cancel", "coordinator"
+
+
+# Numbers each compiled engine, see RuleEngine.cache_version
+_COMPILE_IDS = itertools.count(1)
+
+
+class RuleEngine:
+    """Compiled, immutable rule pack used by `classify_symptom`.
+
+    All trigger, intensity and negation/hedge cue keywords are compiled into
+    one automaton so a symptom text is scanned exactly once; cue scopes are
+    resolved afterwards from the match positions alone. Overlap handling
+    matches the original longest-first rule: a trigger is skipped when it is
+    a substring of (or contains) a trigger that was already accepted.
+
+    Engines are never modified after construction; a rule pack change builds a
+    new engine which replaces the active one in a single assignment.
+    """
+
+    __slots__ = (
+        "version", "cache_version", "triggers", "weights", "levels", "max_scope_words",
+        "_conflicts", "_modifiers", "_modifier_ids", "_cue_kinds", "_kw_len", "_kw_spaces", "_automaton", "_fuzzy",
+    )
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        modifiers: Iterable[Tuple[Iterable[str], float]],
+        levels: Iterable[Tuple[str, Optional[float], str, str]],
+        version: str = BUILTIN_RULES_VERSION,
+        negation_cues: Iterable[str] = (),
+        hedge_cues: Iterable[str] = (),
+        terminators: Iterable[str] = (),
+        max_scope_words: int = NEGATION_SCOPE_WORDS,
+        pseudo_negations: Iterable[str] = (),
+        cancellers: Iterable[str] = (),
+        coordinators: Iterable[str] = (),
+        fuzzy_distance: int = 0,
+        fuzzy_min_length: int = FUZZY_MIN_TOKEN_LENGTH,
+        fuzzy_ignore: Iterable[str] = (),
+    ):
+        self.version = str(version)
+        # The pack's "version" is whatever its author wrote and may not change
+        # with an edit; results are cached per compiled engine instead
+        self.cache_version = f"{self.version}#{next(_COMPILE_IDS)}"
+        # Keywords are matched against normalized text, so normalize them the same way
+        weights = {normalize_symptom_text(k): w for k, w in weights.items()}
+        modifiers = [([normalize_symptom_text(w) for w in words], delta) for words, delta in modifiers]
+        # Longest first; sorted() is stable so equal lengths keep weight order
+        self.triggers: Tuple[str, ...] = tuple(sorted(weights.keys(), key=lambda s: -len(s)))
+        self.weights: Tuple[float, ...] = tuple(float(weights[k]) for k in self.triggers)
+        # For each trigger, the earlier (longer or equal length) triggers that it overlaps with
+        self._conflicts: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(j for j in range(i) if k in self.triggers[j] or self.triggers[j] in k)
+            for i, k in enumerate(self.triggers)
+        )
+
+        keywords = list(self.triggers)
+        # Each modifier group adjusts the score once if any of its words occur
+        self._modifiers: Tuple[Tuple[FrozenSet[int], float], ...] = tuple(
+            (frozenset(self._intern(keywords, w) for w in words), float(delta)) for words, delta in modifiers
+        )
+        self._modifier_ids: FrozenSet[int] = frozenset().union(*(ids for ids, _ in self._modifiers))
+
+        # Cue words; a keyword listed under several kinds keeps the first one
+        cue_kinds: Dict[int, str] = {}
+        cue_groups = [
+            (negation_cues, _NEGATION), (hedge_cues, _HEDGE), (terminators, _TERMINATOR),
+            (pseudo_negations, _PSEUDO), (cancellers, _CANCEL), (coordinators, _COORDINATOR),
+        ]
+        if any(list(words) for words, _ in cue_groups[:2]):
+            # Normalized text marks punctuation with " . "; it always ends a scope
+            cue_groups.append((["."], _TERMINATOR))
+        for words, kind in cue_groups:
+            for w in words:
+                w = normalize_symptom_text(w) if w != "." else w
+                if w:
+                    cue_kinds.setdefault(self._intern(keywords, w), kind)
+        self._cue_kinds: Dict[int, str] = cue_kinds
+        self.max_scope_words = int(max_scope_words)
+
+        self.levels: Tuple[Tuple[str, Optional[float], str, str], ...] = tuple(
+            (str(risk), None if min_score is None else float(min_score), str(suggestion), str(default))
+            for risk, min_score, suggestion, default in levels
+        )
+        if not self.levels or self.levels[-1][1] is not None:
+            raise ValueError("rule pack levels must end with a catch-all level (min_score null)")
+        self._kw_len: Tuple[int, ...] = tuple(len(k) for k in keywords)
+        self._kw_spaces: Tuple[int, ...] = tuple(k.count(" ") for k in keywords)
+        self._automaton = _Automaton(keywords)
+        # Only trigger and modifier words are fuzzy targets; cue words are not
+        # guessed at, since a misread negation flips the meaning
+        self._fuzzy: Optional[_FuzzyIndex] = None
+        if int(fuzzy_distance) > 0:
+            fuzzy_targets = [k for i, k in enumerate(keywords) if i < len(self.triggers) or i in self._modifier_ids]
+            self._fuzzy = _FuzzyIndex(fuzzy_targets, fuzzy_distance, fuzzy_min_length, [normalize_symptom_text(w) for w in fuzzy_ignore])
+
+    @staticmethod
+    def _intern(keywords: List[str], word: str) -> int:
+        try:
+            return keywords.index(word)
+        except ValueError:
+            keywords.append(word)
+            return len(keywords) - 1
+
+    @classmethod
+    def from_pack(cls, pack: dict) -> "RuleEngine":
+        """Compile a rule pack mapping (as loaded from JSON/YAML)."""
+        try:
+            version = pack["version"]
+            weight_map: Dict[str, float] = {}
+            # Buckets are applied in order; later buckets win if a keyword is listed twice
+            for bucket in pack["triggers"]:
+                for k in bucket["keywords"]:
+                    weight_map[str(k).lower()] = float(bucket["weight"])
+            modifiers = [([str(w).lower() for w in m["keywords"]], float(m["delta"])) for m in pack.get("modifiers", [])]
+            levels = [(lv["risk"], lv.get("min_score"), lv["suggestion"], lv["default_condition"]) for lv in pack["levels"]]
+            scope = pack.get("negation") or {}
+            cues = dict(
+                negation_cues=[str(w) for w in scope.get("negation_cues", [])],
+                hedge_cues=[str(w) for w in scope.get("hedge_cues", [])],
+                terminators=[str(w) for w in scope.get("terminators", [])],
+                max_scope_words=int(scope.get("max_scope_words", NEGATION_SCOPE_WORDS)),
+                pseudo_negations=[str(w) for w in scope.get("pseudo_negations", [])],
+                cancellers=[str(w) for w in scope.get("cancellers", [])],
+                coordinators=[str(w) for w in scope.get("coordinators", [])],
+            )
+            fuzzy = pack.get("fuzzy") or {}
+            cues.update(
+                fuzzy_distance=int(fuzzy.get("max_edit_distance", 0)),
+                fuzzy_min_length=int(fuzzy.get("min_token_length", FUZZY_MIN_TOKEN_LENGTH)),
+                fuzzy_ignore=[str(w) for w in fuzzy.get("ignore", [])],
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"invalid rule pack: {e}") from e
+        return cls(weight_map, modifiers, levels, version=version, **cues)
+
+    def _windows(self, cues: List[Tuple[int, int, int, int, str]]) -> List[Tuple[int, int, Optional[int], str, Optional[int]]]:
+        """Turn cue occurrences into (first_word, reach, limit, kind, canceller) windows.
+
+        The cue may govern a trigger phrase starting in first_word..reach and
+        nothing past `limit` (None: end of text). `canceller` is the first
+        word of a canceller cue that ends the window, if one does.
+        """
+        # Drop cues nested in a longer one ("not" inside "not sure" or "not only")
+        cues.sort(key=lambda c: (c[0], -c[1]))
+        kept = []
+        reach = -1
+        for cue in cues:
+            if cue[1] <= reach:
+                continue
+            kept.append(cue)
+            reach = cue[1]
+
+        windows = []
+        for idx, (_, _, _, last_word, kind) in enumerate(kept):
+            if kind != _NEGATION and kind != _HEDGE:
+                continue
+            limit = canceller = None
+            for later in kept[idx + 1:]:
+                if later[2] > last_word:
+                    limit = later[2] - 1
+                    if later[4] == _CANCEL:
+                        canceller = later[2]
+                    break
+            reach = last_word + self.max_scope_words
+            if limit is not None:
+                reach = min(reach, limit)
+            if reach > last_word:
+                windows.append((last_word + 1, reach, limit, kind, canceller))
+        return windows
+
+    def _scopes(self, windows, phrases: List[Tuple[int, int]], coordinators: FrozenSet[int]) -> List[Tuple[int, int, str]]:
+        """Narrow cue windows to (first_word, last_word, kind) scopes over the
+        phrase each cue governs.
+
+        `phrases` are the (first_word, last_word) of trigger and modifier
+        occurrences in text order; a scope takes the first one in reach, those
+        overlapping or directly following it, and those joined on by a
+        coordinator ("no fever or severe cough").
+        """
+        scopes = []
+        for lo, reach, limit, kind, canceller in windows:
+            end = None
+            for first, last in phrases:
+                if first < lo:
+                    continue
+                if limit is not None and first > limit:
+                    break
+                if end is None:
+                    if first > reach:
+                        break
+                    end = last
+                elif first <= end + 1 or (first == end + 2 and end + 1 in coordinators):
+                    end = max(end, last)
+                else:
+                    break
+            if end is None:
+                continue
+            if kind == _NEGATION and canceller is not None and canceller - end <= 2:
+                continue
+            scopes.append((lo, end, kind))
+        return scopes
+
+    def _accept(self, candidates: Iterable[int], blocked: Iterable[int] = ()) -> List[int]:
+        # Longest-first overlap rule shared by matched and negated triggers
+        accepted = set(blocked)
+        out = []
+        for i in sorted(candidates):
+            if any(j in accepted for j in self._conflicts[i]):
+                continue
+            accepted.add(i)
+            out.append(i)
+        return out
+
+    def evaluate(self, text_l: str) -> Tuple[float, List[str], List[str], FrozenSet[str], List[Span]]:
+        """Return (score, matched, negated, hedged, spans) for normalized text.
+
+        `negated` triggers only occur inside negation scopes and are left out
+        of the score; `hedged` is the subset of `matched` that only occurs
+        inside hedge scopes. `spans` holds one (start, end, trigger, weight)
+        entry per occurrence of a reported trigger, in `text_l` offsets, with
+        the trigger named as in `classify` matches. When fuzzy matching is
+        enabled, words no keyword matched exactly are checked for typos and
+        the corrected text is scored.
+        """
+        result, covered = self._evaluate(text_l, self._fuzzy is not None)
+        if self._fuzzy is not None:
+            corrected = self._fuzzy.correct(text_l, covered)
+            if corrected is not None:
+                exact_score = result[0]
+                text_c, offsets = corrected
+                result, _ = self._evaluate(text_c, False)
+                spans = [offsets.span(start, end) + (name, weight) for start, end, name, weight in result[4]]
+                result = (self._cap_fuzzy(exact_score, result[0]),) + result[1:4] + (spans,)
+        return result
+
+    def _cap_fuzzy(self, exact: float, corrected: float) -> float:
+        # A guessed keyword never decides the top level: without an exact
+        # match reaching it, the score stops at the next level down
+        top = self.levels[0][1]
+        if top is None or exact >= top or corrected < top:
+            return corrected
+        return max([exact] + [t for _, t, _, _ in self.levels[1:] if t is not None and t < top])
+
+    def _evaluate(self, text_l: str, track_words: bool) -> Tuple[Tuple[float, List[str], List[str], FrozenSet[str], List[Span]], FrozenSet[int]]:
+        n = len(self.triggers)
+        cue_kinds = self._cue_kinds
+        modifier_ids = self._modifier_ids
+        kw_spaces = self._kw_spaces
+        kw_len = self._kw_len
+        last = len(text_l) - 1
+
+        occurrences = []  # (first_word, keyword, start, end) for triggers and modifiers
+        cues = []  # (start, end, first_word, last_word, kind)
+        coordinators = set()  # word indexes of coordinator words
+        covered = set()  # word indexes touched by any keyword match
+        for end, word, ids in self._automaton.scan(text_l):
+            for kw in ids:
+                kind = cue_kinds.get(kw)
+                # Coordinators are too short to claim a word ("or" in "shortnes")
+                if track_words and kind != _COORDINATOR:
+                    covered.update(range(word - kw_spaces[kw], word + 1))
+                start = end - kw_len[kw] + 1
+                if kw < n or kw in modifier_ids:
+                    occurrences.append((word - kw_spaces[kw], kw, start, end + 1))
+                if kind is not None:
+                    # Cues must be whole words: "no" must not fire inside "nose"
+                    if (start == 0 or text_l[start - 1] == " ") and (end == last or text_l[end + 1] == " "):
+                        if kind == _COORDINATOR:
+                            coordinators.add(word)
+                        else:
+                            cues.append((start, end, word - kw_spaces[kw], word, kind))
+
+        scopes = []
+        if cues:
+            windows = self._windows(cues)
+            if windows:
+                phrases = sorted((first, first + kw_spaces[kw]) for first, kw, _, _ in occurrences)
+                scopes = self._scopes(windows, phrases, frozenset(coordinators))
+        present = set()
+        negated_only = set()
+        hedge_flags: Dict[int, bool] = {}
+        kinds = []
+        for first_word, kw, _, _ in occurrences:
+            kind = None
+            for lo, hi, scope_kind in scopes:
+                if lo <= first_word <= hi:
+                    kind = scope_kind
+                    break
+            kinds.append(kind)
+            if kind == _NEGATION:
+                negated_only.add(kw)
+                continue
+            present.add(kw)
+            hedge_flags[kw] = hedge_flags.get(kw, True) and kind == _HEDGE
+        negated_only -= present
+
+        score = 0.0
+        accepted = self._accept(h for h in present if h < n)
+        for i in accepted:
+            score += self.weights[i]
+        for ids, delta in self._modifiers:
+            if not ids.isdisjoint(present):
+                score += delta
+
+        negated = self._accept((h for h in negated_only if h < n), blocked=accepted)
+
+        # Spans come straight from the occurrences above, no second scan
+        accepted_set, negated_set = set(accepted), set(negated)
+        spans: List[Span] = []
+        for (_, kw, start, end), kind in zip(occurrences, kinds):
+            if kind == _NEGATION:
+                if kw in negated_set:
+                    spans.append((start, end, NEGATED_PREFIX + self.triggers[kw], 0.0))
+            elif kw in accepted_set:
+                name = HEDGED_PREFIX + self.triggers[kw] if hedge_flags.get(kw) else self.triggers[kw]
+                spans.append((start, end, name, self.weights[kw]))
+        spans.sort()
+
+        hedged = frozenset(self.triggers[i] for i in accepted if hedge_flags.get(i))
+        return (score, [self.triggers[i] for i in accepted], [self.triggers[i] for i in negated], hedged, spans), frozenset(covered)
+
+    def classify(self, text: str, spans: bool = False) -> tuple:
+        """Score `text` and map it to (risk, suggestion, conditions, score, matches).
+
+        With `spans=True` a sixth element lists the (start, end, trigger,
+        weight) spans of the matches in `text` offsets.
+        """
+        if not spans:
+            return self.classify_normalized(normalize_symptom_text(text))
+        key, offsets = normalize_with_offsets(text)
+        result = self.classify_normalized(key, spans=True)
+        return result[:5] + (map_spans(result[5], offsets),)
+
+    def classify_normalized(self, key: str, spans: bool = False) -> tuple:
+        """`classify` for text already passed through `normalize_symptom_text`.
+
+        `matches` lists the scored triggers (hedged ones prefixed with
+        HEDGED_PREFIX) followed by negated triggers prefixed with NEGATED_PREFIX.
+        With `spans=True` their spans are appended in `key` offsets.
+        """
+        score, matched, negated, hedged, match_spans = self.evaluate(key)
+        conditions: List[str] = list(matched)
+
+        # Map score to risk: first level whose threshold the score reaches
+        for risk, min_score, suggestion, default in self.levels:
+            if min_score is None or score >= min_score:
+                break
+        if not conditions:
+            conditions = [default]
+
+        # Deduplicate conditions and make them human-friendly
+        cond_clean = []
+        for c in conditions:
+            c = c.strip()
+            if c and c not in cond_clean:
+                cond_clean.append(c)
+
+        matches = [HEDGED_PREFIX + m if m in hedged else m for m in matched]
+        matches.extend(NEGATED_PREFIX + m for m in negated)
+
+        # Return risk, suggestion, conditions, numeric score, and matched triggers
+        if spans:
+            return risk, suggestion, cond_clean, float(score), matches, match_spans
+        return risk, suggestion, cond_clean, float(score), matches
+
+
+def map_spans(spans: Iterable[Span], offsets: Optional[OffsetMap]) -> List[Span]:
+    """Map spans over normalized text back into the original text.
+
+    Without an offset map (see `normalize_with_offsets`) no spans are returned
+    rather than ones pointing at the wrong characters.
+    """
+    if offsets is None:
+        return []
+    return [offsets.span(start, end) + (name, weight) for start, end, name, weight in spans]
+
+
+def _build_default_engine() -> RuleEngine:
+    # Weighting per trigger; later buckets win if a keyword is listed twice
+    weight_map: Dict[str, float] = {}
     for k in HIGH_TRIGGERS:
         weight_map[k] = 2.0
     for k in MEDIUM_TRIGGERS:
         weight_map[k] = 1.0
     for k in LOW_TRIGGERS:
         weight_map[k] = 0.5
+    return RuleEngine(
+        weight_map,
+        [(INTENSIFIERS, 1.0), (SOFTENERS, -0.25)],
+        RISK_LEVELS,
+        negation_cues=NEGATION_CUES,
+        hedge_cues=HEDGE_CUES,
+        terminators=SCOPE_TERMINATORS,
+        pseudo_negations=PSEUDO_NEGATIONS,
+        cancellers=NEGATION_CANCELLERS,
+        coordinators=SCOPE_COORDINATORS,
+        fuzzy_distance=FUZZY_MAX_EDIT_DISTANCE,
+    )
 
-    score = 0.0
-    conditions: List[str] = []
-
-    # To avoid double-counting overlapping phrases (e.g. 'mild headache' and 'headache')
-    # we match triggers in descending length order and skip triggers that are
-    # substrings of already-matched longer triggers.
-    matched: List[str] = []
-    # Combined triggers sorted by length (longest first)
-    combined_triggers = sorted(weight_map.keys(), key=lambda s: -len(s))
-    for k in combined_triggers:
-        if k in text_l:
-            # skip if any already matched trigger contains this one or is contained by it
-            skip = False
-            for m in matched:
-                if k in m or m in k:
-                    skip = True
-                    break
-            if skip:
-                continue
-            matched.append(k)
-            score += float(weight_map[k])
-            conditions.append(k)
-
-    # Add small heuristics for intensity words
-    if any(w in text_l for w in ["severe", "intense", "very bad", "excruciating"]):
-        score += 1.0
-    if any(w in text_l for w in ["mild", "slight", "tiny"]):
-        score -= 0.25
-
-    # Map score to risk
-    # score >= 2.0 -> High, score >= 1.0 -> Medium, else Low
-    if score >= 2.0:
-        risk = "High"
-        suggestion = "Visit ER immediately"
-        if not conditions:
-            conditions = ["Severe condition"]
-    elif score >= 1.0:
-        risk = "Medium"
-        suggestion = "Telehealth"
-        if not conditions:
-            conditions = ["Monitor symptoms"]
+
+def load_rule_pack(path: Path) -> RuleEngine:
+    """Read a JSON or YAML rule pack from `path` and compile it."""
+    raw = Path(path).read_text(encoding="utf-8")
+    if Path(path).suffix.lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise RuntimeError("PyYAML is required to load YAML rule packs")
+        pack = yaml.safe_load(raw)
     else:
-        risk = "Low"
-        suggestion = "Self-care"
-        if not conditions:
-            conditions = ["Mild condition"]
+        pack = json.loads(raw)
+    if not isinstance(pack, dict):
+        raise ValueError("invalid rule pack: top level must be a mapping")
+    return RuleEngine.from_pack(pack)
+
+
+# Active engine and the (mtime_ns, size) of the file it was compiled from.
+# Readers only ever see a fully built engine: a reload compiles into a local
+# and then rebinds _ENGINE in one assignment.
+_ENGINE: RuleEngine = _build_default_engine()
+_ENGINE_STAMP = None
+_last_check = 0.0
+_reload_lock = threading.Lock()
+
+try:
+    _CHECK_INTERVAL = float(os.environ.get("MEDTRIAGE_RULES_CHECK_INTERVAL", "2.0"))
+except Exception:
+    _CHECK_INTERVAL = 2.0
+
+
+def reload_rules(force: bool = False) -> RuleEngine:
+    """Recompile the rule pack if its file changed (or `force`), return the active engine.
+
+    Only one thread compiles at a time; others keep using the current engine.
+    A pack that fails to load is logged and the previous engine stays active.
+    """
+    global _ENGINE, _ENGINE_STAMP, _last_check
+    if not _reload_lock.acquire(blocking=force):
+        return _ENGINE
+    try:
+        _last_check = time.monotonic()
+        try:
+            st = RULES_PATH.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp is None or (stamp == _ENGINE_STAMP and not force):
+            return _ENGINE
+        try:
+            engine = load_rule_pack(RULES_PATH)
+        except Exception:
+            logger.exception("Failed to load rule pack %s; keeping rules version %s", RULES_PATH, _ENGINE.version)
+            _ENGINE_STAMP = stamp  # don't retry a broken file until it changes again
+            return _ENGINE
+        _ENGINE = engine
+        _ENGINE_STAMP = stamp
+        logger.info("Loaded rule pack %s (version %s)", RULES_PATH, engine.version)
+        return engine
+    finally:
+        _reload_lock.release()
+
+
+def get_rule_engine() -> RuleEngine:
+    """Return the active engine, checking the rule pack file at most every
+    MEDTRIAGE_RULES_CHECK_INTERVAL seconds."""
+    if time.monotonic() - _last_check >= _CHECK_INTERVAL:
+        return reload_rules()
+    return _ENGINE
+
+
+# Compile the configured rule pack at import so the first request doesn't pay for it
+reload_rules(force=True)
+
+
+# Results keyed on normalized text, bound to the compiled engine
+_RESULT_CACHE = ResultCache.from_env("MEDTRIAGE_RULES")
+
+
+def _classify_cached(engine: RuleEngine, text: str, spans: bool = False) -> tuple:
+    # The engine scores the normalized text, so every text sharing a cache key
+    # gets exactly the answer a fresh evaluation would produce. Spans are
+    # cached in normalized offsets and mapped back per caller.
+    if spans:
+        key, offsets = normalize_with_offsets(text)
+    else:
+        key = normalize_symptom_text(text)
+    hit = _RESULT_CACHE.get(key, engine.cache_version)
+    if hit is None:
+        risk, suggestion, conditions, score, matches, match_spans = engine.classify_normalized(key, spans=True)
+        hit = (risk, suggestion, tuple(conditions), score, tuple(matches), tuple(match_spans))
+        _RESULT_CACHE.put(key, hit, engine.cache_version)
+    # Fresh lists per caller so nobody mutates the cached entry
+    if spans:
+        return hit[0], hit[1], list(hit[2]), hit[3], list(hit[4]), map_spans(hit[5], offsets)
+    return hit[0], hit[1], list(hit[2]), hit[3], list(hit[4])
+
+
+def classify_symptom(text: str, engine: Optional[RuleEngine] = None, spans: bool = False) -> tuple:
+    """Classify symptom text into (risk, suggestion, conditions).
+
+    Uses a simple weighted trigger system: high/medium/low trigger matches
+    contribute to a score which is mapped to an overall risk level. Returns
+    (risk, suggestion, conditions, score, matches). Pass `engine` to pin a
+    specific rule pack; otherwise the active one is used. With `spans=True`
+    a sixth element lists (start, end, trigger, weight) for every match,
+    as character offsets into `text`.
+    """
+    if not text or not text.strip():
+        return "Medium", "Telehealth", ["Undetermined"]
+
+    return _classify_cached(engine or get_rule_engine(), text, spans)
+
+
+def classify_symptoms(texts: List[str], engine: Optional[RuleEngine] = None, spans: bool = False) -> List[Union[tuple, Exception]]:
+    """Classify a batch of symptom texts in input order.
+
+    Each entry is the same tuple `classify_symptom` returns, or the exception
+    raised for that item (e.g. empty text) so one bad item does not fail the
+    whole batch. The whole batch is scored with the same rule pack and goes
+    through the shared result cache, so repeated texts are evaluated once.
+    """
+    engine = engine or get_rule_engine()
+    results: List[Union[tuple, Exception]] = []
+    for text in texts:
+        if not isinstance(text, str):
+            results.append(TypeError("symptom text must be a string"))
+            continue
+        if not text.strip():
+            results.append(ValueError("symptom text is empty"))
+            continue
+        try:
+            results.append(_classify_cached(engine, text, spans))
+        except Exception as e:
+            results.append(e)
+    return results
 
-    # Deduplicate conditions and make them human-friendly
-    cond_clean = []
-    for c in conditions:
-        c = c.strip()
-        if c and c not in cond_clean:
-            cond_clean.append(c)
 
-    # Return risk, suggestion, conditions, numeric score, and matched triggers
-    return risk, suggestion, cond_clean, float(score), matched
+def cache_stats() -> Dict[str, object]:
+    """Hit/miss/eviction counters for the rule result cache."""
+    return _RESULT_CACHE.stats()
@@ -0,0 +1,166 @@
+"""Startup warmup and readiness state for the API workers.
+
+`run_warmup` loads the configured components (rule pack, heart model and
+calibrator, zero-shot model) and runs a few dummy inferences through each,
+so the first real requests don't pay for `joblib.load`, pipeline setup or
+first-call allocations. With a model server configured
+(MEDTRIAGE_MODEL_SERVER_SOCKET) the heart component pings and queries the
+server instead of loading the model in the worker. Every component records its state and load time;
+`readiness()` is what `/readyz` reports.
+
+Configuration:
+    MEDTRIAGE_WARMUP             components to warm, comma-separated
+                                 (default "rules,heart"; "ml" is added
+                                 when MEDTRIAGE_PRELOAD_ML=1)
+    MEDTRIAGE_WARMUP_REQUIRED    components that must be ready before the
+                                 worker reports ready (default "rules")
+    MEDTRIAGE_WARMUP_INFERENCES  dummy inferences per component (default 3)
+"""
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import threading
+import time
+
+from result_cache import env_number
+
+logger = logging.getLogger(__name__)
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+WARMUP_TEXTS = [
+    "Severe chest pain, shortness of breath",
+    "mild headache for two days",
+    "fever and cough since yesterday",
+]
+
+WARMUP_PATIENT = {
+    'age': 63, 'sex': 1, 'cp': 3, 'trestbps': 145, 'chol': 233, 'fbs': 1,
+    'thalach': 150, 'exang': 0, 'oldpeak': 2.3,
+}
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [c.strip() for c in os.environ.get(name, default).split(",") if c.strip()]
+
+
+def _warm_rules(n: int) -> None:
+    from triage import get_rule_engine
+
+    engine = get_rule_engine()
+    for i in range(n):
+        engine.classify(WARMUP_TEXTS[i % len(WARMUP_TEXTS)])
+
+
+def _warm_heart(n: int) -> None:
+    from ml.heart_attack import REQUIRED_FEATURES, _current, predict_heart_attack
+    from model_server import get_client
+
+    client = get_client()
+    if client is not None:
+        # The model server holds the heart model; loading it here too would
+        # put the copy it exists to remove back into every worker
+        if not client.ping():
+            raise RuntimeError(f"model server at {client.path} is not reachable")
+        for _ in range(n):
+            client.predict_heart([WARMUP_PATIENT[c] for c in REQUIRED_FEATURES])
+        return
+    _current()
+    for _ in range(n):
+        predict_heart_attack(WARMUP_PATIENT)
+
+
+def _warm_ml(n: int) -> None:
+    from ml_triage import _ml
+
+    _ml._init()
+    for i in range(n):
+        _ml.classify(WARMUP_TEXTS[i % len(WARMUP_TEXTS)])
+
+
+COMPONENTS: Dict[str, Callable[[int], None]] = {
+    "rules": _warm_rules,
+    "heart": _warm_heart,
+    "ml": _warm_ml,
+}
+
+
+class Readiness:
+    """Per-component warmup state, safe to read while warmup runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, object]] = {}
+        self._required: List[str] = []
+        self._done = False
+
+    def plan(self, components: List[str], required: List[str]) -> None:
+        with self._lock:
+            self._components = {name: {"state": COLD, "seconds": None, "error": None} for name in components}
+            self._required = [name for name in required if name in self._components]
+            self._done = False
+
+    def update(self, name: str, **fields) -> None:
+        with self._lock:
+            self._components[name].update(fields)
+
+    def finish(self) -> None:
+        with self._lock:
+            self._done = True
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+            ready = self._done and all(components[name]["state"] == READY for name in self._required)
+            return {
+                "ready": ready,
+                "warmup_complete": self._done,
+                "required": list(self._required),
+                "components": components,
+            }
+
+
+_READINESS = Readiness()
+
+
+def configured_components() -> List[str]:
+    components = _env_list("MEDTRIAGE_WARMUP", "rules,heart")
+    if os.environ.get("MEDTRIAGE_PRELOAD_ML", "0") == "1" and "ml" not in components:
+        components.append("ml")
+    return [c for c in components if c in COMPONENTS]
+
+
+def run_warmup(components: Optional[List[str]] = None, required: Optional[List[str]] = None, inferences: Optional[int] = None, state: Readiness = _READINESS) -> Dict[str, object]:
+    """Warm each component in turn; failures are recorded, never raised."""
+    components = configured_components() if components is None else components
+    required = _env_list("MEDTRIAGE_WARMUP_REQUIRED", "rules") if required is None else required
+    n = env_number("MEDTRIAGE_WARMUP_INFERENCES", 3, int) if inferences is None else inferences
+    state.plan(components, required)
+    for name in components:
+        state.update(name, state=LOADING)
+        start = time.perf_counter()
+        try:
+            COMPONENTS[name](max(0, n))
+        except Exception as e:
+            logger.exception("Warmup of %s failed", name)
+            state.update(name, state=FAILED, seconds=time.perf_counter() - start, error=str(e) or type(e).__name__)
+            continue
+        seconds = time.perf_counter() - start
+        state.update(name, state=READY, seconds=seconds)
+        logger.info("Warmed %s in %.2fs", name, seconds)
+    state.finish()
+    return state.snapshot()
+
+
+def start_warmup() -> threading.Thread:
+    """Run `run_warmup` on a background thread so liveness checks answer
+    while models load."""
+    state = _READINESS
+    state.plan(configured_components(), _env_list("MEDTRIAGE_WARMUP_REQUIRED", "rules"))
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> Dict[str, object]:
+    return _READINESS.snapshot()